@@ -1,11 +1,11 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends
 from starlette import status
 from . import reg_model
 from . import service
 from fastapi.security import OAuth2PasswordRequestForm
 from ..core.database import DbSession
-from ..protection.rate_limiting import limiter
+from ..protection.rate_limiting import rate_limit
 import logging
 
 router = APIRouter(
@@ -15,14 +15,14 @@ router = APIRouter(
 
 
 # noinspection PyTypeHints
-@router.post("/register", status_code=status.HTTP_201_CREATED, response_model=reg_model.Token)
-@limiter.limit("5/hour")
-async def register_user(request: Request, create_user_request:reg_model.CreateUser, db:DbSession):
+@router.post("/register", status_code=status.HTTP_201_CREATED, response_model=reg_model.Token,
+             dependencies=[rate_limit("register", "5/hour")])
+async def register_user(create_user_request:reg_model.CreateUser, db:DbSession):
     return service.register_user(db, create_user_request)
 
 
 # noinspection PyTypeHints
-@router.post("/login", response_model=reg_model.Token)
+@router.post("/login", response_model=reg_model.Token, dependencies=[rate_limit("login", "10/minute")])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: DbSession):
     return service.login_for_access_token(form_data, db)
 
@@ -1,9 +1,10 @@
 from datetime import timedelta, datetime
 from typing import Annotated
 from fastapi import HTTPException, Depends
-from passlib.context import CryptContext
+from functools import lru_cache
 import jwt
 from jwt import PyJWTError
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.models.models import User
 from app.core.database import DbSession
@@ -21,13 +22,20 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 #security setup
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/login")
-bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+#same scheme for endpoints that also serve anonymous callers
+oauth2_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+@lru_cache(maxsize=1)
+def _crypt_context():
+    #passlib is only needed for login/registration, so load it on first use
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 #Passwording Functions (hash and verification)
 def verify_password(plain_password, hashed_password):
-    return bcrypt.verify(plain_password, hashed_password)
+    return _crypt_context().verify(plain_password, hashed_password)
 def get_password_hash(password: str) -> str:
-    return bcrypt.hash(password)
+    return _crypt_context().hash(password)
 
 #Authentication functions
 
@@ -38,7 +46,7 @@ def authenticate_user(username: str, password: str, db: Session) -> User | bool:
     returns Object if valid, false if not
     """
     # Try to find user by email first (since frontend sends email as username)
-    user = db.query(User).filter(User.username == username).first()
+    user = db.scalars(select(User).where(User.username == username)).first()
 
     if not user or not verify_password(password, user.password_hashed): #check if exists and password matches
         logging.warning(f"Failed authentication attempt for user {username}")
@@ -114,7 +122,7 @@ def register_user(db: Session, create_user: reg_model.CreateUser) -> reg_model.T
     Registers a new user and hashes the password before storing
     Returns an access token for immediate authentication
     """
-    existing_user = db.query(User).filter((User.username == create_user.username) | (User.email == create_user.email)).first()
+    existing_user = db.scalars(select(User).where((User.username == create_user.username) | (User.email == create_user.email))).first()
     if existing_user:
         logging.info(f"User already exists")
         if existing_user.username == create_user.username:
@@ -153,6 +161,15 @@ def get_user(token: Annotated[str, Depends(oauth2_bearer)]) -> reg_model.TokenDa
 
 CurrentUser = Annotated[reg_model.TokenData, Depends(get_user)]
 
+def get_optional_user(token: Annotated[str | None, Depends(oauth2_optional)]) -> reg_model.TokenData | None:
+    """
+    Like get_user, but anonymous requests get None instead of a 401
+    (a token that is present must still be valid)
+    """
+    return verify_token(token) if token else None
+
+OptionalUser = Annotated[reg_model.TokenData | None, Depends(get_optional_user)]
+
 def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
             db:Session) -> reg_model.Token:
     user = authenticate_user(form_data.username, form_data.password, db)
@@ -166,7 +183,7 @@ def require_admin(current_user: CurrentUser, db: DbSession):
     """
     Dependency to ensure the current user is an admin
     """
-    user = db.query(User).filter(User.user_id == int(current_user.user_id)).first()
+    user = db.get(User, int(current_user.user_id))
     if not user or user.role != 'admin':
         logging.warning(f"Unauthorized admin access attempt by user ID {current_user.user_id}")
         raise HTTPException(status_code=403, detail="Admin privileges required")
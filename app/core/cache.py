@@ -0,0 +1,57 @@
+#small in-process read-through caches (one per worker); entries expire after a TTL so
+#writes made through other workers show up within that window
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+from app.core.metrics import record_cache
+
+
+class TTLCache:
+    """LRU bounded by entry count, with a per-entry time to live; safe to share between threadpool workers"""
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get_many(self, keys: Iterable[Hashable]) -> tuple[dict, list]:
+        """Returns (found, missing) for the keys, counting hits and misses"""
+        found, missing = {}, []
+        now = time.monotonic()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self.entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    if entry is not None:
+                        del self.entries[key]
+                    missing.append(key)
+        for _ in found:
+            record_cache(self.name, True)
+        for _ in missing:
+            record_cache(self.name, False)
+        return found, missing
+
+    def put_many(self, items: dict) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            for key, value in items.items():
+                self.entries[key] = (expires, value)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
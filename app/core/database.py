@@ -13,6 +13,9 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set")
 # creates database engine(translates python->sql)
 engine = create_engine(DATABASE_URL)
+#optional read replica for long scans (exports); falls back to the primary
+READ_REPLICA_URL = os.environ.get("READ_REPLICA_URL")
+replica_engine = create_engine(READ_REPLICA_URL) if READ_REPLICA_URL else engine
 
 #creates sessions for changing the database per each API request
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
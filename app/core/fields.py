@@ -0,0 +1,31 @@
+#sparse fieldsets: ?fields=a,b,c narrows list responses and the columns selected for them
+from fastapi import HTTPException
+from sqlalchemy import Select, select
+
+
+def parse_fields(fields: str | None, columns: dict, required: str) -> list[str] | None:
+    """
+    Validates a fields= value against the columns a list can return; None means "everything".
+    The cursor column (required) is always included so pagination keeps working.
+    """
+    if fields is None:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. "
+                                                    f"Available: {', '.join(columns)}")
+    return [required] + [name for name in columns if name in requested and name != required]
+
+
+def project(entity, fields: list[str] | None, columns: dict, joins: dict) -> Select:
+    """
+    Column-only select over entity for the given fields (all of them when None), joining only
+    what those fields need. Rows come back as plain tuples: no ORM entities are built for them.
+    """
+    names = fields or list(columns)
+    statement = select(*[columns[name].label(name) for name in names]).select_from(entity)
+    for name in names:
+        if name in joins:
+            statement = statement.join(*joins[name])
+    return statement
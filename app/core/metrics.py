@@ -0,0 +1,160 @@
+#prometheus metrics for autoscaling and dashboards
+#set PROMETHEUS_MULTIPROC_DIR (empty dir, shared by all uvicorn workers) so /metrics aggregates every worker
+import os
+import time
+from anyio import to_thread
+from fastapi import APIRouter, HTTPException, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from app.core.database import engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_BYTES_BUCKETS = (64_000, 256_000, 512_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000)
+
+#request metrics (labeled by route template, never the raw path, to keep cardinality bounded)
+REQUESTS = Counter(
+    "clubbies_http_requests_total",
+    "HTTP requests handled",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "clubbies_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "clubbies_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+
+#database connection pool
+DB_POOL_SIZE = Gauge("clubbies_db_pool_size", "Configured pool size", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("clubbies_db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("clubbies_db_pool_overflow", "Overflow connections open", multiprocess_mode="livesum")
+
+#threadpool that runs the sync (def) endpoints; saturation = busy / total
+THREADPOOL_BUSY = Gauge("clubbies_threadpool_busy", "Worker threads in use", multiprocess_mode="livesum")
+THREADPOOL_TOTAL = Gauge("clubbies_threadpool_total", "Worker thread capacity", multiprocess_mode="livesum")
+
+#photo uploads
+UPLOAD_BYTES = Histogram("clubbies_upload_bytes", "Size of uploaded photos", buckets=UPLOAD_BYTES_BUCKETS)
+UPLOAD_DURATION = Histogram("clubbies_upload_duration_seconds", "Photo upload time incl. storage", buckets=LATENCY_BUCKETS)
+
+#response compression (stage is "original" or "wire")
+COMPRESSION_SECONDS = Histogram("clubbies_compression_seconds", "Time spent compressing a response body", ["encoding"],
+                                buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05))
+RESPONSE_BYTES = Counter("clubbies_response_bytes_total", "Response body bytes", ["encoding", "stage"])
+
+#cold start, per startup phase (import, schema, ...)
+STARTUP_SECONDS = Gauge("clubbies_startup_seconds", "Time spent in each startup phase", ["phase"], multiprocess_mode="max")
+
+#caches (result is "hit" or "miss")
+CACHE_REQUESTS = Counter("clubbies_cache_requests_total", "Cache lookups", ["cache", "result"])
+RATE_LIMIT_SECONDS = Histogram(
+    "clubbies_rate_limit_seconds", "Time spent deciding a rate limit", ["scope"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+RATE_LIMIT_DECISIONS = Counter("clubbies_rate_limit_decisions_total", "Rate limit decisions", ["scope", "result"])
+EXPORT_ROWS = Counter("clubbies_export_rows_total", "Rows streamed by admin exports", ["table", "format"])
+#venue activity streams (result is "delivered" or "overflow", per subscriber)
+STREAM_SUBSCRIBERS = Gauge("clubbies_stream_subscribers", "Open venue activity streams", multiprocess_mode="livesum")
+STREAM_EVENTS = Counter("clubbies_stream_events_total", "Venue activity events handed to subscribers", ["result"])
+#check-ins (result is "counted" or "repeat") and their batched flushes
+CHECKINS = Counter("clubbies_checkins_total", "Check-ins received", ["result"])
+CHECKIN_FLUSH_SECONDS = Histogram("clubbies_checkin_flush_seconds", "Time to write one batch of check-in counts",
+                                  buckets=LATENCY_BUCKETS)
+CHECKIN_FLUSH_ROWS = Counter("clubbies_checkin_flush_rows_total", "Venue/bucket rows upserted by check-in flushes")
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_startup(timings: dict[str, float]) -> None:
+    for name, seconds in timings.items():
+        STARTUP_SECONDS.labels(name).set(seconds)
+
+
+def sample_runtime() -> None:
+    """Copies pool and threadpool state into gauges (plain attribute reads, no locks)"""
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_SIZE.set(pool.size())
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_TOTAL.set(limiter.total_tokens)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count, latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            #router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            status = str(status_code)
+            REQUESTS.labels(scope["method"], template, status).inc()
+            REQUEST_LATENCY.labels(scope["method"], template, status).observe(elapsed)
+            sample_runtime()
+
+
+def render_metrics() -> bytes:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        #aggregate the files written by every worker process
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_worker_dead() -> None:
+    """Drops this worker's live gauges from the shared directory on shutdown"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    #optional scrape token so the endpoint isn't public in production
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    sample_runtime()
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
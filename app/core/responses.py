@@ -0,0 +1,141 @@
+#fast responses: orjson encoding of dicts, lists and trusted (model_construct) pydantic models,
+#with MessagePack/CBOR picked from the Accept header for clients that ask for them
+from contextvars import ContextVar
+from datetime import date, datetime
+from enum import Enum
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import msgpack
+except ImportError:  #in requirements, but JSON keeps working without it
+    msgpack = None
+
+try:
+    import cbor2  #optional, only offered when installed
+except ImportError:
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+#media types clients may send, mapped to the encoding we answer with
+_ACCEPTED = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor": CBOR,
+}
+
+#encoding chosen for the request being handled (set by NegotiationMiddleware)
+_response_encoding: ContextVar[str] = ContextVar("response_encoding", default=JSON)
+
+
+def _default(obj):
+    #response models built with model_construct hold already-clean values, so their
+    #__dict__ can be encoded directly (orjson handles datetimes, enums and nesting)
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _msgpack_default(obj):
+    #same shapes as the JSON encoding so the client can share its models
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Type is not MessagePack serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def encode(content, encoding: str) -> bytes:
+    if encoding == MSGPACK:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+    if encoding == CBOR:
+        #cbor2 rejects naive datetimes; go through the JSON shapes instead
+        return cbor2.dumps(orjson.loads(dumps(content)))
+    return dumps(content)
+
+
+def negotiate(accept: str | None) -> str:
+    """Picks the response encoding from an Accept header; JSON unless a binary type is preferred"""
+    if not accept:
+        return JSON
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        encoding = _ACCEPTED.get(media_type.strip().lower())
+        if encoding is None or (encoding == MSGPACK and msgpack is None) or (encoding == CBOR and cbor2 is None):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        #ties keep the earlier entry, which is the client's stated preference order
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class. Endpoints that return it directly skip FastAPI's
+    response validation and jsonable_encoder pass entirely. The body is JSON
+    unless the client negotiated MessagePack or CBOR.
+    """
+
+    def render(self, content) -> bytes:
+        encoding = _response_encoding.get()
+        if encoding != JSON:
+            self.media_type = encoding
+        return encode(content, encoding)
+
+
+class NegotiationMiddleware:
+    """Reads Accept once per request for FastJSONResponse and marks responses as varying on it"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                accept = value.decode("latin-1")
+                break
+        token = _response_encoding.set(negotiate(accept))
+
+        async def send_with_vary(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                for index, (name, value) in enumerate(headers):
+                    if name == b"vary":
+                        headers[index] = (name, value + b", Accept")
+                        break
+                else:
+                    headers.append((b"vary", b"Accept"))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            _response_encoding.reset(token)
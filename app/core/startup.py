@@ -0,0 +1,272 @@
+"""
+Startup work that runs in the app lifespan (not at import time) and cold-start profiling.
+
+    python -m app.core.startup            # import + init cost per module
+    python -m app.core.startup --json     # same, machine readable (for tracking as a metric)
+
+SCHEMA_CHECK controls the schema step: "check" (default) does one catalog query and
+only runs create_all and the upgrades when tables or upgrades are missing, "skip" does
+nothing (use once the database is provisioned), "create" always runs both.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from sqlalchemy import text
+
+#seconds spent in each startup phase of this process
+timings: dict[str, float] = {}
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+#tables present, plus whether each change create_all can't make to an existing table is still missing
+SCHEMA_STATE = text("""
+    SELECT
+        ARRAY(SELECT table_name::text FROM information_schema.tables
+              WHERE table_schema = current_schema() AND table_name = ANY(:names)) AS present,
+        to_regclass('venues') IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conname = 'unique_venue_name_address'
+        ) AS venue_unique_missing,
+        EXISTS (
+            SELECT 1 FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass('venues')
+            AND confdeltype <> 'c' AND conrelid::regclass::text = ANY(:names)
+        ) AS venue_cascade_missing,
+        ARRAY(SELECT b.name FROM unnest(CAST(:backfill_tables AS text[]), CAST(:backfill_notes AS text[])) b(name, note)
+              WHERE to_regclass(b.name) IS NOT NULL
+                AND obj_description(to_regclass(b.name), 'pg_class') IS DISTINCT FROM b.note) AS backfills_missing,
+        ARRAY(SELECT i FROM unnest(CAST(:indexes AS text[])) i WHERE to_regclass(i) IS NULL) AS indexes_missing
+""")
+
+#indexes added to tables that older databases already have (create_all only indexes new tables)
+UPGRADE_INDEXES = [
+    "ix_ratings_user_recent", "ix_ratings_user_score",  #keyset pages of a user's rated venues
+    "ix_photos_user_id", "ix_reviews_user_id",  #account deletion chunks (app.users.deletion)
+]
+
+#derived tables that writes only adjust are filled from their sources once; each table's comment
+#records that (a table created or left partial before then gets rebuilt)
+BACKFILLS = {
+    "venue_rankings": "backfilled from ratings",
+    "venue_trending": "backfilled from ratings, reviews and photos",
+    "venue_content_vectors": "backfilled from venues",
+}
+
+#foreign keys to venues from before they cascaded (reviews, photos and ratings on older databases)
+RESTRICTING_VENUE_FKS = text("""
+    SELECT c.conname, c.conrelid::regclass::text AS table_name, a.attname AS column_name
+    FROM pg_constraint c JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+    WHERE c.contype = 'f' AND c.confrelid = to_regclass('venues') AND c.confdeltype <> 'c'
+      AND c.conrelid::regclass::text = ANY(:names)
+""")
+
+DUPLICATE_VENUES = text("""
+    SELECT venue_name, address, array_agg(venue_id ORDER BY venue_id) AS venue_ids
+    FROM venues GROUP BY venue_name, address HAVING count(*) > 1
+    ORDER BY venue_name, address LIMIT 50
+""")
+
+#several workers start at once: upgrades run one at a time, each re-checking under the lock
+UPGRADE_LOCK = 0x636c7562
+
+#constraints this worker has seen in the database (code with a fallback for older databases asks here)
+_constraints: set[str] = set()
+
+
+def has_constraint(db, name: str) -> bool:
+    """Whether the constraint exists; a miss is asked again next time, a hit is remembered"""
+    if name not in _constraints and db.execute(
+            text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}).first():
+        _constraints.add(name)
+    return name in _constraints
+
+
+def upgrade_schema(engine) -> None:
+    """
+    Makes the changes create_all doesn't make to tables that already exist. Idempotent; a
+    step that can't be applied yet is logged and retried on the next start.
+    """
+    from app.models.models import Base
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": UPGRADE_LOCK})
+        names = list(Base.metadata.tables)
+        state = _schema_state(conn, names)
+        if state.venue_cascade_missing:
+            #deleting a venue relies on the database removing its children (venues.service.delete_venue)
+            for fk in conn.execute(RESTRICTING_VENUE_FKS, {"names": names}).all():
+                conn.execute(text(
+                    f'ALTER TABLE {fk.table_name} DROP CONSTRAINT "{fk.conname}", '
+                    f'ADD CONSTRAINT "{fk.conname}" FOREIGN KEY ({fk.column_name}) '
+                    f'REFERENCES venues (venue_id) ON DELETE CASCADE'
+                ))
+                logging.info(f"{fk.conname} now cascades venue deletes")
+        if state.venue_unique_missing:
+            _add_venue_unique(conn)
+        for table in state.backfills_missing:
+            _backfill(conn, table)
+        if state.indexes_missing:
+            _add_indexes(conn, Base.metadata, state.indexes_missing)
+
+
+def _schema_state(conn, names: list[str]):
+    return conn.execute(SCHEMA_STATE, {
+        "names": names, "backfill_tables": list(BACKFILLS), "backfill_notes": list(BACKFILLS.values()),
+        "indexes": UPGRADE_INDEXES
+    }).one()
+
+
+def _add_indexes(conn, metadata, missing: list[str]) -> None:
+    from sqlalchemy.schema import CreateIndex
+
+    #a one-off build that blocks writes to the table while it runs (no CONCURRENTLY inside a transaction)
+    for index in [index for table in metadata.tables.values() for index in table.indexes if index.name in missing]:
+        started = time.perf_counter()
+        conn.execute(CreateIndex(index, if_not_exists=True))
+        logging.info(f"Created {index.name} on {index.table.name} in {time.perf_counter() - started:.1f}s")
+
+
+def _backfill(conn, table: str) -> None:
+    from sqlalchemy.orm import Session
+    from app.recommendations import content
+    from app.venues import ranking, trending
+
+    if table == "venue_content_vectors" and not content.numpy_available():
+        logging.warning("NumPy/SciPy not installed, venue_content_vectors left for a start that has them")
+        return
+    rebuild = {"venue_rankings": ranking.rebuild, "venue_trending": trending.rebuild,
+               "venue_content_vectors": content.rebuild}[table]
+    started = time.perf_counter()
+    #rebuild commits, which releases a savepoint here: the upgrade transaction (and its lock) stays open
+    with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+        rows = rebuild(db)
+    conn.execute(text(f"COMMENT ON TABLE {table} IS '{BACKFILLS[table]}'"))
+    logging.info(f"Backfilled {table} for {rows} venues in {time.perf_counter() - started:.1f}s")
+
+
+def _add_venue_unique(conn) -> None:
+    duplicates = conn.execute(DUPLICATE_VENUES).all()
+    if duplicates:
+        #creates and imports keep checking for duplicates themselves until this is resolved
+        logging.error(
+            "Cannot add unique_venue_name_address, venues share a name and address "
+            "(merge or rename them, then restart): "
+            + "; ".join(f"{row.venue_name!r} at {row.address!r}: {row.venue_ids}" for row in duplicates)
+        )
+        return
+    conn.execute(text("ALTER TABLE venues ADD CONSTRAINT unique_venue_name_address UNIQUE (venue_name, address)"))
+    logging.info("Added unique_venue_name_address")
+
+
+def ensure_schema(engine) -> None:
+    """
+    Creates missing tables and applies pending upgrades; with the default mode a fully
+    migrated database costs one round trip
+    """
+    from app.models.models import Base
+
+    mode = os.getenv("SCHEMA_CHECK", "check").lower()
+    if mode == "skip":
+        return
+    if mode != "create":
+        names = list(Base.metadata.tables)
+        with engine.connect() as conn:
+            state = _schema_state(conn, names)
+        if len(state.present) == len(names) and not (
+                state.venue_unique_missing or state.venue_cascade_missing or state.backfills_missing
+                or state.indexes_missing):
+            return
+        if len(state.present) < len(names):
+            logging.info(f"Schema check found {len(state.present)}/{len(names)} tables, creating the missing ones")
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(target: str = "app.main") -> list[tuple[str, float, float]]:
+    """Runs `python -X importtime` in a fresh interpreter; returns (module, self_ms, cumulative_ms) for top-level imports"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+
+    packages: dict[str, list[float]] = defaultdict(lambda: [0.0, 0.0])
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        #app modules are reported individually, third-party ones per top-level package
+        key = module if module.startswith("app") else module.split(".")[0]
+        packages[key][0] += int(self_us) / 1000
+        #only the outermost import of a package counts towards its cumulative time
+        if len(indent) <= 1 or module.startswith("app"):
+            packages[key][1] = max(packages[key][1], int(cumulative_us) / 1000)
+    rows = [(name, round(v[0], 2), round(v[1], 2)) for name, v in packages.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def profile_init() -> dict[str, float]:
+    """Imports the app and runs its lifespan startup in this process, timing each phase"""
+    import asyncio
+
+    started = time.perf_counter()
+    from app.main import app
+    import_seconds = time.perf_counter() - started
+
+    async def run_lifespan():
+        async with app.router.lifespan_context(app):
+            pass
+
+    started = time.perf_counter()
+    asyncio.run(run_lifespan())
+    results = {"import app.main": import_seconds, "lifespan total": time.perf_counter() - started}
+    results.update({f"lifespan {name}": seconds for name, seconds in timings.items()})
+    return {name: round(seconds * 1000, 2) for name, seconds in results.items()}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Report cold-start cost per module and startup phase")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--top", type=int, default=25, help="modules to show")
+    parser.add_argument("--no-init", action="store_true", help="skip the lifespan run (no database needed)")
+    args = parser.parse_args(argv)
+
+    imports = profile_imports()[:args.top]
+    init = {} if args.no_init else profile_init()
+
+    if args.json:
+        print(json.dumps({
+            "imports_ms": {name: {"self": own, "cumulative": cumulative} for name, own, cumulative in imports},
+            "init_ms": init,
+        }, indent=2))
+        return
+
+    print(f"{'module':<45}{'self ms':>10}{'cumulative ms':>15}")
+    for name, own, cumulative in imports:
+        print(f"{name:<45}{own:>10}{cumulative:>15}")
+    if init:
+        print(f"\n{'startup phase':<45}{'ms':>10}")
+        for name, ms in init.items():
+            print(f"{name:<45}{ms:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#photo storage (Cloudinary), imported and configured on first use to keep it off the startup path
+import logging
+import os
+from functools import lru_cache
+
+
+#Cloudinary's bulk delete takes at most 100 public ids per call
+DELETE_BATCH = 100
+
+
+@lru_cache(maxsize=1)
+def _configured():
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET")
+    )
+    return cloudinary
+
+
+def uploader():
+    """Returns the configured cloudinary.uploader module"""
+    _configured()
+    import cloudinary.uploader
+    return cloudinary.uploader
+
+
+def admin_api():
+    """Returns the configured cloudinary.api module (bulk operations)"""
+    _configured()
+    import cloudinary.api
+    return cloudinary.api
+
+
+def delete_files(public_ids: list[str]) -> tuple[int, list[str]]:
+    """Deletes stored files DELETE_BATCH at a time; returns (deleted, public ids that failed)"""
+    deleted, failed = 0, []
+    for start in range(0, len(public_ids), DELETE_BATCH):
+        batch = public_ids[start:start + DELETE_BATCH]
+        try:
+            result = admin_api().delete_resources(batch).get("deleted", {})
+        except Exception as e:
+            logging.error(f"Failed to delete {len(batch)} files from Cloudinary: {e}")
+            failed.extend(batch)
+            continue
+        #"not_found" counts as gone
+        for public_id in batch:
+            if result.get(public_id) in ("deleted", "not_found"):
+                deleted += 1
+            else:
+                failed.append(public_id)
+    if failed:
+        logging.error(f"Could not delete {len(failed)} files from Cloudinary: {failed[:20]}")
+    return deleted, failed
+
+
+def public_id_from_url(img_url: str) -> str:
+    """
+    Extracts the Cloudinary public_id from a delivery URL
+    URL format: https://res.cloudinary.com/{cloud_name}/image/upload/{version}/{public_id}.{ext}
+    """
+    url_parts = img_url.split('/')
+    # public_id is everything after 'upload' (excluding version if present)
+    upload_index = url_parts.index('upload')
+    public_id_parts = url_parts[upload_index + 1:]
+
+    # Skip version number if present (starts with 'v' followed by digits)
+    if public_id_parts and public_id_parts[0].startswith('v') and public_id_parts[0][1:].isdigit():
+        public_id_parts = public_id_parts[1:]
+
+    # Join remaining parts and remove file extension
+    return '/'.join(public_id_parts).rsplit('.', 1)[0]
@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from app.core.database import DbSession
+from app.auth.service import CurrentUser, require_admin
+from app.models.models import VenueType
+from . import service
+
+router = APIRouter(
+    prefix="/admin/exports",
+    tags=["admin"]
+)
+
+
+# noinspection PyTypeHints
+@router.get("/{table}")
+def export_table(db: DbSession, current_user: CurrentUser,
+                 table: Literal["users", "venues", "reviews", "ratings"],
+                 format: Literal["ndjson", "csv"] = Query("ndjson"),
+                 after: Optional[int] = Query(None, description="Resume after this primary key (first column)"),
+                 limit: Optional[int] = Query(None, ge=1),
+                 since: Optional[datetime] = Query(None),
+                 until: Optional[datetime] = Query(None),
+                 venue_id: Optional[int] = Query(None),
+                 user_id: Optional[int] = Query(None),
+                 role: Optional[Literal["user", "admin", "mod"]] = Query(None),
+                 venue_type: Optional[VenueType] = Query(None)):
+    """Streams a whole table (admin only) in primary key order; rows are never held in memory"""
+    require_admin(current_user, db)
+    clauses = service.conditions(table, since, until, venue_id=venue_id, user_id=user_id,
+                                 role=role, venue_type=venue_type)
+    return StreamingResponse(
+        service.encode(table, format, service.stream_rows(table, clauses, after, limit)),
+        media_type=service.FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{table}.{format}"',
+            "X-Export-Resume-Key": service.column_names(table)[0],
+        }
+    )
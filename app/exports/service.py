@@ -0,0 +1,159 @@
+"""
+Streaming exports of whole tables for analytics.
+
+    python -m app.exports.service ratings --format csv --since 2026-01-01 > ratings.csv
+
+Rows are read in primary key order, EXPORT_CHUNK_ROWS per transaction. Each chunk is read
+through a server-side cursor (stream_results), so memory stays at one partition of rows
+whatever the table size, and no transaction lives longer than one chunk. Reads go to
+READ_REPLICA_URL when it is set. Every row starts with its primary key: an interrupted
+export resumes from after=<last key received>.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+from datetime import date, datetime
+from enum import Enum
+from typing import Iterator
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import ARRAY, select
+from app.core.database import replica_engine
+from app.core.metrics import EXPORT_ROWS
+from app.models.models import Rating, Review, User, Venue
+
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+PARTITION_ROWS = 1000
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+#per table: primary key (first column, the resume key), exported columns, time column for since/until,
+#and the columns that can be filtered on with equality (array columns match any element)
+EXPORTS = {
+    "users": {
+        "columns": [User.user_id, User.username, User.email, User.age, User.role],
+        "time": None,
+        "filters": {"role": User.role},
+    },
+    "venues": {
+        "columns": [Venue.venue_id, Venue.venue_name, Venue.address, Venue.hours, Venue.venue_type,
+                    Venue.age_req, Venue.description, Venue.capacity, Venue.price],
+        "time": None,
+        "filters": {"venue_type": Venue.venue_type},
+    },
+    "reviews": {
+        "columns": [Review.review_id, Review.venue_id, Review.user_id, Review.created_at, Review.review_text],
+        "time": Review.created_at,
+        "filters": {"venue_id": Review.venue_id, "user_id": Review.user_id},
+    },
+    "ratings": {
+        "columns": [Rating.rating_id, Rating.venue_id, Rating.user_id, Rating.rating, Rating.created_at],
+        "time": Rating.created_at,
+        "filters": {"venue_id": Rating.venue_id, "user_id": Rating.user_id},
+    },
+}
+
+
+def conditions(table: str, since: datetime | None = None, until: datetime | None = None, **filters) -> list:
+    """WHERE clauses for an export; raises 400 for filters the table doesn't have"""
+    spec = EXPORTS[table]
+    clauses = []
+    if since or until:
+        if spec["time"] is None:
+            raise HTTPException(status_code=400, detail=f"{table} cannot be filtered by time")
+        if since:
+            clauses.append(spec["time"] >= since)
+        if until:
+            clauses.append(spec["time"] < until)
+    for name, value in filters.items():
+        if value is None:
+            continue
+        column = spec["filters"].get(name)
+        if column is None:
+            raise HTTPException(status_code=400, detail=f"{table} cannot be filtered by {name}")
+        clauses.append(column.any(value) if isinstance(column.type, ARRAY) else column == value)
+    return clauses
+
+
+def column_names(table: str) -> list[str]:
+    return [column.name for column in EXPORTS[table]["columns"]]
+
+
+def stream_rows(table: str, clauses: list, after: int | None = None, limit: int | None = None) -> Iterator[list]:
+    """Yields partitions of rows in key order, one short read-only transaction per chunk"""
+    columns = EXPORTS[table]["columns"]
+    key = columns[0]
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = CHUNK_ROWS if remaining is None else min(CHUNK_ROWS, remaining)
+        statement = select(*columns).where(*clauses)
+        if after is not None:
+            statement = statement.where(key > after)
+        statement = statement.order_by(key).limit(size)
+
+        count = 0
+        with replica_engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=PARTITION_ROWS).execute(statement)
+            for partition in result.partitions(PARTITION_ROWS):
+                count += len(partition)
+                after = partition[-1][0]
+                yield partition
+        if remaining is not None:
+            remaining -= count
+        if count < size:
+            return
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return "|".join(str(_csv_value(item)) for item in value)
+    return value
+
+
+def encode(table: str, fmt: str, partitions: Iterator[list]) -> Iterator[bytes]:
+    """NDJSON (one object per line) or CSV with a header row; one chunk of bytes per partition"""
+    names = column_names(table)
+    rows = EXPORT_ROWS.labels(table, fmt)
+    if fmt == "ndjson":
+        for partition in partitions:
+            rows.inc(len(partition))
+            yield b"".join(orjson.dumps(dict(zip(names, row))) + b"\n" for row in partition)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for partition in partitions:
+        writer.writerows([_csv_value(value) for value in row] for row in partition)
+        rows.inc(len(partition))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()  #header of an empty export
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stream a table export to stdout")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--after", type=int, help="resume after this primary key")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    clauses = conditions(args.table, args.since, args.until)
+    for chunk in encode(args.table, args.format, stream_rows(args.table, clauses, args.after, args.limit)):
+        sys.stdout.buffer.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-import os
-import uvicorn
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 
 # Import routers
@@ -10,33 +14,51 @@ from app.venues import controller as venues_controller
 from app.reviews import controller as reviews_controller
 from app.ratings import controller as ratings_controller
 from app.photo import controller as photo_controller
+from app.exports import controller as exports_controller
 from app.protection.middleware import setup_middleware
-from app.protection.rate_limiting import limiter
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
 from app.core.database import engine
-from app.models.models import Base
-import cloudinary
-import cloudinary.uploader
+from app.core import metrics, startup
+from app.core.responses import FastJSONResponse, NegotiationMiddleware
+from app.recommendations import content
+from app.venues import activity, checkins
 
 load_dotenv()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Startup work runs here instead of at import time (no DDL or DB round trips on import)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.timings["import"] = time.perf_counter() - _import_started
+    with startup.phase("schema"):
+        await run_in_threadpool(startup.ensure_schema, engine)
+    with startup.phase("content_index"):
+        await run_in_threadpool(content.load, engine)
+    metrics.record_startup(startup.timings)
+    stop_flusher = asyncio.Event()
+    flusher = asyncio.create_task(checkins.maintain(stop_flusher))
+    yield
+    activity.hub.stop()
+    #last flush of this worker's check-ins
+    stop_flusher.set()
+    await flusher
+    metrics.mark_worker_dead()
 
 # Create FastAPI app instance
 app = FastAPI(
     title="Clubbies API", 
     version="0.1",
-    description="A nightlife venue review API"
+    description="A nightlife venue review API",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Setup security middleware
 setup_middleware(app)
 
-# Setup rate limiting
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Accept-header negotiation (JSON, MessagePack, CBOR) for FastJSONResponse
+app.add_middleware(NegotiationMiddleware)
+
+# Request metrics (outermost so latency covers the whole stack)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Register all routers
 app.include_router(auth_controller.router)
@@ -45,12 +67,9 @@ app.include_router(venues_controller.router)
 app.include_router(reviews_controller.router)
 app.include_router(ratings_controller.router)
 app.include_router(photo_controller.router)
+app.include_router(exports_controller.router)
+app.include_router(metrics.router)
 
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -61,4 +80,5 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
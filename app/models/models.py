@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, Float, CheckConstraint, Text, ForeignKey, Enum as SQEnum, UniqueConstraint
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Float, CheckConstraint, Text, ForeignKey, LargeBinary, Enum as SQEnum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.sql import func
@@ -43,9 +43,9 @@ class Photo(Base):
     content_type = Column(String(30), nullable=False)
     #relationships
     #each photo has a user with a user_id
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
     #each photo posted has a venue with a venue id
-    venue_id = Column(Integer, ForeignKey("venues.venue_id"), nullable=False)
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False)
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -55,9 +55,9 @@ class Review(Base):
 
     #relationships
     #each review is written by a user with a user id
-    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
     #each review has a venue with a venue id
-    venue_id = Column(Integer, ForeignKey("venues.venue_id"), nullable=False)
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False)
 
 
 class Rating(Base):
@@ -70,13 +70,16 @@ class Rating(Base):
     #each rating is by a user
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     #each rating is for a venue
-    venue_id = Column(Integer, ForeignKey("venues.venue_id"), nullable=False)
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False)
 
     __table_args__ = (
         CheckConstraint('rating <= 5'),
         CheckConstraint('rating > 0'),
         # Ensure one rating per user per venue
         UniqueConstraint('user_id', 'venue_id', name='unique_user_venue_rating'),
+        #keyset pages of a user's rated venues, newest first or by their score
+        Index("ix_ratings_user_recent", "user_id", created_at.desc(), rating_id.desc()),
+        Index("ix_ratings_user_score", "user_id", rating.desc(), rating_id.desc()),
     )
 
 
@@ -109,8 +112,118 @@ class Venue(Base):
     description = Column(String(255))
     capacity = Column(SQEnum(VenueCapacity), nullable=False)
     price = Column(Integer, nullable=False)
-    #relationships
-    reviews = relationship("Review", backref="venue", cascade="all, delete-orphan")
-    photos = relationship("Photo", backref="venue", cascade="all, delete-orphan")
-    ratings = relationship("Rating", backref="venue", cascade="all, delete-orphan")
+    #relationships (children are removed by the foreign keys' ON DELETE CASCADE, never loaded to be deleted)
+    reviews = relationship("Review", backref="venue", cascade="all, delete-orphan", passive_deletes=True)
+    photos = relationship("Photo", backref="venue", cascade="all, delete-orphan", passive_deletes=True)
+    ratings = relationship("Rating", backref="venue", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        #one venue per name and address (creates and imports upsert against it)
+        UniqueConstraint('venue_name', 'address', name='unique_venue_name_address'),
+    )
+
+
+#time-decayed activity score per venue, kept up to date on every rating/review/photo write
+#log_score = log(sum of weight * 2^((event_time - epoch) / half_life)), so ordering by it is ordering by current heat
+class VenueTrending(Base):
+    __tablename__ = "venue_trending"
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), primary_key=True)
+    city = Column(String(100))  #lower-cased, parsed from the address
+    venue_type = Column(ARRAY(SQEnum(VenueType)), nullable=False)
+    log_score = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_venue_trending_score", log_score.desc()),
+        Index("ix_venue_trending_city_score", city, log_score.desc()),
+    )
+
+
+#precomputed leaderboard: Bayesian (damped) average per rated venue, kept up to date by rating writes
+class VenueRanking(Base):
+    __tablename__ = "venue_rankings"
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), primary_key=True)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Float, nullable=False, default=0)
+    bayes_score = Column(Float, nullable=False)
+    venue_type = Column(ARRAY(SQEnum(VenueType)), nullable=False)
+    price = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_venue_rankings_score", bayes_score.desc(), venue_id.desc()),
+    )
+
+
+#offline collaborative filtering output (python -m app.recommendations.build), rank 1 = best
+class VenueSimilarity(Base):
+    __tablename__ = "venue_similarities"
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(SmallInteger, primary_key=True)
+    similar_venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float, nullable=False)
+
+
+class UserRecommendation(Base):
+    __tablename__ = "user_recommendations"
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(SmallInteger, primary_key=True)
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float, nullable=False)  #predicted rating
+
+
+#hashed term counts per venue for content-based similarity (app.recommendations.content)
+class VenueContentVector(Base):
+    __tablename__ = "venue_content_vectors"
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), primary_key=True)
+    features = Column(LargeBinary, nullable=False)  #int32 feature ids
+    weights = Column(LargeBinary, nullable=False)  #float32 counts
+    updated_at = Column(DateTime, default=func.now(), nullable=False, index=True)
+
+
+#"people here now": check-ins per venue per time bucket, added up in memory and flushed in batches (app.venues.checkins)
+class VenueCheckin(Base):
+    __tablename__ = "venue_checkins"
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  #bucket start, UTC
+    count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_venue_checkins_bucket", bucket),
+    )
+
+
+#shared token buckets for the rate limiter (UNLOGGED: no WAL, contents may be lost on crash)
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    bucket_key = Column(String(200), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    last_taken = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+
+#account deletions run in the background in small transactions (app.users.deletion); one row per request
+class AccountDeletion(Base):
+    __tablename__ = "account_deletions"
+    job_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)  #no foreign key: the user is gone when the job finishes
+    requested_by = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  #pending, running, done, failed
+    phase = Column(String(20), nullable=False, default="ratings")  #ratings, reviews, photos, account, finished
+    ratings_deleted = Column(Integer, nullable=False, default=0)
+    reviews_deleted = Column(Integer, nullable=False, default=0)
+    photos_deleted = Column(Integer, nullable=False, default=0)
+    files_deleted = Column(Integer, nullable=False, default=0)
+    files_failed = Column(Integer, nullable=False, default=0)
+    error = Column(String(500))
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), nullable=False)  #heartbeat while running
+    finished_at = Column(DateTime)
+
 
+#storage files of a deletion job's photos, listed with the row delete and removed once the file is gone
+class AccountDeletionFile(Base):
+    __tablename__ = "account_deletion_files"
+    job_id = Column(Integer, ForeignKey("account_deletions.job_id", ondelete="CASCADE"), primary_key=True)
+    public_id = Column(String(255), primary_key=True)
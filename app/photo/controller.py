@@ -1,9 +1,12 @@
 from typing import Optional
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends
+from fastapi import APIRouter, UploadFile, File, Form, Depends, Query
 from starlette import status
 from app.core.database import DbSession
 from app.auth.service import CurrentUser, require_admin
+from app.core.responses import FastJSONResponse
+from app.core.fields import parse_fields
+from app.protection.rate_limiting import rate_limit
 from . import p_model
 from . import service
 from app.models.models import Photo
@@ -16,7 +19,8 @@ router = APIRouter(
 
 
 # noinspection PyTypeHints
-@router.post("/upload", status_code=status.HTTP_200_OK)
+@router.post("/upload", status_code=status.HTTP_200_OK,
+             dependencies=[rate_limit("photo_upload", "30/hour", per="user")])
 async def upload_photo(db: DbSession,
                        current_user: CurrentUser,
                        file: UploadFile = File(...),
@@ -29,18 +33,7 @@ async def upload_photo(db: DbSession,
     photo_data = p_model.PhotoBase(venue_id=venue_id, caption=caption)
     photo = await service.create_photo(db, photo_data, current_user_id, file)
 
-    return p_model.PhotoResponse(
-        photo_id=photo.photo_id,
-        img_url=photo.img_url,
-        caption=photo.caption,
-        file_size=photo.file_size,
-        username=photo.user.username,
-        uploaded_at=photo.uploaded_at,
-        venue_id=photo.venue_id,
-        user_id=current_user_id,
-        venue_name=photo.venue.venue_name,
-        content_type=photo.content_type
-    )
+    return FastJSONResponse(p_model.PhotoResponse.trusted(photo))
 
 
 # noinspection PyTypeHints
@@ -64,56 +57,26 @@ async def update_photo(db: DbSession, photo_id: int, new_caption: str, current_u
 
 @router.get("/venues/{venue_id}")
 def get_venue_photos(db: DbSession, venue_id: int, after_photo_id:
-Optional[int] = None, limit: int = 20):
+Optional[int] = None, limit: int = 20,
+                     fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. img_url,caption")):
+    selected = parse_fields(fields, service.PHOTO_COLUMNS, "photo_id")
     photos = service.get_photos_by_venue(db, venue_id,
-                                         after_photo_id, limit)
+                                         after_photo_id, limit, selected)
 
-    # Convert SQLAlchemy objects to Pydantic models
-    photo_responses = [
-        p_model.PhotoResponse(
-            photo_id=photo.photo_id,
-            img_url=photo.img_url,
-            caption=photo.caption,
-            file_size=photo.file_size,
-            content_type=photo.content_type,
-            user_id=photo.user_id,
-            username=photo.user.username,
-            venue_id=photo.venue_id,
-            venue_name=photo.venue.venue_name,
-            uploaded_at=photo.uploaded_at
-        )
-        for photo in photos
-    ]
-
-    return {
-        'photos': photo_responses,
+    return FastJSONResponse({
+        'photos': [photo._asdict() for photo in photos],
         "has_more": len(photos) == limit,
         'next_cursor': photos[-1].photo_id if photos else None
-    }
+    })
 
 @router.get('/users/{user_id}', status_code=status.HTTP_200_OK)
-def get_user_photos(db: DbSession, user_id: int, after_photo_id: Optional[int] = None, limit: int = 20):
-    photos = service.get_photos_by_user(db, user_id, after_photo_id, limit)
-
-    # Convert SQLAlchemy objects to Pydantic models
-    photo_responses = [
-        p_model.PhotoResponse(
-            photo_id=photo.photo_id,
-            img_url=photo.img_url,
-            caption=photo.caption,
-            file_size=photo.file_size,
-            content_type=photo.content_type,
-            user_id=photo.user_id,
-            username=photo.user.username,
-            venue_id=photo.venue_id,
-            venue_name=photo.venue.venue_name,
-            uploaded_at=photo.uploaded_at
-        )
-        for photo in photos
-    ]
+def get_user_photos(db: DbSession, user_id: int, after_photo_id: Optional[int] = None, limit: int = 20,
+                    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. img_url,venue_name")):
+    selected = parse_fields(fields, service.PHOTO_COLUMNS, "photo_id")
+    photos = service.get_photos_by_user(db, user_id, after_photo_id, limit, selected)
 
-    return {
-        'photos': photo_responses,
+    return FastJSONResponse({
+        'photos': [photo._asdict() for photo in photos],
         "has_more": len(photos) == limit,
         'next_cursor': photos[-1].photo_id if photos else None
-    }
\ No newline at end of file
+    })
\ No newline at end of file
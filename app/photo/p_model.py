@@ -20,3 +20,19 @@ class PhotoResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+    @classmethod
+    def trusted(cls, photo) -> "PhotoResponse":
+        """Builds the response from a loaded photo (with user and venue) without re-validating it"""
+        return cls.model_construct(
+            photo_id=photo.photo_id,
+            img_url=photo.img_url,
+            caption=photo.caption,
+            file_size=photo.file_size,
+            content_type=photo.content_type,
+            user_id=photo.user_id,
+            username=photo.user.username,
+            venue_id=photo.venue_id,
+            venue_name=photo.venue.venue_name,
+            uploaded_at=photo.uploaded_at
+        )
@@ -1,19 +1,33 @@
 import os
+import time
 from datetime import datetime, timezone
-import cloudinary
-import cloudinary.uploader
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.orm import Session
 from . import p_model
 from fastapi import UploadFile, HTTPException
 from app.models.models import Photo, Venue, User
+from app.core.metrics import UPLOAD_BYTES, UPLOAD_DURATION
+from app.core import storage
+from app.core.fields import project
+from app.venues import activity, trending
 import logging
 import uuid
 from typing import List
 from sqlalchemy.exc import IntegrityError
-from PIL import Image
 import io
 
+#columns a photo list can be narrowed to with fields= (username / venue_name cost a join each)
+PHOTO_COLUMNS = {
+    "photo_id": Photo.photo_id, "img_url": Photo.img_url, "caption": Photo.caption, "file_size": Photo.file_size,
+    "content_type": Photo.content_type, "user_id": Photo.user_id, "username": User.username,
+    "venue_id": Photo.venue_id, "venue_name": Venue.venue_name, "uploaded_at": Photo.uploaded_at,
+}
+PHOTO_JOINS = {"username": (User, User.user_id == Photo.user_id),
+               "venue_name": (Venue, Venue.venue_id == Photo.venue_id)}
+
+
 async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int, file: UploadFile) -> Photo:
+    started = time.perf_counter()
     try:
         #validate file type - accept any image or octet-stream (iOS image_picker sends this)
         valid_content_types = file.content_type and (
@@ -44,6 +58,7 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
         if len(file_content) > 10 * 1024 * 1024:
             raise HTTPException(status_code=413, detail="File too large. Maximum size is 10MB")
         try:
+            from PIL import Image  #imported on first upload, not at startup
             Image.open(io.BytesIO(file_content)).verify()
         except Exception as img_error:
             logging.error(f"Image validation failed for file: {file.filename}, error: {str(img_error)}")
@@ -51,7 +66,7 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
         # Upload to Cloudinary
         cloudinary_public_id = None
         try:
-            upload_res = cloudinary.uploader.upload(
+            upload_res = storage.uploader().upload(
                 file_content,
                 folder=f"clubbies/venues/{photo_data.venue_id}",
                 public_id=unique_filename.split('.')[0],
@@ -81,6 +96,9 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
                 uploaded_at=datetime.now(timezone.utc),
             )
             db.add(photo)
+            trending.record_activity(db, photo_data.venue_id, "photo")
+            db.flush()
+            activity.publish(db, "photo", photo.photo_id)
             db.commit()
             db.refresh(photo)
 
@@ -89,7 +107,7 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
             db.rollback()
             if cloudinary_public_id:
                 try:
-                    cloudinary.uploader.destroy(cloudinary_public_id)
+                    storage.uploader().destroy(cloudinary_public_id)
                     logging.info(f"Cleaned up Cloudinary upload: {cloudinary_public_id}")
                 except Exception as cleanup_error:
                     logging.error(f"Failed to cleanup Cloudinary upload: {cleanup_error}")
@@ -104,12 +122,14 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
             db.rollback()
             if cloudinary_public_id:
                 try:
-                    cloudinary.uploader.destroy(cloudinary_public_id)
+                    storage.uploader().destroy(cloudinary_public_id)
                     logging.info(f"Cleaned up Cloudinary upload: {cloudinary_public_id}")
                 except Exception as cleanup_error:
                     logging.error(f"Failed to cleanup Cloudinary upload: {cleanup_error}")
             raise HTTPException(status_code=500, detail="Failed to save photo to database")
 
+        UPLOAD_BYTES.observe(len(file_content))
+        UPLOAD_DURATION.observe(time.perf_counter() - started)
         return photo
 
     except HTTPException:
@@ -120,25 +140,27 @@ async def create_photo(db: Session, photo_data: p_model.PhotoBase, user_id: int,
         raise HTTPException(status_code=500, detail=f"Failed to upload photo: {str(e)}")
 
 def get_photo_by_id(db: Session, picture_id: int) -> Photo:
-    photo = db.query(Photo).get(picture_id)
+    photo = db.get(Photo, picture_id)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     return photo
 
 
 # noinspection PyTypeChecker
-def get_photos_by_venue(db: Session, venue_id: int, after_photo_id: int = None, limit: int = 20) -> List[Photo]:
+def get_photos_by_venue(db: Session, venue_id: int, after_photo_id: int = None, limit: int = 20,
+                        fields: list[str] = None) -> List:
+    """Rows of the given fields (all of them by default)"""
     try:
-        venue = db.query(Venue).filter(Venue.venue_id == venue_id).first()
+        venue = db.scalar(select(Venue.venue_id).where(Venue.venue_id == venue_id))
         if not venue:
             raise HTTPException(status_code=404, detail="Venue not found")
             
-        query = db.query(Photo).options(joinedload(Photo.user), joinedload(Photo.venue)).filter(Photo.venue_id == venue_id)
+        statement = project(Photo, fields, PHOTO_COLUMNS, PHOTO_JOINS).where(Photo.venue_id == venue_id)
 
         if after_photo_id:
-            query = query.filter(Photo.photo_id < after_photo_id)
+            statement = statement.where(Photo.photo_id < after_photo_id)
 
-        photos = query.order_by(Photo.photo_id.desc()).limit(limit).all()
+        photos = db.execute(statement.order_by(Photo.photo_id.desc()).limit(limit)).all()
         
         logging.info(f"Retrieved {len(photos)} photos for venue {venue_id}")
         return photos
@@ -149,18 +171,20 @@ def get_photos_by_venue(db: Session, venue_id: int, after_photo_id: int = None,
 
 
 # noinspection PyTypeChecker
-def get_photos_by_user(db: Session, user_id: int, after_photo_id: int = None, limit: int = 20) -> List[Photo]:
+def get_photos_by_user(db: Session, user_id: int, after_photo_id: int = None, limit: int = 20,
+                       fields: list[str] = None) -> List:
+    """Rows of the given fields (all of them by default)"""
     try:
-        user = db.query(User).filter(User.user_id == user_id).first()
+        user = db.scalar(select(User.user_id).where(User.user_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
             
-        query = db.query(Photo).filter(Photo.user_id == user_id)
+        statement = project(Photo, fields, PHOTO_COLUMNS, PHOTO_JOINS).where(Photo.user_id == user_id)
 
         if after_photo_id:
-            query = query.filter(Photo.photo_id < after_photo_id)
+            statement = statement.where(Photo.photo_id < after_photo_id)
 
-        photos = query.order_by(Photo.photo_id.desc()).limit(limit).all()
+        photos = db.execute(statement.order_by(Photo.photo_id.desc()).limit(limit)).all()
         
         logging.info(f"Retrieved {len(photos)} photos for user {user_id}")
         return photos
@@ -175,24 +199,11 @@ def delete_photo(db: Session, photo_id: int) -> None:
     try:
         photo = get_photo_by_id(db, photo_id)
 
-        # Extract public_id from Cloudinary URL
-        # URL format: https://res.cloudinary.com/{cloud_name}/image/upload/{version}/{public_id}.{ext}
         try:
-            url_parts = photo.img_url.split('/')
-            # Find 'upload' in the URL and get everything after it
-            upload_index = url_parts.index('upload')
-            # public_id is everything after 'upload' (excluding version if present)
-            public_id_parts = url_parts[upload_index + 1:]
-
-            # Skip version number if present (starts with 'v' followed by digits)
-            if public_id_parts and public_id_parts[0].startswith('v') and public_id_parts[0][1:].isdigit():
-                public_id_parts = public_id_parts[1:]
-
-            # Join remaining parts and remove file extension
-            public_id = '/'.join(public_id_parts).rsplit('.', 1)[0]
+            public_id = storage.public_id_from_url(photo.img_url)
 
             # Delete from Cloudinary
-            cloudinary.uploader.destroy(public_id)
+            storage.uploader().destroy(public_id)
             logging.info(f"Deleted photo from Cloudinary: {public_id}")
 
         except Exception as cloudinary_error:
@@ -0,0 +1,255 @@
+#response compression: br / zstd / gzip negotiated from Accept-Encoding, with a cache of
+#precompressed bodies keyed by (ETag, encoding) so hot pages are compressed once
+import gzip
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import COMPRESSION_SECONDS, RESPONSE_BYTES, record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#server preference when the client accepts several encodings equally
+PREFERENCE = ("br", "zstd", "gzip")
+#already compressed or long-lived streams
+SKIP_TYPES = ("image/", "video/", "audio/", "text/event-stream", "application/zip", "application/gzip")
+
+
+def available_encodings() -> list[str]:
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def choose_encoding(accept_encoding: str, supported: list[str]) -> str | None:
+    """Highest q wins, ties broken by PREFERENCE; None means identity"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for encoding in PREFERENCE:
+        if encoding not in supported:
+            continue
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class Compressors:
+    """One-shot and streaming compressors at the configured levels"""
+
+    def __init__(self, gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3):
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self._zstd = zstandard.ZstdCompressor(level=zstd_level) if zstandard is not None else None
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "zstd":
+            return self._zstd.compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def stream(self, encoding: str):
+        """Returns (compress_chunk, finish) that flush after every chunk so streamed rows arrive promptly"""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+        if encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+            return ((lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)),
+                    compressor.flush)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+
+class CompressedCache:
+    """LRU of compressed bodies bounded by total bytes; only touched from the event loop thread"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+    def get(self, etag: str, encoding: str) -> bytes | None:
+        body = self.entries.get((etag, encoding))
+        if body is not None:
+            self.entries.move_to_end((etag, encoding))
+        return body
+
+    def put(self, etag: str, encoding: str, body: bytes) -> None:
+        if len(body) > self.max_bytes // 8:
+            return
+        key = (etag, encoding)
+        if key in self.entries:
+            return
+        self.entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI replacement for GZipMiddleware.
+    Complete (single-message) bodies of public GET responses get a weak ETag and
+    their compressed forms are cached; conditional requests get 304. Streaming
+    bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, gzip_level: int = 6, brotli_quality: int = 4,
+                 zstd_level: int = 3, cache_bytes: int = 32 * 1024 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.supported = available_encodings()
+        self.compressors = Compressors(gzip_level, brotli_quality, zstd_level)
+        self.cache = CompressedCache(cache_bytes) if cache_bytes > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""), self.supported)
+        #responses to authenticated requests may be per-user, so they are compressed but never cached
+        cacheable = scope["method"] == "GET" and "authorization" not in request_headers
+        if_none_match = request_headers.get("if-none-match")
+
+        start_message: Message | None = None
+        streaming = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            if streaming is not None:
+                await streaming(message)
+                return
+
+            headers = MutableHeaders(scope=start_message)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            content_type = headers.get("content-type", "")
+            skip = ("content-encoding" in headers or content_type.startswith(SKIP_TYPES)
+                    or start_message["status"] < 200 or start_message["status"] in (204, 304))
+
+            if skip:
+                streaming = self._passthrough(send)
+                await send(start_message)
+                await send(message)
+                return
+
+            if more_body:
+                if encoding is None:
+                    streaming = self._passthrough(send)
+                    await send(start_message)
+                    await send(message)
+                    return
+                streaming = self._stream(encoding, headers, send)
+                await streaming(message, start=start_message)
+                return
+
+            await self._send_complete(body, encoding, headers, cacheable and start_message["status"] == 200,
+                                      if_none_match, start_message, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _passthrough(send: Send):
+        async def forward(message: Message) -> None:
+            await send(message)
+        return forward
+
+    def _stream(self, encoding: str, headers: MutableHeaders, send: Send):
+        compress_chunk, finish = self.compressors.stream(encoding)
+        headers["Content-Encoding"] = encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["content-length"]
+
+        async def forward(message: Message, start: Message | None = None) -> None:
+            if start is not None:
+                await send(start)
+            started = time.perf_counter()
+            chunk = compress_chunk(message.get("body", b""))
+            if not message.get("more_body", False):
+                chunk += finish()
+            COMPRESSION_SECONDS.labels(encoding).observe(time.perf_counter() - started)
+            RESPONSE_BYTES.labels(encoding, "original").inc(len(message.get("body", b"")))
+            RESPONSE_BYTES.labels(encoding, "wire").inc(len(chunk))
+            await send({"type": "http.response.body", "body": chunk, "more_body": message.get("more_body", False)})
+
+        return forward
+
+    async def _send_complete(self, body: bytes, encoding: str | None, headers: MutableHeaders, cacheable: bool,
+                             if_none_match: str | None, start_message: Message, send: Send) -> None:
+        etag = headers.get("etag")
+        if cacheable and etag is None:
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            headers["ETag"] = etag
+        if cacheable and if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            not_modified = MutableHeaders(raw=[(k, v) for k, v in start_message["headers"]
+                                               if k not in (b"content-length", b"content-type")])
+            await send({"type": "http.response.start", "status": 304, "headers": not_modified.raw})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if encoding is None or len(body) < self.minimum_size:
+            if len(body) >= self.minimum_size:
+                headers.add_vary_header("Accept-Encoding")
+            RESPONSE_BYTES.labels("identity", "wire").inc(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        compressed = None
+        use_cache = cacheable and self.cache is not None
+        if use_cache:
+            compressed = self.cache.get(etag, encoding)
+            record_cache("compression", compressed is not None)
+        if compressed is None:
+            started = time.perf_counter()
+            compressed = self.compressors.compress(encoding, body)
+            COMPRESSION_SECONDS.labels(encoding).observe(time.perf_counter() - started)
+            if use_cache:
+                self.cache.put(etag, encoding, compressed)
+
+        RESPONSE_BYTES.labels(encoding, "original").inc(len(body))
+        RESPONSE_BYTES.labels(encoding, "wire").inc(len(compressed))
+        headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        await send(start_message)
+        await send({"type": "http.response.body", "body": compressed})
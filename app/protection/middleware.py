@@ -1,45 +1,74 @@
 import os
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.middleware.gzip import GZipMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from app.protection.compression import CompressionMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Add security headers to all responses."""
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Security headers
-        response.headers["X-Frame-Options"] = "DENY"  # Prevent clickjacking
-        response.headers["X-Content-Type-Options"] = "nosniff"  # Prevent MIME sniffing
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"  # Control referrer info
-        response.headers["X-XSS-Protection"] = "1; mode=block"  # XSS protection
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"  # Limit browser features
-        
+class SecurityHeadersMiddleware:
+    """Add security headers to all responses (pure ASGI, headers built once at startup)."""
+
+    def __init__(self, app: ASGIApp, production: bool = False):
+        self.app = app
+        headers = {
+            "X-Frame-Options": "DENY",  # Prevent clickjacking
+            "X-Content-Type-Options": "nosniff",  # Prevent MIME sniffing
+            "Referrer-Policy": "strict-origin-when-cross-origin",  # Control referrer info
+            "X-XSS-Protection": "1; mode=block",  # XSS protection
+            "Permissions-Policy": "geolocation=(), microphone=(), camera=()",  # Limit browser features
+        }
         # Only add CSP in production (can interfere with dev tools)
-        if os.getenv("ENVIRONMENT") == "production":
-            response.headers["Content-Security-Policy"] = (
+        if production:
+            headers["Content-Security-Policy"] = (
                 "default-src 'self'; "
                 "script-src 'self'; "
                 "style-src 'self' 'unsafe-inline'; "
                 "img-src 'self' data: https:; "
                 "connect-src 'self'"
             )
-        
-        return response
+        self.raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        self.names = {name for name, _ in self.raw_headers}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # Our values replace any the endpoint set
+                existing = [header for header in message.get("headers", []) if header[0] not in self.names]
+                message["headers"] = existing + self.raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class ScopedSessionMiddleware:
+    """Runs SessionMiddleware only for paths under the given prefixes; everything else skips cookie signing."""
+
+    def __init__(self, app: ASGIApp, path_prefixes: list[str], **session_options):
+        self.app = app
+        self.prefixes = tuple(path_prefixes)
+        self.session_app = SessionMiddleware(app, **session_options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket") and scope["path"].startswith(self.prefixes):
+            await self.session_app(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
 
 
 def setup_middleware(app: FastAPI) -> None:
-    """Configure all security middleware for the FastAPI app."""
+    """Configure all security middleware for the FastAPI app (settings are read once, here)."""
+    environment = os.getenv("ENVIRONMENT")
     
     # HTTPS redirect (prod only)
     #forces all HTTP requests to redirect to HTTPS (MITM protection)
-    if os.getenv('ENVIRONMENT') == "production":
+    if environment == "production":
         app.add_middleware(HTTPSRedirectMiddleware)
     
     # Trusted Host Protection
@@ -47,25 +76,35 @@ def setup_middleware(app: FastAPI) -> None:
     allowed_hosts = os.getenv("ALLOWED_HOSTS").split(",")
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=allowed_hosts)
     
-    # GZIP compression (reduces bandwith)
-    #improves load time
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    # Compression (br / zstd / gzip, reduces bandwith)
+    #improves load time; public GET pages are compressed once and cached by ETag
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1000")),
+        gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+        zstd_level=int(os.getenv("ZSTD_LEVEL", "3")),
+        cache_bytes=int(os.getenv("COMPRESSION_CACHE_MB", "32")) * 1024 * 1024,
+    )
     
     # Session middleware
-    #server side sessions enabling
+    #the API authenticates with bearer tokens, so cookie sessions are only
+    #installed for the path prefixes listed in SESSION_PATHS (none by default)
     secret_key = os.getenv("SECRET_KEY")
     if not secret_key:
         raise ValueError("SECRET_KEY environment variable is required")
-    
-    app.add_middleware(
-        SessionMiddleware,
-        secret_key=secret_key,
-        https_only=os.getenv("ENVIRONMENT") == 'production',
-        same_site='lax' if os.getenv("MOBILE_DEV") == "true" else 'strict'
-    )
+
+    session_paths = [path.strip() for path in os.getenv("SESSION_PATHS", "").split(",") if path.strip()]
+    if session_paths:
+        app.add_middleware(
+            ScopedSessionMiddleware,
+            path_prefixes=session_paths,
+            secret_key=secret_key,
+            https_only=environment == 'production',
+            same_site='lax' if os.getenv("MOBILE_DEV") == "true" else 'strict'
+        )
     
     # CORS - Mobile app friendly configuration
-    environment = os.getenv("ENVIRONMENT")
     
     if environment == "production":
         # Production: specific domains only
@@ -101,4 +140,4 @@ def setup_middleware(app: FastAPI) -> None:
     )
     
     # Add security headers middleware
-    app.add_middleware(SecurityHeadersMiddleware)
\ No newline at end of file
+    app.add_middleware(SecurityHeadersMiddleware, production=environment == "production")
\ No newline at end of file
@@ -1,4 +1,227 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+#token-bucket rate limiting shared by every worker and instance
+#
+#RATE_LIMIT_BACKEND: "postgres" (shared, default in production) or "memory" (this process only)
+#RATE_LIMIT_<SCOPE>: overrides a route's budget, e.g. RATE_LIMIT_LOGIN=20/minute
+#TRUSTED_PROXY_HOPS: proxies whose X-Forwarded-For entry identifies the client (1 in production)
+import logging
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import text
+from app.core.metrics import RATE_LIMIT_DECISIONS, RATE_LIMIT_SECONDS
 
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+#in-process maps are swept at most this often, so no single request pays for a full scan
+PRUNE_SECONDS = 60
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: int
+    per_second: float
+
+    @classmethod
+    def parse(cls, limit: str) -> "Rate":
+        """Parses budgets like "5/hour" or "100/minute" (bucket size = count, refilled evenly over the period)"""
+        count, _, period = limit.partition("/")
+        seconds = PERIODS[period.strip().rstrip("s")]
+        return cls(capacity=int(count), per_second=int(count) / seconds)
+
+
+class MemoryBackend:
+    """Buckets held in this process; for local runs and single-worker deployments"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #key -> (tokens, updated, time the bucket is full again)
+        self.buckets: dict[str, tuple[float, float, float]] = {}
+        self.pruned = time.monotonic()
+
+    def take(self, key: str, rate: Rate, want: int) -> tuple[int, float]:
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (rate.capacity, now, now))
+            tokens = min(rate.capacity, tokens + (now - updated) * rate.per_second)
+            taken = min(want, math.floor(tokens)) if tokens >= 1 else 0
+            left = tokens - taken
+            self.buckets[key] = (left, now, now + (rate.capacity - left) / rate.per_second)
+            if now - self.pruned >= PRUNE_SECONDS:
+                self._prune(now)
+            return taken, left
+
+    def _prune(self, now: float) -> None:
+        #a bucket that has refilled to capacity is the same as no bucket, dropping it changes nothing
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if bucket[2] > now}
+        self.pruned = now
+
+
+class PostgresBackend:
+    """Buckets in the rate_limit_buckets table; refill, take and store happen in one autocommit statement"""
+
+    TAKE = text("""
+        INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, last_taken, updated_at)
+        VALUES (:key, :capacity - LEAST(:want, :capacity), LEAST(:want, :capacity), now())
+        ON CONFLICT (bucket_key) DO UPDATE SET (tokens, last_taken, updated_at) = (
+            SELECT r.refilled - r.taken, r.taken, now()
+            FROM (
+                SELECT s.refilled,
+                       CASE WHEN s.refilled >= 1 THEN LEAST(:want, floor(s.refilled)) ELSE 0 END AS taken
+                FROM (SELECT LEAST(:capacity,
+                                   b.tokens + EXTRACT(EPOCH FROM now() - b.updated_at) * :per_second) AS refilled) s
+            ) r
+        )
+        RETURNING last_taken, tokens
+    """)
+    PRUNE = text("DELETE FROM rate_limit_buckets WHERE updated_at < now() - interval '1 day'")
+
+    def __init__(self, engine):
+        #autocommit: no BEGIN/COMMIT round trips around the single statement
+        self.engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+    def take(self, key: str, rate: Rate, want: int) -> tuple[int, float]:
+        with self.engine.connect() as conn:
+            taken, tokens = conn.execute(self.TAKE, {
+                "key": key, "capacity": float(rate.capacity), "want": float(want), "per_second": rate.per_second
+            }).one()
+            if random.random() < 0.001:
+                conn.execute(self.PRUNE)
+        return int(taken), float(tokens)
+
+
+@dataclass
+class Lease:
+    tokens: int
+    expires: float
+
+
+class RateLimiter:
+    """
+    Token buckets in a shared backend with an in-process fast path.
+    When the backend last reported a bucket at least half full, this worker leases a
+    slice of it (lease_fraction of the capacity) and spends it locally, so clients far
+    from their limit cost one backend call per lease. Near the limit every request
+    goes to the backend, one token at a time. Leases expire after lease_seconds and
+    unused tokens are forfeited, which can only make the limit stricter.
+    """
+
+    def __init__(self, backend, lease_fraction: float = 0.1, lease_seconds: float = 5.0):
+        self.backend = backend
+        self.lease_fraction = lease_fraction
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        self.leases: dict[str, Lease] = {}
+        #key -> (tokens the backend reported left, when); only a hint, so entries expire on their own
+        self.last_left: dict[str, tuple[float, float]] = {}
+        self.pruned = time.monotonic()
+
+    def hit(self, key: str, rate: Rate) -> tuple[bool, float]:
+        """Returns (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self.lock:
+            lease = self.leases.get(key)
+            if lease is not None and lease.tokens > 0 and lease.expires > now:
+                lease.tokens -= 1
+                return True, 0.0
+            want = 1
+            left, _ = self.last_left.get(key, (0, now))
+            if left >= rate.capacity / 2:
+                want = max(1, int(rate.capacity * self.lease_fraction))
+
+        taken, left = self.backend.take(key, rate, want)
+
+        with self.lock:
+            self.last_left[key] = (left, now)
+            if taken > 1:
+                self.leases[key] = Lease(tokens=taken - 1, expires=now + self.lease_seconds)
+            else:
+                self.leases.pop(key, None)
+            if now - self.pruned >= PRUNE_SECONDS:
+                self._prune(now)
+        if taken >= 1:
+            return True, 0.0
+        return False, (1 - left) / rate.per_second
+
+    def _prune(self, now: float) -> None:
+        #a forgotten hint only means the next request asks the backend for one token
+        self.leases = {key: lease for key, lease in self.leases.items() if lease.expires > now}
+        self.last_left = {key: hint for key, hint in self.last_left.items() if now - hint[1] < PRUNE_SECONDS}
+        self.pruned = now
+
+
+def _build_limiter() -> RateLimiter:
+    default = "postgres" if os.getenv("ENVIRONMENT") == "production" else "memory"
+    backend_name = os.getenv("RATE_LIMIT_BACKEND", default).lower()
+    if backend_name == "postgres":
+        from app.core.database import engine
+        return RateLimiter(PostgresBackend(engine))
+    return RateLimiter(MemoryBackend())
+
+
+limiter = _build_limiter()
+#for routes that must not reach the database per request: budgets are per worker
+local_limiter = RateLimiter(MemoryBackend())
+
+
+#proxies in front of the app that append the peer they saw to X-Forwarded-For (Render's load
+#balancer is one). The client is that many entries from the right: anything further left was sent
+#by the client and can't be trusted. 0 uses the socket peer (local runs, no proxy).
+PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1" if os.getenv("ENVIRONMENT") == "production" else "0"))
+
+
+def _client_ip(request: Request) -> str:
+    if PROXY_HOPS:
+        hosts = [host.strip() for host in request.headers.get("x-forwarded-for", "").split(",") if host.strip()]
+        if len(hosts) >= PROXY_HOPS:
+            return hosts[-PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _user_id(request: Request) -> str | None:
+    #the route's own CurrentUser dependency rejects bad tokens; here they just fall back to the IP
+    import jwt
+    from app.auth.service import ALGORITHM, SECRET_KEY
+
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("id")
+    except jwt.PyJWTError:
+        return None
+
+
+def rate_limit(scope: str, limit: str, per: str = "ip", local: bool = False):
+    """
+    Route dependency enforcing a budget, e.g. dependencies=[rate_limit("login", "10/minute")]
+    per="user" counts per authenticated user (falling back to the client IP)
+    local=True keeps the buckets in this worker whatever the backend
+    """
+    rate = Rate.parse(os.getenv(f"RATE_LIMIT_{scope.upper()}", limit))
+    chosen = local_limiter if local else limiter
+
+    def check(request: Request) -> None:
+        identity = _user_id(request) if per == "user" else None
+        key = f"{scope}:u{identity}" if identity else f"{scope}:{_client_ip(request)}"
+        started = time.perf_counter()
+        try:
+            allowed, retry_after = chosen.hit(key, rate)
+        except Exception as e:
+            #fail open: an unavailable backend should not take the API down with it
+            logging.error(f"Rate limiter backend failed for {scope}: {e}")
+            return
+        finally:
+            RATE_LIMIT_SECONDS.labels(scope).observe(time.perf_counter() - started)
+        RATE_LIMIT_DECISIONS.labels(scope, "allowed" if allowed else "limited").inc()
+        if not allowed:
+            logging.warning(f"Rate limit exceeded for {key}")
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded, try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+    return Depends(check)
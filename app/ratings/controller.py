@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Form, HTTPException
+from fastapi import APIRouter, Form, HTTPException, Query
 from starlette import status
+from typing import Literal, Optional
 from app.core.database import DbSession
 from . import rating_models
 from . import service
 from app.auth.service import CurrentUser
+from app.core.responses import FastJSONResponse
+from app.protection.rate_limiting import rate_limit
 from app.venues import v_models
-from app.models.models import Review, Rating
-from sqlalchemy import func
 
 router = APIRouter(
     prefix="/ratings",
@@ -14,7 +15,8 @@ router = APIRouter(
 )
 
 
-@router.post("/submit", status_code=status.HTTP_201_CREATED)
+@router.post("/submit", status_code=status.HTTP_201_CREATED,
+             dependencies=[rate_limit("rating_submit", "60/minute", per="user")])
 def submit_rating(
     db: DbSession,
     current_user: CurrentUser,
@@ -64,38 +66,34 @@ def delete_rating(db: DbSession, current_user: CurrentUser, rating_id: int):
     service.delete_rating(db, rating_id, current_user_id)
 
 
+# noinspection PyTypeHints
 @router.get("/user/venues", status_code=status.HTTP_200_OK)
-def get_user_rated_venues(db: DbSession, current_user: CurrentUser):
-    """Get all venues rated by the current user"""
+def get_user_rated_venues(db: DbSession, current_user: CurrentUser,
+                          sort: Literal["recent", "score"] = Query("recent"),
+                          cursor: Optional[str] = None,
+                          limit: int = Query(20, ge=1, le=100)):
+    """
+    Venues rated by the current user, newest or highest rated first; pass next_cursor back as cursor.
+    The first page (no cursor) also carries total, the number of venues rated.
+    """
     current_user_id = current_user.get_id()
-    venues = service.get_user_rated_venues(db, current_user_id)
-
-    # Build venue responses with rating data
-    venue_responses = []
-    for venue in venues:
-        review_count = db.query(func.count(Review.review_id)).filter(
-            Review.venue_id == venue.venue_id
-        ).scalar() or 0
-
-        avg_rating = db.query(func.avg(Rating.rating)).filter(
-            Rating.venue_id == venue.venue_id
-        ).scalar()
-
-        average_rating = round(float(avg_rating), 2) if avg_rating else 0.0
-
-        venue_response = v_models.VenueResponse(
-            venue_id=venue.venue_id,
-            venue_name=venue.venue_name,
-            address=venue.address,
-            hours=venue.hours,
-            venue_type=venue.venue_type,
-            age_req=venue.age_req,
-            description=venue.description,
-            capacity=venue.capacity,
-            price=venue.price,
-            average_rating=average_rating,
-            review_count=review_count
-        )
-        venue_responses.append(venue_response)
-
-    return {"venues": venue_responses}
+    rows = service.get_user_rated_venues(db, current_user_id, sort, service.parse_rated_cursor(sort, cursor), limit)
+    last = rows[-1] if rows else None
+    if last is None:
+        next_cursor = None
+    elif sort == "recent":
+        next_cursor = f"{last.rated_at.isoformat()}:{last.rating_id}"
+    else:
+        next_cursor = f"{last.my_rating!r}:{last.rating_id}"
+
+    body = {
+        "venues": [v_models.RatedVenueResponse.trusted(
+            venue, round(venue.rating_sum / venue.rating_count, 2) if venue.rating_count else 0.0,
+            venue.review_count, venue.my_rating, venue.rated_at
+        ) for venue in rows],
+        "has_more": len(rows) == limit,
+        "next_cursor": next_cursor
+    }
+    if cursor is None:
+        body["total"] = len(rows) if len(rows) < limit else service.count_user_rated_venues(db, current_user_id)
+    return FastJSONResponse(body)
@@ -1,40 +1,58 @@
 from fastapi import HTTPException
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.models import Rating, Venue
+from sqlalchemy import Row, func, select, text, tuple_
+from app.models.models import Rating, Review, Venue, VenueRanking
+from app.venues import activity, ranking, trending
+from app.venues.service import venue_cache
 from . import rating_models
 import logging
 
 
-def create_or_update_rating(db: Session, rating_data: rating_models.CreateRating, user_id: int) -> Rating:
-    """Create a new rating or update existing one for the user-venue pair"""
+#one statement for both cases; previous_rating is the value it replaced (null for a new rating),
+#and inserted tells the two apart (xmax is 0 for a freshly inserted row version)
+UPSERT_RATING = text("""
+    WITH previous AS (
+        SELECT rating FROM ratings WHERE user_id = :user_id AND venue_id = :venue_id
+    )
+    INSERT INTO ratings AS r (rating, created_at, user_id, venue_id)
+    VALUES (:rating, now(), :user_id, :venue_id)
+    ON CONFLICT ON CONSTRAINT unique_user_venue_rating DO UPDATE SET rating = EXCLUDED.rating
+    RETURNING r.rating_id, r.rating, r.created_at, r.user_id, r.venue_id,
+              (r.xmax = 0) AS inserted, (SELECT rating FROM previous) AS previous_rating
+""")
+
+
+def create_or_update_rating(db: Session, rating_data: rating_models.CreateRating, user_id: int):
+    """Create a new rating or update existing one for the user-venue pair; returns the stored row"""
     try:
-        # Check if user already has a rating for this venue
-        existing_rating = db.query(Rating).filter(
-            Rating.user_id == user_id,
-            Rating.venue_id == rating_data.venue_id
-        ).first()
-
-        if existing_rating:
-            # Update existing rating
-            existing_rating.rating = rating_data.rating
-            db.commit()
-            db.refresh(existing_rating)
-            logging.info(f"Rating updated by user {user_id} for venue {rating_data.venue_id}")
-            return existing_rating
+        rating = db.execute(UPSERT_RATING, {
+            "rating": rating_data.rating, "user_id": user_id, "venue_id": rating_data.venue_id
+        }).one()
+
+        if rating.inserted:
+            ranking.adjust(db, rating_data.venue_id, 1, rating_data.rating)
+        elif rating.previous_rating is not None:
+            ranking.adjust(db, rating_data.venue_id, 0, rating_data.rating - rating.previous_rating)
         else:
-            # Create new rating
-            new_rating = Rating(
-                rating=rating_data.rating,
-                user_id=user_id,
-                venue_id=rating_data.venue_id
-            )
-            db.add(new_rating)
-            db.commit()
-            db.refresh(new_rating)
-            logging.info(f"Rating created by user {user_id} for venue {rating_data.venue_id}")
-            return new_rating
+            #a concurrent first rating won the insert after this statement's snapshot: the value
+            #it replaced is unknown, so recount the venue instead of adjusting it
+            ranking.recount(db, rating_data.venue_id)
+        trending.record_activity(db, rating_data.venue_id, "rating")
+        activity.publish(db, "rating", rating_data.venue_id)
+        db.commit()
+        venue_cache.invalidate(rating_data.venue_id)
+        logging.info(f"Rating {'created' if rating.inserted else 'updated'} by user {user_id} "
+                     f"for venue {rating_data.venue_id}")
+        return rating
 
+    except IntegrityError as e:
+        db.rollback()
+        if "venue_id" in str(e):
+            raise HTTPException(status_code=404, detail="Venue not found")
+        logging.error(f"Error creating/updating rating: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid data provided")
     except Exception as e:
         db.rollback()
         logging.error(f"Error creating/updating rating: {str(e)}")
@@ -44,10 +62,10 @@ def create_or_update_rating(db: Session, rating_data: rating_models.CreateRating
 def get_user_rating_for_venue(db: Session, user_id: int, venue_id: int) -> Rating | None:
     """Get a user's rating for a specific venue"""
     try:
-        rating = db.query(Rating).filter(
+        rating = db.scalars(select(Rating).where(
             Rating.user_id == user_id,
             Rating.venue_id == venue_id
-        ).first()
+        )).first()
         return rating
     except Exception as e:
         logging.error(f"Error fetching user rating: {str(e)}")
@@ -57,7 +75,7 @@ def get_user_rating_for_venue(db: Session, user_id: int, venue_id: int) -> Ratin
 def delete_rating(db: Session, rating_id: int, user_id: int) -> None:
     """Delete a rating"""
     try:
-        rating = db.query(Rating).filter(Rating.rating_id == rating_id).first()
+        rating = db.get(Rating, rating_id)
         if not rating:
             raise HTTPException(status_code=404, detail="Rating not found")
 
@@ -65,7 +83,10 @@ def delete_rating(db: Session, rating_id: int, user_id: int) -> None:
             raise HTTPException(status_code=403, detail="Not authorized to delete this rating")
 
         db.delete(rating)
+        ranking.adjust(db, rating.venue_id, -1, -rating.rating)
+        activity.publish(db, "rating", rating.venue_id)
         db.commit()
+        venue_cache.invalidate(rating.venue_id)
         logging.info(f"Rating {rating_id} deleted by user {user_id}")
 
     except HTTPException:
@@ -76,17 +97,51 @@ def delete_rating(db: Session, rating_id: int, user_id: int) -> None:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-def get_user_rated_venues(db: Session, user_id: int) -> list[Venue]:
-    """Get all venues that a user has rated"""
+RATED_SORTS = {"recent": Rating.created_at, "score": Rating.rating}
+
+
+def parse_rated_cursor(sort: str, cursor: str | None) -> tuple | None:
+    """Cursors are "<created_at iso>:<rating_id>" (recent) or "<rating>:<rating_id>" (score) of the last row"""
+    if not cursor:
+        return None
     try:
-        # Query venues that the user has rated
-        venues = db.query(Venue).join(
-            Rating, Rating.venue_id == Venue.venue_id
-        ).filter(
-            Rating.user_id == user_id
-        ).all()
-
-        return venues
+        key, rating_id = cursor.rsplit(":", 1)
+        return (datetime.fromisoformat(key) if sort == "recent" else float(key)), int(rating_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def get_user_rated_venues(db: Session, user_id: int, sort: str = "recent", cursor: tuple | None = None,
+                          limit: int = 20) -> list[Row]:
+    """
+    One page of the venues a user has rated as venue rows with rating_id, my_rating, rated_at, rating_count,
+    rating_sum and review_count, newest rating or highest score first. Aggregates come from venue_rankings
+    in the same query.
+    """
+    try:
+        key = RATED_SORTS[sort]
+        reviews = (select(func.count(Review.review_id)).where(Review.venue_id == Venue.venue_id)
+                   .correlate(Venue).scalar_subquery())
+        statement = (select(Venue.__table__, Rating.rating_id, Rating.rating.label("my_rating"),
+                            Rating.created_at.label("rated_at"),
+                            func.coalesce(VenueRanking.rating_count, 0).label("rating_count"),
+                            func.coalesce(VenueRanking.rating_sum, 0.0).label("rating_sum"),
+                            reviews.label("review_count"))
+                     .join(Rating, Rating.venue_id == Venue.venue_id)
+                     .outerjoin(VenueRanking, VenueRanking.venue_id == Venue.venue_id)
+                     .where(Rating.user_id == user_id))
+        if cursor:
+            statement = statement.where(tuple_(key, Rating.rating_id) < cursor)
+        return db.execute(statement.order_by(key.desc(), Rating.rating_id.desc()).limit(limit)).all()
     except Exception as e:
         logging.error(f"Error fetching user rated venues: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def count_user_rated_venues(db: Session, user_id: int) -> int:
+    """How many venues a user has rated (one rating per user and venue)"""
+    try:
+        return db.scalar(select(func.count()).select_from(Rating).where(Rating.user_id == user_id))
+    except Exception as e:
+        logging.error(f"Error counting user rated venues: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
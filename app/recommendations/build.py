@@ -0,0 +1,238 @@
+"""
+Offline item-item collaborative filtering over the ratings table.
+
+    python -m app.recommendations.build --k 20 --memory-mb 256
+
+1. Ratings are loaded with COPY into a sparse user x venue matrix and centred on each
+   user's mean (adjusted cosine), then every venue column is scaled to unit length.
+2. Similarities are Rt @ R computed one block of venue columns at a time, so memory
+   stays near --memory-mb whatever the catalogue size. Each similarity is shrunk by
+   co-raters / (co-raters + shrink) so pairs backed by a couple of users don't win.
+   The top k per venue go to venue_similarities.
+3. Each user's unrated venues are scored from those neighbour lists, again in blocks of
+   users (kept sparse), and the top k go to user_recommendations.
+
+Both tables are replaced in one transaction, so readers see either the old or the new set.
+The API process never imports this module; it imports NumPy/SciPy only for the content index,
+at startup rather than at import (app.recommendations.content).
+"""
+import argparse
+import io
+import logging
+import time
+import numpy as np
+import scipy.sparse as sp
+
+SHRINK = 10.0
+
+
+def ratings_matrix(user_ids: np.ndarray, venue_ids: np.ndarray, values: np.ndarray):
+    """Returns (R as CSR users x venues float32, user id per row, venue id per column)"""
+    users, rows = np.unique(user_ids, return_inverse=True)
+    venues, columns = np.unique(venue_ids, return_inverse=True)
+    matrix = sp.csr_matrix((values.astype(np.float32), (rows, columns)), shape=(len(users), len(venues)))
+    matrix.sum_duplicates()
+    return matrix, users, venues
+
+
+def centre(matrix) -> tuple[sp.csr_matrix, np.ndarray]:
+    """Subtracts each user's mean rating from their stored ratings; returns (centred, means)"""
+    counts = np.diff(matrix.indptr)
+    means = np.zeros(matrix.shape[0], dtype=np.float32)
+    np.divide(np.asarray(matrix.sum(axis=1)).ravel(), counts, out=means, where=counts > 0)
+    centred = matrix.copy()
+    centred.data -= np.repeat(means, counts)
+    return centred, means
+
+
+def _block_size(rows: int, memory_bytes: int, arrays: int) -> int:
+    return max(1, memory_bytes // max(1, rows * 4 * arrays))
+
+
+def item_neighbours(centred, k: int, memory_bytes: int, shrink: float = SHRINK) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k adjusted-cosine neighbours per venue as (indices, scores), both venues x k.
+    Missing neighbours (fewer than k positively similar venues) have index -1.
+    """
+    n_venues = centred.shape[1]
+    norms = np.sqrt(np.asarray(centred.multiply(centred).sum(axis=0)).ravel())
+    inverse = np.zeros_like(norms)
+    np.divide(1.0, norms, out=inverse, where=norms > 0)
+    unit = (centred @ sp.diags(inverse.astype(np.float32))).tocsc()
+    unit_t = unit.T.tocsr()
+    rated = unit.copy()
+    rated.data[:] = 1.0
+    rated_t = rated.T.tocsr()
+
+    k = min(k, max(n_venues - 1, 0))
+    indices = np.full((n_venues, k), -1, dtype=np.int32)
+    scores = np.zeros((n_venues, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    block = _block_size(n_venues, memory_bytes, arrays=3)
+    for start in range(0, n_venues, block):
+        stop = min(start + block, n_venues)
+        similarity = (unit_t @ unit[:, start:stop]).toarray()
+        co_raters = (rated_t @ rated[:, start:stop]).toarray()
+        similarity *= co_raters / (co_raters + shrink)
+        del co_raters
+        columns = np.arange(stop - start)
+        similarity[start + columns, columns] = -np.inf  #a venue is not its own neighbour
+
+        top = np.argpartition(-similarity, k - 1, axis=0)[:k]
+        top_scores = np.take_along_axis(similarity, top, axis=0)
+        order = np.argsort(-top_scores, axis=0)
+        top = np.take_along_axis(top, order, axis=0).T
+        top_scores = np.take_along_axis(top_scores, order, axis=0).T
+        keep = top_scores > 0
+        indices[start:stop] = np.where(keep, top, -1)
+        scores[start:stop] = np.where(keep, top_scores, 0)
+    return indices, scores
+
+
+def user_recommendations(matrix, centred, means: np.ndarray, indices: np.ndarray, scores: np.ndarray,
+                         k: int, memory_bytes: int):
+    """
+    Yields (user_rows, venue_columns, predicted_ratings) per block of users, each user's best
+    k unrated venues. Prediction = mean + sum(sim * centred) / (sum |sim| + 1): the +1 pulls
+    venues backed by little similarity mass back towards the user's own mean.
+    Candidates stay sparse (at most ratings x k per user), so this never builds a users x
+    venues dense array.
+    """
+    n_users, n_venues = matrix.shape
+    valid = indices >= 0
+    #row i of weights holds venue i's neighbour list, so a user's candidates are the
+    #neighbours of the venues they rated (item-based top-N)
+    weights = sp.csr_matrix(
+        (scores[valid], (np.nonzero(valid)[0], indices[valid])), shape=(n_venues, n_venues)
+    )
+    rated = matrix.copy()
+    rated.data[:] = 1.0
+    if k <= 0 or n_users == 0:
+        return
+
+    #split users so each block's candidate count (bounded by ratings x neighbours) fits the budget
+    bound = np.cumsum(np.diff(matrix.indptr) * max(1, indices.shape[1]))
+    per_block = max(1, memory_bytes // 32)
+    splits = np.searchsorted(bound, np.arange(per_block, bound[-1], per_block), side="right")
+    edges = np.unique(np.r_[0, splits, n_users])
+
+    for start, stop in zip(edges[:-1], edges[1:]):
+        mass = rated[start:stop] @ weights
+        #centred ratings are within +-5 and similarities are positive, so adding 10 * mass keeps
+        #every entry strictly positive: both products then have the same sparsity pattern and
+        #their data arrays line up
+        shifted = (centred[start:stop] + 10 * rated[start:stop]) @ weights
+        mass.sort_indices()
+        shifted.sort_indices()
+        numerator = shifted.data - 10 * mass.data
+        rows = np.repeat(np.arange(start, stop), np.diff(mass.indptr))
+        columns = mass.indices
+        predicted = means[rows] + numerator / (mass.data + 1.0)
+
+        #drop venues the user already rated: both sides are in (row, column) order, so the
+        #rated cells are found by binary search in the candidates
+        keys = rows.astype(np.int64) * n_venues + columns
+        block_rated = rated[start:stop]
+        block_rated.sort_indices()
+        rated_keys = (np.repeat(np.arange(start, stop, dtype=np.int64), np.diff(block_rated.indptr)) * n_venues
+                      + block_rated.indices)
+        found = np.searchsorted(keys, rated_keys)
+        found = found[(found < len(keys)) & (keys[np.minimum(found, len(keys) - 1)] == rated_keys)]
+        candidate = np.ones(len(keys), dtype=bool)
+        candidate[found] = False
+        rows, columns, predicted = rows[candidate], columns[candidate], predicted[candidate]
+
+        #best first within each user: predictions lie well inside (-16, 16), so one sort on
+        #row * 32 - prediction orders by row, then by descending prediction
+        order = np.argsort(rows * 32.0 - predicted)
+        rows, columns, predicted = rows[order], columns[order], predicted[order]
+        keep = _ranks(rows) <= k
+        yield rows[keep], columns[keep], np.clip(predicted[keep], 0.1, 5.0)
+
+
+def _ranks(owners: np.ndarray) -> np.ndarray:
+    """1-based position of each entry within its run of equal owners (entries arrive sorted by owner)"""
+    if len(owners) == 0:
+        return owners
+    starts = np.r_[0, np.nonzero(np.diff(owners))[0] + 1]
+    lengths = np.diff(np.r_[starts, len(owners)])
+    return np.arange(len(owners)) - np.repeat(starts, lengths) + 1
+
+
+def _copy(cursor, table: str, columns: list[str], *arrays) -> int:
+    buffer = io.StringIO()
+    np.savetxt(buffer, np.column_stack(arrays), fmt=["%d", "%d", "%d", "%.6f"], delimiter=",")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return len(arrays[0])
+
+
+def load_ratings(cursor) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    buffer = io.StringIO()
+    cursor.copy_expert("COPY ratings (user_id, venue_id, rating) TO STDOUT WITH (FORMAT csv)", buffer)
+    buffer.seek(0)
+    data = np.loadtxt(buffer, delimiter=",", dtype=np.float64, ndmin=2)
+    if data.size == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2].astype(np.float32)
+
+
+def build(engine, k: int = 20, user_k: int = 20, memory_mb: int = 256) -> dict:
+    memory_bytes = memory_mb * 1024 * 1024
+    timings = {}
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        started = time.perf_counter()
+        user_ids, venue_ids, values = load_ratings(cursor)
+        matrix, users, venues = ratings_matrix(user_ids, venue_ids, values)
+        centred, means = centre(matrix)
+        timings["load"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        indices, scores = item_neighbours(centred, k, memory_bytes)
+        timings["similarity"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        cursor.execute("DELETE FROM venue_similarities")
+        cursor.execute("DELETE FROM user_recommendations")
+        valid = indices >= 0
+        owners = np.nonzero(valid)[0]
+        pairs = _copy(cursor, "venue_similarities", ["venue_id", "rank", "similar_venue_id", "score"],
+                      venues[owners], _ranks(owners), venues[indices[valid]], scores[valid])
+        recommendations = 0
+        for rows, columns, predicted in user_recommendations(matrix, centred, means, indices, scores,
+                                                             user_k, memory_bytes):
+            recommendations += _copy(cursor, "user_recommendations", ["user_id", "rank", "venue_id", "score"],
+                                     users[rows], _ranks(rows), venues[columns], predicted)
+        raw.commit()
+        timings["recommend_and_write"] = time.perf_counter() - started
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return {"ratings": len(values), "users": len(users), "venues": len(venues),
+            "similar_pairs": pairs, "recommendations": recommendations, "seconds": timings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build venue similarities and user recommendations")
+    parser.add_argument("--k", type=int, default=20, help="neighbours stored per venue")
+    parser.add_argument("--user-k", type=int, default=20, help="recommendations stored per user")
+    parser.add_argument("--memory-mb", type=int, default=256, help="working memory per block")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from app.core.database import engine
+    from app.models.models import UserRecommendation, VenueSimilarity
+    VenueSimilarity.__table__.create(engine, checkfirst=True)
+    UserRecommendation.__table__.create(engine, checkfirst=True)
+    result = build(engine, args.k, args.user_k, args.memory_mb)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
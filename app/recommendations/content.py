@@ -0,0 +1,362 @@
+"""
+Content-based similar venues, for venues that have no ratings yet.
+
+Each venue is turned into hashed features: words and word pairs of its name and
+description, plus tokens for its venue types, price band and capacity. The raw
+counts are stored per venue in venue_content_vectors as int32 feature ids and float32
+term frequencies. Hashing needs no vocabulary, so new venues can be added at any time.
+IDF weights come from document frequencies kept in memory and updated with every
+change.
+
+Every worker loads all vectors into a sparse matrix at startup. A query sums the
+inverted-index columns of the venue's own features, then does a partial sort. create_venue / update_venue update the writing worker
+once they commit, and other workers pick up changed rows every CONTENT_INDEX_REFRESH_SECONDS.
+
+    python -m app.recommendations.content --rebuild   # recompute every stored vector
+
+NumPy and SciPy are optional (without them the index stays empty and callers fall back) and are
+imported on first use, so importing this module stays cheap for the API's cold start.
+"""
+import argparse
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+#imported on first use (index load at startup, vector writes), not with the API: see numpy_available
+np = None
+sp = None
+_imported = False
+
+FEATURES = 1 << 18
+REFRESH_SECONDS = float(os.getenv("CONTENT_INDEX_REFRESH_SECONDS", "30"))
+#rows written within this window before the last seen one are re-read, for transactions that committed late;
+#a re-read row is applied when its updated_at differs from the one this worker last saw for the venue
+OVERLAP_SECONDS = 60
+#categorical tokens count like this many words, so type/price/capacity matter next to long descriptions
+CATEGORY_WEIGHT = 2.0
+WORD = re.compile(r"[a-z0-9']+")
+
+UPSERT = text("""
+    INSERT INTO venue_content_vectors (venue_id, features, weights, updated_at)
+    VALUES (:venue_id, :features, :weights, clock_timestamp()::timestamp)
+    ON CONFLICT (venue_id) DO UPDATE SET
+        features = EXCLUDED.features, weights = EXCLUDED.weights, updated_at = EXCLUDED.updated_at
+    RETURNING updated_at
+""")
+
+
+def numpy_available() -> bool:
+    """Imports NumPy and SciPy the first time it is asked; False when they are not installed"""
+    global np, sp, _imported
+    if not _imported:
+        try:
+            import numpy
+            import scipy.sparse
+            np, sp = numpy, scipy.sparse
+        except ImportError:  #only the content index needs them
+            pass
+        _imported = True
+    return np is not None
+
+
+def _bucket(token: str) -> int:
+    #crc32 is stable across processes (str hash is salted per interpreter)
+    return zlib.crc32(token.encode()) % FEATURES
+
+
+def _enum_value(value) -> str:
+    return str(getattr(value, "value", value)).lower()
+
+
+def features(venue) -> dict[int, float]:
+    """Hashed term counts of a venue (or anything with the same attributes)"""
+    counts: Counter = Counter()
+    for field in (venue.venue_name, venue.description):
+        words = WORD.findall((field or "").lower())
+        counts.update(_bucket(word) for word in words)
+        counts.update(_bucket(f"{first} {second}") for first, second in zip(words, words[1:]))
+    for venue_type in venue.venue_type or []:
+        counts[_bucket(f"type:{_enum_value(venue_type)}")] += CATEGORY_WEIGHT
+    if venue.capacity is not None:
+        counts[_bucket(f"capacity:{_enum_value(venue.capacity)}")] += CATEGORY_WEIGHT
+    if venue.price is not None:
+        #price bands double in width: 0-1, 2-3, 4-7, 8-15, 16-31, ...
+        counts[_bucket(f"price:{int(math.log2(max(venue.price, 0) + 1))}")] += CATEGORY_WEIGHT
+    return dict(counts)
+
+
+def pack(counts: dict[int, float]) -> tuple[bytes, bytes]:
+    ids = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+    return ids.tobytes(), np.array([counts[i] for i in ids], dtype=np.float32).tobytes()
+
+
+class ContentIndex:
+    """
+    Sparse rows of term frequencies with a tombstone on replaced rows, appended to on
+    updates and compacted once a fifth of the rows are dead. The TF-IDF weighted,
+    L2-normalised copy (feature-major, so it works as an inverted index) is rebuilt
+    lazily on the first query after a change.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = False
+        self.watermark = None
+        #updated_at of the stored vector each indexed venue came from (kept by load/refresh/publish)
+        self.stamps: dict[int, datetime] = {}
+        self.checked = 0.0
+        self._reset()
+
+    def _reset(self) -> None:
+        #arrays are created by load(), once NumPy is imported
+        self.row_of: dict[int, int] = {}
+        self.venue_ids = self.indptr = self.indices = self.tf = self.df = None
+        if np is not None:
+            self.venue_ids = np.empty(0, np.int64)
+            self.indptr = np.zeros(1, np.int64)
+            self.indices = np.empty(0, np.int32)
+            self.tf = np.empty(0, np.float32)
+            self.df = np.zeros(FEATURES, np.int32)
+        self.dead = 0
+        self.weighted = None
+
+    @property
+    def available(self) -> bool:
+        return self.ready and numpy_available()
+
+    def nbytes(self) -> int:
+        """Memory held by the index arrays (excluding the venue id dict)"""
+        if not self.ready:
+            return 0
+        arrays = [self.venue_ids, self.indptr, self.indices, self.tf, self.df]
+        if self.weighted is not None:
+            inverted, idf, norms = self.weighted
+            arrays += [inverted.data, inverted.indices, inverted.indptr, idf, norms]
+        return sum(array.nbytes for array in arrays)
+
+    def load(self, rows) -> None:
+        """Replaces the index with (venue_id, features_bytes, weights_bytes) rows"""
+        if not numpy_available():
+            return
+        with self.lock:
+            self._reset()
+            self._append(rows)
+            self.ready = True
+
+    def upsert(self, rows) -> None:
+        #before load() there is nothing to update: load reads every stored row
+        if not self.ready:
+            return
+        with self.lock:
+            self._append(rows)
+            if self.dead > len(self.venue_ids) // 5:
+                self._compact()
+
+    def remove(self, venue_id: int) -> None:
+        if not self.ready:
+            return
+        with self.lock:
+            self._kill(venue_id)
+            self.stamps.pop(venue_id, None)
+
+    def _kill(self, venue_id: int) -> None:
+        row = self.row_of.pop(venue_id, None)
+        if row is None:
+            return
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        np.subtract.at(self.df, self.indices[start:stop], 1)
+        self.tf[start:stop] = 0
+        self.venue_ids[row] = -1
+        self.dead += 1
+        self.weighted = None
+
+    def _append(self, rows) -> None:
+        ids, lengths, indices, tf = [], [], [], []
+        for venue_id, feature_bytes, weight_bytes in rows:
+            self._kill(venue_id)
+            row_indices = np.frombuffer(feature_bytes, dtype=np.int32)
+            ids.append(venue_id)
+            lengths.append(len(row_indices))
+            indices.append(row_indices)
+            tf.append(np.frombuffer(weight_bytes, dtype=np.float32))
+        if not ids:
+            return
+        first = len(self.venue_ids)
+        for offset, venue_id in enumerate(ids):
+            self.row_of[venue_id] = first + offset
+        new_indices = np.concatenate(indices)
+        self.df += np.bincount(new_indices, minlength=FEATURES).astype(np.int32)
+        self.venue_ids = np.concatenate([self.venue_ids, np.asarray(ids, dtype=np.int64)])
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + np.cumsum(lengths)])
+        self.indices = np.concatenate([self.indices, new_indices])
+        self.tf = np.concatenate([self.tf, np.concatenate(tf)])
+        self.weighted = None
+
+    def _compact(self) -> None:
+        alive = self.venue_ids >= 0
+        lengths = np.diff(self.indptr)
+        keep = np.repeat(alive, lengths)
+        self.venue_ids = self.venue_ids[alive]
+        self.indptr = np.r_[0, np.cumsum(lengths[alive])]
+        self.indices = self.indices[keep]
+        self.tf = self.tf[keep]
+        self.row_of = {int(venue_id): row for row, venue_id in enumerate(self.venue_ids)}
+        self.dead = 0
+        self.weighted = None
+
+    def _weighted(self):
+        if self.weighted is None:
+            documents = len(self.row_of)
+            idf = (np.log((1 + documents) / (1 + self.df)) + 1).astype(np.float32)
+            data = self.tf * idf[self.indices]
+            #row norms from a running sum of squares (no temporary sparse matrices)
+            squares = np.r_[0.0, np.cumsum(data.astype(np.float64) ** 2)]
+            norms = np.sqrt(squares[self.indptr[1:]] - squares[self.indptr[:-1]])
+            norms[norms == 0] = 1
+            norms = norms.astype(np.float32)
+            data /= np.repeat(norms, np.diff(self.indptr))
+            #stored feature-major (an inverted index): a query only reads the columns of its own features
+            inverted = sp.csr_matrix((data, self.indices, self.indptr),
+                                     shape=(len(self.venue_ids), FEATURES)).T.tocsr()
+            self.weighted = (inverted, idf, norms)
+        return self.weighted
+
+    def similar(self, venue_id: int, k: int = 10) -> list[tuple[int, float]]:
+        """Up to k (venue_id, cosine similarity) pairs, most similar first"""
+        if not self.available:
+            return []
+        with self.lock:
+            row = self.row_of.get(venue_id)
+            if row is None:
+                return []
+            #replaced rather than mutated on change, so it can be read outside the lock
+            inverted, idf, norms = self._weighted()
+            venue_ids = self.venue_ids
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            features = self.indices[start:stop].copy()
+            weights = self.tf[start:stop].copy()
+        scores = inverted[features].T @ (weights * idf[features] / norms[row])
+        scores[row] = -1
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(venue_ids[i]), float(scores[i])) for i in top if scores[i] > 0 and venue_ids[i] >= 0]
+
+
+index = ContentIndex()
+
+
+def load(engine) -> None:
+    """Startup: reads every stored vector into this worker's index"""
+    if not numpy_available():
+        logging.warning("NumPy/SciPy not installed, content-based similar venues disabled")
+        return
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT venue_id, features, weights, updated_at FROM venue_content_vectors"
+            )).all()
+    except Exception as e:
+        logging.warning(f"Content index not loaded: {e}")
+        return
+    index.load((row.venue_id, row.features, row.weights) for row in rows)
+    index.stamps = {row.venue_id: row.updated_at for row in rows}
+    index.watermark = max((row.updated_at for row in rows), default=None)
+    index.checked = time.monotonic()
+    logging.info(f"Content index loaded {len(rows)} venues ({index.nbytes() / 1e6:.1f} MB)")
+
+
+def refresh(db: Session) -> None:
+    """Picks up vectors written by other workers since the last check (at most every REFRESH_SECONDS)"""
+    if not index.available or time.monotonic() - index.checked < REFRESH_SECONDS:
+        return
+    index.checked = time.monotonic()
+    query = "SELECT venue_id, features, weights, updated_at FROM venue_content_vectors"
+    params = {}
+    if index.watermark is not None:
+        query += " WHERE updated_at > :since - make_interval(secs => :overlap)"
+        params = {"since": index.watermark, "overlap": OVERLAP_SECONDS}
+    rows = db.execute(text(query), params).all()
+    #a row that committed late can be stamped before the watermark: compare per venue, not with the watermark
+    changed = [row for row in rows if index.stamps.get(row.venue_id) != row.updated_at]
+    if changed:
+        index.upsert((row.venue_id, row.features, row.weights) for row in changed)
+        index.stamps.update((row.venue_id, row.updated_at) for row in changed)
+    if rows:
+        latest = max(row.updated_at for row in rows)
+        index.watermark = latest if index.watermark is None else max(index.watermark, latest)
+
+
+def index_venue(db: Session, venue) -> tuple | None:
+    """Stores the venue's vector in the caller's transaction; pass the result to publish() once it commits"""
+    if not numpy_available():
+        return None
+    feature_bytes, weight_bytes = pack(features(venue))
+    updated_at = db.execute(UPSERT, {
+        "venue_id": venue.venue_id, "features": feature_bytes, "weights": weight_bytes
+    }).scalar()
+    return venue.venue_id, feature_bytes, weight_bytes, updated_at
+
+
+def publish(vector: tuple | None) -> None:
+    """Adds a committed vector from index_venue to this worker's index (a rolled back one never gets here)"""
+    if vector is None or not index.ready:
+        return
+    venue_id, feature_bytes, weight_bytes, updated_at = vector
+    index.upsert([(venue_id, feature_bytes, weight_bytes)])
+    index.stamps[venue_id] = updated_at
+
+
+def rebuild(db: Session, batch_size: int = 5000) -> int:
+    """Recomputes and stores the vector of every venue, committing each batch; returns how many"""
+    if not numpy_available():
+        raise RuntimeError("NumPy and SciPy are needed to build content vectors")
+    from app.models.models import Venue
+
+    stored = 0
+    last_id = 0
+    while True:
+        venues = (db.query(Venue).filter(Venue.venue_id > last_id)
+                  .order_by(Venue.venue_id).limit(batch_size).all())
+        if not venues:
+            break
+        for venue in venues:
+            feature_bytes, weight_bytes = pack(features(venue))
+            db.execute(UPSERT, {"venue_id": venue.venue_id, "features": feature_bytes, "weights": weight_bytes})
+        db.commit()
+        stored += len(venues)
+        last_id = venues[-1].venue_id
+    return stored
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Content-based venue vectors")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every stored vector")
+    parser.add_argument("--similar", type=int, help="print the venues most similar to this venue id")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal, engine
+    from app.models.models import VenueContentVector
+    VenueContentVector.__table__.create(engine, checkfirst=True)
+    if args.rebuild:
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            print(f"Stored {rebuild(db)} vectors in {time.perf_counter() - started:.2f}s")
+    if args.similar:
+        load(engine)
+        for venue_id, score in index.similar(args.similar):
+            print(f"{score:>7.3f}  {venue_id}")
+
+
+if __name__ == "__main__":
+    main()
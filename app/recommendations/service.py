@@ -0,0 +1,65 @@
+from fastapi import HTTPException
+from sqlalchemy import Row, func, select
+from sqlalchemy.orm import Session
+from app.models.models import Venue, Rating, Review, VenueSimilarity, UserRecommendation
+from . import content
+import logging
+
+
+#per-venue aggregates for statements that select venue rows
+_AVERAGE = (select(func.avg(Rating.rating)).where(Rating.venue_id == Venue.venue_id)
+            .correlate(Venue).scalar_subquery().label("average_rating"))
+_REVIEWS = (select(func.count(Review.review_id)).where(Review.venue_id == Venue.venue_id)
+            .correlate(Venue).scalar_subquery().label("review_count"))
+
+
+def _listed(rows) -> list[tuple[Row, float, float, int]]:
+    return [(row, row.score, round(float(row.average_rating), 2) if row.average_rating else 0.0,
+             row.review_count or 0) for row in rows]
+
+
+def similar_venues(db: Session, venue_id: int, limit: int = 10) -> list[tuple[Row, float, float, int]]:
+    """Precomputed neighbours of a venue as (venue row, similarity, average_rating, review_count), best first"""
+    try:
+        rows = db.execute(select(Venue.__table__, VenueSimilarity.score, _AVERAGE, _REVIEWS)
+                          .join(VenueSimilarity, VenueSimilarity.similar_venue_id == Venue.venue_id)
+                          .where(VenueSimilarity.venue_id == venue_id)
+                          .order_by(VenueSimilarity.rank)
+                          .limit(limit)).all()
+        return _listed(rows)
+    except Exception as e:
+        logging.error(f"Error fetching similar venues for {venue_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch similar venues")
+
+
+def recommended_venues(db: Session, user_id: int, limit: int = 20) -> list[tuple[Row, float, float, int]]:
+    """Precomputed recommendations as (venue row, predicted_rating, average_rating, review_count), best first"""
+    try:
+        rows = db.execute(select(Venue.__table__, UserRecommendation.score, _AVERAGE, _REVIEWS)
+                          .join(UserRecommendation, UserRecommendation.venue_id == Venue.venue_id)
+                          .where(UserRecommendation.user_id == user_id)
+                          .order_by(UserRecommendation.rank)
+                          .limit(limit)).all()
+        return _listed(rows)
+    except Exception as e:
+        logging.error(f"Error fetching recommendations for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch recommendations")
+
+
+def content_similar_venues(db: Session, venue_id: int, limit: int = 10) -> list[tuple[Row, float, float, int]]:
+    """Nearest venues by name/description/type/price/capacity from the in-memory content index"""
+    try:
+        content.refresh(db)
+        pairs = content.index.similar(venue_id, limit)
+        if not pairs:
+            return []
+        rows = {row.venue_id: row for row in db.execute(
+            select(Venue.__table__, _AVERAGE, _REVIEWS).where(Venue.venue_id.in_([pair[0] for pair in pairs]))
+        )}
+        #venues deleted since the index was loaded are skipped
+        return [(rows[similar_id], score, round(float(rows[similar_id].average_rating), 2)
+                 if rows[similar_id].average_rating else 0.0, rows[similar_id].review_count or 0)
+                for similar_id, score in pairs if similar_id in rows]
+    except Exception as e:
+        logging.error(f"Error fetching content-similar venues for {venue_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch similar venues")
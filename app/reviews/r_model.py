@@ -28,6 +28,11 @@ class ReviewResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+    @classmethod
+    def from_row(cls, row) -> "ReviewResponse":
+        """Builds the response from a row that already carries username and venue_name"""
+        return cls.model_construct(**row._asdict())
 #updating reviews input
 # noinspection PyNestedDecorators
 class UpdateReview(BaseModel):
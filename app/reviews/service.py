@@ -1,42 +1,73 @@
 from fastapi import HTTPException
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, text
 from app.auth.service import CurrentUser
 from . import r_model
 from app.models.models import User, Venue, Review
+from app.venues import activity, trending
+from app.venues.service import venue_cache
+from app.core.fields import project
 import logging
 from typing import List
 
 
+#columns a review list can be narrowed to with fields= (username / venue_name cost a join each)
+REVIEW_COLUMNS = {
+    "review_id": Review.review_id, "created_at": Review.created_at, "user_id": Review.user_id,
+    "venue_id": Review.venue_id, "review_text": Review.review_text, "username": User.username,
+    "venue_name": Venue.venue_name,
+}
+REVIEW_JOINS = {"username": (User, User.user_id == Review.user_id),
+                "venue_name": (Venue, Venue.venue_id == Review.venue_id)}
+
+#writes return the review with its display fields (username, venue_name) from the same statement
+_DISPLAY = """
+    SELECT w.review_id, w.created_at, w.user_id, w.venue_id, w.review_text, u.username, v.venue_name
+    FROM written w JOIN users u ON u.user_id = w.user_id JOIN venues v ON v.venue_id = w.venue_id
+"""
+INSERT_REVIEW = text("""
+    WITH written AS (
+        INSERT INTO reviews (review_text, created_at, user_id, venue_id)
+        VALUES (:review_text, now(), :user_id, :venue_id)
+        RETURNING review_id, created_at, user_id, venue_id, review_text
+    )""" + _DISPLAY)
+UPDATE_REVIEW = text("""
+    WITH written AS (
+        UPDATE reviews SET review_text = :review_text
+        WHERE review_id = :review_id AND user_id = :user_id
+        RETURNING review_id, created_at, user_id, venue_id, review_text
+    )""" + _DISPLAY)
+
+
 # noinspection PyTypeChecker
-def create_review(db: Session, review_data: r_model.CreateReview, user_id: int) -> Review:
+def create_review(db: Session, review_data: r_model.CreateReview, user_id: int):
+    """Inserts the review and returns it as a row with username and venue_name"""
     try:
         # Reviews must have text
         if not review_data.review_text or not review_data.review_text.strip():
             raise HTTPException(status_code=400, detail="Review must have text")
 
-        review = Review(
-            review_text=review_data.review_text,
-            user_id=user_id,
-            venue_id=review_data.venue_id
-        )
-
-        db.add(review)
+        review = db.execute(INSERT_REVIEW, {
+            "review_text": review_data.review_text, "user_id": user_id, "venue_id": review_data.venue_id
+        }).one()
+        trending.record_activity(db, review_data.venue_id, "review")
+        activity.publish(db, "review", review.review_id)
         db.commit()
-
-        # Refresh with relationships loaded
-        db.refresh(review)
-        review_rel = db.query(Review).options(
-            joinedload(Review.user),
-            joinedload(Review.venue)
-        ).filter(Review.review_id == review.review_id).first()
+        venue_cache.invalidate(review_data.venue_id)
 
         logging.info(f"Review created successfully by user {user_id} for venue {review_data.venue_id}")
-        return review_rel
+        return review
 
     except HTTPException:
         raise
+    except IntegrityError as e:
+        db.rollback()
+        if "venue_id" in str(e):
+            raise HTTPException(status_code=404, detail="Venue not found")
+        logging.error(f"Error creating review: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid data provided")
     except Exception as e:
         db.rollback()
         logging.error(f"Error creating review: {str(e)}")
@@ -44,17 +75,16 @@ def create_review(db: Session, review_data: r_model.CreateReview, user_id: int)
 
 
 # noinspection PyTypeChecker
-def get_reviews_by_venue(db: Session, venue_id: int, after_review_id: int = None, limit: int = 20) -> List[Review]:
+def get_reviews_by_venue(db: Session, venue_id: int, after_review_id: int = None, limit: int = 20,
+                         fields: list[str] = None) -> List:
+    """Rows of the given fields (all of them by default)"""
     try:
-        query = db.query(Review).options(
-            joinedload(Review.user),
-            joinedload(Review.venue)
-        ).filter(Review.venue_id == venue_id)
+        statement = project(Review, fields, REVIEW_COLUMNS, REVIEW_JOINS).where(Review.venue_id == venue_id)
 
         if after_review_id:
-            query = query.filter(Review.review_id > after_review_id)
+            statement = statement.where(Review.review_id > after_review_id)
 
-        reviews = query.order_by(Review.created_at.desc()).limit(limit).all()
+        reviews = db.execute(statement.order_by(Review.created_at.desc()).limit(limit)).all()
 
         return reviews
 
@@ -66,18 +96,17 @@ def get_reviews_by_venue(db: Session, venue_id: int, after_review_id: int = None
 
 
 # noinspection PyTypeChecker
-def get_reviews_by_user(db: Session, user_id: int, after_review_id: int = None, limit: int = 20) -> List[Review]:
+def get_reviews_by_user(db: Session, user_id: int, after_review_id: int = None, limit: int = 20,
+                        fields: list[str] = None) -> List:
+    """Rows of the given fields (all of them by default)"""
     try:
         # Let foreign key constraint handle user validation  
-        query = db.query(Review).options(
-            joinedload(Review.user),
-            joinedload(Review.venue)
-        ).filter(Review.user_id == user_id)
+        statement = project(Review, fields, REVIEW_COLUMNS, REVIEW_JOINS).where(Review.user_id == user_id)
         
         if after_review_id:
-            query = query.filter(Review.review_id > after_review_id)
+            statement = statement.where(Review.review_id > after_review_id)
             
-        reviews = query.order_by(Review.review_id.asc()).limit(limit).all()
+        reviews = db.execute(statement.order_by(Review.review_id.asc()).limit(limit)).all()
         
         return reviews
         
@@ -88,29 +117,23 @@ def get_reviews_by_user(db: Session, user_id: int, after_review_id: int = None,
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-def update_review(db: Session, review_id: int, review_data: r_model.UpdateReview, user_id: int) -> Review:
+def update_review(db: Session, review_id: int, review_data: r_model.UpdateReview, user_id: int):
+    """Updates the user's own review and returns it as a row with username and venue_name"""
     try:
-        review = db.query(Review).filter(Review.review_id == review_id).first()
-        if not review:
-            raise HTTPException(status_code=404, detail="Review not found")
-
-        if review.user_id != user_id:
+        review = db.execute(UPDATE_REVIEW, {
+            "review_text": review_data.review_text, "review_id": review_id, "user_id": user_id
+        }).first()
+        if review is None:
+            #nothing updated: tell a missing review from someone else's
+            exists = db.scalar(select(Review.review_id).where(Review.review_id == review_id))
+            db.rollback()
+            if not exists:
+                raise HTTPException(status_code=404, detail="Review not found")
             raise HTTPException(status_code=403, detail="Not authorized to update this review")
-
-        # Update review text
-        review.review_text = review_data.review_text
-
         db.commit()
-        db.refresh(review)
-
-        # Return review with relationships loaded
-        updated_review = db.query(Review).options(
-            joinedload(Review.user),
-            joinedload(Review.venue)
-        ).filter(Review.review_id == review_id).first()
 
         logging.info(f"Review {review_id} updated successfully by user {user_id}")
-        return updated_review
+        return review
     except HTTPException:
         raise
     except Exception as e:
@@ -121,7 +144,7 @@ def update_review(db: Session, review_id: int, review_data: r_model.UpdateReview
 
 def delete_review(db: Session, review_id: int, user_id: int) -> None:
     try:
-        review = db.query(Review).filter(Review.review_id == review_id).first()
+        review = db.get(Review, review_id)
         if not review:
             raise HTTPException(status_code=404, detail="Review not found")
             
@@ -130,6 +153,7 @@ def delete_review(db: Session, review_id: int, user_id: int) -> None:
             
         db.delete(review)
         db.commit()
+        venue_cache.invalidate(review.venue_id)
         
         logging.info(f"Review {review_id} deleted successfully by user {user_id}")
         
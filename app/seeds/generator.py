@@ -0,0 +1,287 @@
+"""
+Synthetic data generator for benchmarks and EXPLAIN testing.
+
+    python -m app.seeds.generator --users 1000000 --venues 50000 --ratings 20000000 \
+        --reviews 5000000 --photos 1000000 --seed 42 --truncate
+
+Rows are generated in memory batches and bulk-loaded with COPY. Activity is skewed
+(Zipf) so a few hot venues and power users get most of it, the same seed always
+produces the same data, and all users share the password "password123". COPY skips the
+write paths that maintain the leaderboard, trending scores and content vectors, so
+those are rebuilt from the loaded rows at the end (--skip-derived leaves them).
+"""
+import argparse
+import csv
+import io
+import itertools
+import logging
+import random
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.database import engine
+from app.models.models import VenueType, VenueCapacity
+from app.auth.service import get_password_hash
+
+CITIES = [
+    ("Miami", "FL"), ("New York", "NY"), ("Los Angeles", "CA"), ("Chicago", "IL"), ("Austin", "TX"),
+    ("New Orleans", "LA"), ("Boston", "MA"), ("Las Vegas", "NV"), ("Atlanta", "GA"), ("Nashville", "TN"),
+    ("Seattle", "WA"), ("Denver", "CO"), ("Philadelphia", "PA"), ("San Diego", "CA"), ("Houston", "TX"),
+]
+STREETS = ["Sunset Blvd", "Ocean Dr", "Main St", "Broadway", "Music Ave", "University Way", "Bourbon St",
+           "Market St", "Elm St", "River Rd", "Harbor Ave", "Park Pl"]
+NAME_WORDS = ["Electric", "Velvet", "Neon", "Midnight", "Golden", "Blue", "Skyline", "Underground", "Royal",
+              "Lucky", "Crimson", "Silver", "Moonlight", "Urban", "Wild", "Echo", "Pulse", "Vibe"]
+NAME_SUFFIXES = ["Lounge", "Club", "Bar", "Room", "Social", "Tavern", "Hall", "Den", "Terrace", "House"]
+HOURS = ["9PM-3AM", "10PM-5AM", "7PM-2AM", "4PM-1AM", "8PM-4AM", "6PM-12AM"]
+REVIEW_OPENERS = ["Great", "Amazing", "Solid", "Decent", "Overrated", "Fun", "Crowded", "Chill", "Loud", "Classy"]
+REVIEW_BODIES = ["music all night", "drinks were pricey", "friendly staff", "long line at the door",
+                 "best DJ in town", "good vibes", "sound system was insane", "would come back",
+                 "bartenders were slow", "perfect for a birthday"]
+
+VENUE_TYPES = [member.name for member in VenueType]
+CAPACITIES = [member.name for member in VenueCapacity]
+
+
+def skewed_picker(n: int, exponent: float, rng: random.Random):
+    """Returns a function picking an index in [0, n) with Zipf-like skew; hot indexes are shuffled across the range"""
+    cumulative = list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+    total = cumulative[-1]
+    order = list(range(n))
+    rng.shuffle(order)
+    rand = rng.random
+
+    def pick() -> int:
+        return order[bisect_left(cumulative, rand() * total)]
+
+    return pick
+
+
+def split_counts(total: int, n: int, exponent: float, cap: int, rng: random.Random) -> list[int]:
+    """Splits total across n owners with the same skew, capping each owner at cap"""
+    weights = [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = [min(cap, int(weight * scale)) for weight in weights]
+    shortfall = total - sum(counts)
+    #hand out the rounding remainder one per owner (weights are already shuffled)
+    while shortfall > 0:
+        progressed = False
+        for owner in range(n):
+            if shortfall == 0:
+                break
+            if counts[owner] < cap:
+                counts[owner] += 1
+                shortfall -= 1
+                progressed = True
+        if not progressed:
+            break
+    return counts
+
+
+class CopyLoader:
+    """Buffers CSV rows and flushes them to a table with COPY every batch_size rows"""
+
+    def __init__(self, raw_connection, table: str, columns: list[str], batch_size: int):
+        self.cursor = raw_connection.cursor()
+        self.sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        self.table = table
+        self.batch_size = batch_size
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = 0
+        self.loaded = 0
+
+    def add(self, row) -> None:
+        self.writer.writerow(row)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        self.buffer.seek(0)
+        self.cursor.copy_expert(self.sql, self.buffer)
+        self.loaded += self.pending
+        self.pending = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+
+def random_time(rng: random.Random, now: datetime, days: int) -> str:
+    #recent activity is more likely (squared uniform leans towards now)
+    offset = (rng.random() ** 2) * days * 86400
+    return (now - timedelta(seconds=offset)).isoformat(sep=" ")
+
+
+def derive() -> dict:
+    """Rebuilds the tables derived from venues and activity; returns the rows in each"""
+    from app.core.startup import BACKFILLS
+    from app.models.models import Base, VenueContentVector, VenueRanking, VenueTrending
+    from app.recommendations import content
+    from app.venues import ranking, trending
+
+    Base.metadata.create_all(bind=engine, tables=[
+        VenueRanking.__table__, VenueTrending.__table__, VenueContentVector.__table__])
+    rebuilds = {"venue_rankings": ranking.rebuild, "venue_trending": trending.rebuild}
+    if content.numpy_available():
+        rebuilds["venue_content_vectors"] = content.rebuild
+    else:
+        logging.warning("NumPy/SciPy not installed, content vectors not built")
+    derived = {}
+    with Session(engine) as db:
+        for table, rebuild in rebuilds.items():
+            derived[table] = rebuild(db)
+            #marked like the schema step's backfill, so the next app start doesn't rebuild it again
+            db.execute(text(f"COMMENT ON TABLE {table} IS '{BACKFILLS[table]}'"))
+            db.commit()
+    return derived
+
+
+def generate(users: int, venues: int, ratings: int, reviews: int, photos: int, seed: int = 42,
+             skew: float = 1.1, days: int = 365, batch_size: int = 100_000, truncate: bool = False,
+             derived: bool = True) -> dict:
+    if (ratings or reviews or photos) and not (users and venues):
+        raise ValueError("Ratings, reviews and photos need at least one user and one venue")
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    password_hashed = get_password_hash("password123")  #bcrypt once, shared by every synthetic user
+    counts = {}
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if truncate:
+            cursor.execute("TRUNCATE ratings, photos, reviews, venues, users RESTART IDENTITY CASCADE")
+        cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+        user_offset = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(venue_id), 0) FROM venues")
+        venue_offset = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(review_id), 0) FROM reviews")
+        review_offset = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(photo_id), 0) FROM photos")
+        photo_offset = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(rating_id), 0) FROM ratings")
+        rating_offset = cursor.fetchone()[0]
+
+        started = time.perf_counter()
+        loader = CopyLoader(raw, "users", ["user_id", "username", "password_hashed", "email", "age", "role"], batch_size)
+        for i in range(1, users + 1):
+            user_id = user_offset + i
+            loader.add((user_id, f"user_{user_id}", password_hashed, f"user_{user_id}@synthetic.clubbies.com",
+                        rng.randint(18, 45), "user"))
+        loader.flush()
+        counts["users"] = loader.loaded
+
+        city_pick = skewed_picker(len(CITIES), 1.0, rng)
+        loader = CopyLoader(raw, "venues", ["venue_id", "venue_name", "address", "hours", "venue_type", "age_req",
+                                            "description", "capacity", "price"], batch_size)
+        for i in range(1, venues + 1):
+            venue_id = venue_offset + i
+            city, state = CITIES[city_pick()]
+            types = rng.sample(VENUE_TYPES, rng.randint(1, 3))
+            loader.add((venue_id, f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)} {venue_id}",
+                        f"{rng.randint(1, 9999)} {rng.choice(STREETS)}, {city}, {state}", rng.choice(HOURS),
+                        "{" + ",".join(types) + "}", rng.choice([18, 21]),
+                        f"{rng.choice(NAME_WORDS)} {types[0].lower().replace('_', ' ')} in {city}",
+                        rng.choice(CAPACITIES), rng.choice([0, 10, 20, 30, 50, 100])))
+        loader.flush()
+        counts["venues"] = loader.loaded
+        raw.commit()
+
+        pick_venue = skewed_picker(venues, skew, rng)
+        pick_user = skewed_picker(users, skew * 0.8, rng)
+
+        #ratings are unique per (user, venue): split the total across users, then draw distinct venues per user
+        loader = CopyLoader(raw, "ratings", ["rating_id", "rating", "created_at", "user_id", "venue_id"], batch_size)
+        rating_id = rating_offset
+        per_user = split_counts(ratings, users, skew * 0.8, max(1, venues // 2), rng)
+        for index, wanted in enumerate(per_user):
+            if not wanted:
+                continue
+            if wanted > venues // 4:
+                chosen = rng.sample(range(venues), wanted)
+            else:
+                chosen = set()
+                attempts = 0
+                while len(chosen) < wanted and attempts < wanted * 4:
+                    chosen.add(pick_venue())
+                    attempts += 1
+                #heavy raters run out of distinct hot venues, top up from the long tail
+                while len(chosen) < wanted:
+                    chosen.add(rng.randrange(venues))
+            for venue_index in chosen:
+                rating_id += 1
+                loader.add((rating_id, rng.choice((1.0, 2.0, 3.0, 3.5, 4.0, 4.0, 4.5, 4.5, 5.0, 5.0)),
+                            random_time(rng, now, days), user_offset + index + 1, venue_offset + venue_index + 1))
+        loader.flush()
+        counts["ratings"] = loader.loaded
+
+        loader = CopyLoader(raw, "reviews", ["review_id", "review_text", "created_at", "user_id", "venue_id"], batch_size)
+        for i in range(1, reviews + 1):
+            loader.add((review_offset + i, f"{rng.choice(REVIEW_OPENERS)} spot, {rng.choice(REVIEW_BODIES)}.",
+                        random_time(rng, now, days), user_offset + pick_user() + 1, venue_offset + pick_venue() + 1))
+        loader.flush()
+        counts["reviews"] = loader.loaded
+
+        loader = CopyLoader(raw, "photos", ["photo_id", "img_url", "caption", "uploaded_at", "file_size",
+                                            "content_type", "user_id", "venue_id"], batch_size)
+        for i in range(1, photos + 1):
+            venue_id = venue_offset + pick_venue() + 1
+            public_id = f"{rng.getrandbits(128):032x}"
+            loader.add((photo_offset + i,
+                        f"https://res.cloudinary.com/synthetic/image/upload/v1/clubbies/venues/{venue_id}/{public_id}.jpg",
+                        rng.choice(["", "Friday night", "Dance floor", "Bar view", "Crowd", "Stage"]),
+                        random_time(rng, now, days), rng.randint(150_000, 4_000_000), "image/jpeg",
+                        user_offset + pick_user() + 1, venue_id))
+        loader.flush()
+        counts["photos"] = loader.loaded
+
+        #keep SERIAL sequences ahead of the explicit ids we loaded
+        for table, column in (("users", "user_id"), ("venues", "venue_id"), ("ratings", "rating_id"),
+                              ("reviews", "review_id"), ("photos", "photo_id")):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                           f"GREATEST((SELECT MAX({column}) FROM {table}), 1))")
+        raw.commit()
+
+        cursor.execute("ANALYZE users, venues, ratings, reviews, photos")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    if derived:
+        counts.update(derive())
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic Clubbies data")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--venues", type=int, default=1_000)
+    parser.add_argument("--ratings", type=int, default=100_000)
+    parser.add_argument("--reviews", type=int, default=50_000)
+    parser.add_argument("--photos", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for venue popularity")
+    parser.add_argument("--days", type=int, default=365, help="spread activity over this many days")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="rows per COPY")
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    parser.add_argument("--skip-derived", action="store_true",
+                        help="don't rebuild the leaderboard, trending scores and content vectors")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    counts = generate(args.users, args.venues, args.ratings, args.reviews, args.photos, seed=args.seed,
+                      skew=args.skew, days=args.days, batch_size=args.batch_size, truncate=args.truncate,
+                      derived=not args.skip_derived)
+    print(f"✅ Loaded {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy.orm import Session
 from app.core.database import engine, SessionLocal
-from app.models.models import User, Venue, Review, Photo, VenueType, VenueCapacity
+from app.models.models import User, Venue, Review, Photo, Rating, VenueType, VenueCapacity
 from app.auth.service import get_password_hash
 from datetime import datetime
 import random
@@ -17,6 +17,7 @@ def seed_database():
     try:
         # Clear existing data (optional)
         print("Clearing existing data...")
+        db.query(Rating).delete()
         db.query(Photo).delete()
         db.query(Review).delete()
         db.query(Venue).delete()
@@ -87,18 +88,23 @@ def seed_database():
         db.add_all(venues)
         db.commit()
 
-        # Create Reviews
-        print("Creating reviews...")
+        # Create Reviews and Ratings (ratings live in their own table)
+        print("Creating reviews and ratings...")
         for venue in venues:
             for user in users[:2]:  # First 2 users review each venue
                 review = Review(
                     user_id=user.user_id,
                     venue_id=venue.venue_id,
-                    rating=random.uniform(3.5, 5.0),
                     review_text=f"Great experience at {venue.venue_name}!",
                     created_at=datetime.now()
                 )
-                db.add(review)
+                rating = Rating(
+                    user_id=user.user_id,
+                    venue_id=venue.venue_id,
+                    rating=round(random.uniform(3.5, 5.0), 1),
+                    created_at=datetime.now()
+                )
+                db.add_all([review, rating])
         db.commit()
 
         print("✅ Database seeded successfully!")
@@ -111,4 +117,5 @@ def seed_database():
 
 
 if __name__ == "__main__":
+    # For production-scale data use the bulk generator: python -m app.seeds.generator --help
     seed_database()
\ No newline at end of file
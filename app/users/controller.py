@@ -1,9 +1,15 @@
-from fastapi import APIRouter, status, HTTPException
+from fastapi import APIRouter, BackgroundTasks, status, HTTPException, Query
+from sqlalchemy import select
 from app.core.database import DbSession
-from app.models.models import User
+from app.models.models import AccountDeletion, User
 from . import user_model
 from . import service
+from . import deletion
 from ..auth.service import CurrentUser, require_admin
+from ..protection.rate_limiting import rate_limit
+from ..core.responses import FastJSONResponse
+from ..recommendations import service as recommendations
+from ..venues import ranking, v_models
 
 router = APIRouter(
     prefix="/users",
@@ -26,6 +32,30 @@ def get_current_user(db: DbSession, current_user: CurrentUser):
     )
 
 
+# noinspection PyTypeHints
+@router.get("/me/recommendations", status_code=status.HTTP_200_OK)
+def get_my_recommendations(db: DbSession, current_user: CurrentUser, limit: int = Query(20, ge=1, le=50)):
+    """
+    Venues the current user is likely to rate highly (rebuilt offline by app.recommendations.build).
+    Users without enough ratings yet get the top-rated leaderboard instead.
+    """
+    rows = recommendations.recommended_venues(db, current_user.get_id(), limit)
+    if rows:
+        return FastJSONResponse({
+            'source': 'personalized',
+            'venues': [v_models.RecommendedVenueResponse.trusted(venue, average_rating, review_count, predicted)
+                       for venue, predicted, average_rating, review_count in rows]
+        })
+    top = ranking.top_venues(db, limit=limit)
+    return FastJSONResponse({
+        'source': 'top_rated',
+        'venues': [v_models.RecommendedVenueResponse.trusted(
+            venue, round(venue.rating_sum / venue.rating_count, 2) if venue.rating_count else 0.0,
+            venue.review_count, venue.bayes_score
+        ) for venue in top]
+    })
+
+
 # noinspection PyTypeHints
 @router.get("/{user_id}", response_model=user_model.UserResponse)
 def get_user_profile(user_id: int, db: DbSession, current_user: CurrentUser):
@@ -48,11 +78,27 @@ def change_password(password_change: user_model.PasswordChange,
     service.change_password(db, current_user.get_id(), password_change)
     return {"message": "Password updated successfully"}
 
-@router.delete("/delete", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(db: DbSession, current_user: CurrentUser):
-    service.delete_user(db, current_user.get_id())
+@router.delete("/delete", status_code=status.HTTP_202_ACCEPTED)
+def delete_user(db: DbSession, current_user: CurrentUser, background_tasks: BackgroundTasks):
+    """Starts deleting the current account and its content; poll /users/deletions/{job_id} for progress"""
+    job = deletion.request_deletion(db, current_user.get_id(), current_user.get_id())
+    background_tasks.add_task(deletion.run, job.job_id)
+    return FastJSONResponse(user_model.DeletionStatus.trusted(job), status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get("/deletions/{job_id}", status_code=status.HTTP_200_OK)
+def get_deletion_status(job_id: int, db: DbSession, current_user: CurrentUser):
+    """Progress of an account deletion (the requester or an admin)"""
+    job = db.get(AccountDeletion, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    if job.requested_by != current_user.get_id():
+        require_admin(current_user, db)
+    return FastJSONResponse(user_model.DeletionStatus.trusted(job))
+
 
-@router.get("/search/", response_model=list[user_model.UserSearchResponse])
+@router.get("/search/", response_model=list[user_model.UserSearchResponse],
+            dependencies=[rate_limit("user_search", "60/minute")])
 def search_users(username: str, db: DbSession, limit: int = 10):
     """Search for users by username (public endpoint, no auth required)"""
     users = service.search_users(db, username, limit)
@@ -67,7 +113,7 @@ def search_users(username: str, db: DbSession, limit: int = 10):
 def get_all_users(db: DbSession, current_user: CurrentUser, limit: int = 100):
     """Get all users (admin only)"""
     require_admin(current_user, db)
-    users = db.query(User).limit(limit).all()
+    users = db.scalars(select(User).limit(limit)).all()
     return [user_model.UserResponse(
         user_id=user.user_id,
         username=user.username,
@@ -77,8 +123,8 @@ def get_all_users(db: DbSession, current_user: CurrentUser, limit: int = 100):
     ) for user in users]
 
 
-@router.delete("/admin/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_admin(user_id: int, db: DbSession, current_user: CurrentUser):
+@router.delete("/admin/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+def delete_user_admin(user_id: int, db: DbSession, current_user: CurrentUser, background_tasks: BackgroundTasks):
     """Delete a user by ID (admin only)"""
     require_admin(current_user, db)
 
@@ -89,7 +135,9 @@ def delete_user_admin(user_id: int, db: DbSession, current_user: CurrentUser):
             detail="Cannot delete your own account"
         )
 
-    service.delete_user(db, user_id)
+    job = deletion.request_deletion(db, user_id, current_user.get_id())
+    background_tasks.add_task(deletion.run, job.job_id)
+    return FastJSONResponse(user_model.DeletionStatus.trusted(job), status_code=status.HTTP_202_ACCEPTED)
 
 
 @router.put("/admin/{user_id}/role", status_code=status.HTTP_200_OK)
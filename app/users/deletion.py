@@ -0,0 +1,242 @@
+"""
+Account deletion as a tracked background job.
+
+    python -m app.users.deletion --resume       # finish jobs whose worker died, retry failed ones and files
+    python -m app.users.deletion --status 12
+
+A request only records an account_deletions row. The job then removes the user's ratings,
+reviews and photos CHUNK_ROWS at a time. Each chunk is one short transaction that also
+adjusts the venues' leaderboard aggregates and saves the job's progress, so a prolific
+user never holds locks on the hot tables for long. Photo files are listed in
+account_deletion_files in the transaction that deletes their rows and removed from storage
+after it commits; a file leaves the list only once it is gone, so files storage failed on
+(or a worker died before removing) are retried by --resume. The account row goes last.
+Every step is safe to repeat: a job whose heartbeat stops (its worker died) can be resumed
+where it was.
+"""
+import argparse
+import logging
+import os
+from collections import defaultdict
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.core import storage
+from app.core.database import SessionLocal
+from app.models.models import AccountDeletion, AccountDeletionFile, User
+from app.venues import activity, ranking
+from app.venues.service import venue_cache
+
+CHUNK_ROWS = int(os.getenv("DELETION_CHUNK_ROWS", "500"))
+STALE_SECONDS = 300
+PHASES = ["ratings", "reviews", "photos", "account", "finished"]
+
+DELETE_CHUNK = {
+    "ratings": text("""
+        DELETE FROM ratings WHERE rating_id IN (
+            SELECT rating_id FROM ratings WHERE user_id = :user_id LIMIT :limit
+        ) RETURNING venue_id, rating
+    """),
+    "reviews": text("""
+        DELETE FROM reviews WHERE review_id IN (
+            SELECT review_id FROM reviews WHERE user_id = :user_id LIMIT :limit
+        ) RETURNING venue_id
+    """),
+    "photos": text("""
+        DELETE FROM photos WHERE photo_id IN (
+            SELECT photo_id FROM photos WHERE user_id = :user_id LIMIT :limit
+        ) RETURNING venue_id, img_url
+    """),
+}
+
+#takes the job if nobody is running it (a running job whose heartbeat is older than STALE_SECONDS is abandoned)
+CLAIM = text("""
+    UPDATE account_deletions SET status = 'running', error = NULL, updated_at = LOCALTIMESTAMP
+    WHERE job_id = :job_id AND (
+        status = ANY(:claimable)
+        OR (status = 'running' AND updated_at < LOCALTIMESTAMP - make_interval(secs => :stale))
+    )
+    RETURNING job_id
+""")
+
+
+def request_deletion(db: Session, user_id: int, requested_by: int) -> AccountDeletion:
+    """Records a deletion job for the user, or returns the one already in progress"""
+    active = db.query(AccountDeletion).filter(
+        AccountDeletion.user_id == user_id, AccountDeletion.status.in_(("pending", "running"))
+    ).first()
+    if active:
+        return active
+    if db.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        job = AccountDeletion(user_id=user_id, requested_by=requested_by, status="pending", phase="ratings")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        logging.info(f"Deletion job {job.job_id} created for user {user_id} by user {requested_by}")
+        return job
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Failed to create deletion job for user {user_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to delete user")
+
+
+def _delete_chunk(db: Session, job: AccountDeletion, phase: str) -> tuple[int, set[int], list[str]]:
+    """Deletes up to CHUNK_ROWS of one kind in the caller's transaction; returns (rows, venue ids, file ids)"""
+    rows = db.execute(DELETE_CHUNK[phase], {"user_id": job.user_id, "limit": CHUNK_ROWS}).all()
+    venues = {row.venue_id for row in rows}
+    files = []
+    if phase == "ratings":
+        removed = defaultdict(lambda: [0, 0.0])
+        for row in rows:
+            removed[row.venue_id][0] += 1
+            removed[row.venue_id][1] += row.rating
+        for venue_id, (count, total) in removed.items():
+            ranking.adjust(db, venue_id, -count, -total)
+            #live streams get the new aggregates when the chunk commits
+            activity.publish(db, "rating", venue_id)
+        job.ratings_deleted += len(rows)
+    elif phase == "reviews":
+        job.reviews_deleted += len(rows)
+    else:
+        files = [storage.public_id_from_url(row.img_url) for row in rows]
+        job.photos_deleted += len(rows)
+    return len(rows), venues, files
+
+
+def _step(db: Session, job: AccountDeletion) -> None:
+    """One short transaction of work on the job's current phase"""
+    phase = job.phase
+    venues, files = set(), []
+    if phase == "account":
+        #anything posted since the earlier phases went by, then the user row itself
+        for kind in ("ratings", "reviews", "photos"):
+            count, touched, removed = _delete_chunk(db, job, kind)
+            venues |= touched
+            files += removed
+            if count == CHUNK_ROWS:  #more than a straggler or two: go round again
+                job.phase = "ratings"
+                break
+        else:
+            db.query(User).filter(User.user_id == job.user_id).delete(synchronize_session=False)
+            job.phase = "finished"
+    else:
+        count, venues, files = _delete_chunk(db, job, phase)
+        if count < CHUNK_ROWS:
+            job.phase = PHASES[PHASES.index(phase) + 1]
+    if files:
+        #listed with the row delete so no file is lost if storage fails or the worker dies
+        db.execute(pg_insert(AccountDeletionFile).on_conflict_do_nothing(),
+                   [{"job_id": job.job_id, "public_id": public_id} for public_id in files])
+    job.updated_at = func.now()
+    db.commit()
+
+    for venue_id in venues:
+        venue_cache.invalidate(venue_id)
+    if files:
+        _delete_files(db, job, files)
+
+
+def _pending_files(db: Session, job_id: int) -> list[str]:
+    return list(db.scalars(select(AccountDeletionFile.public_id).where(AccountDeletionFile.job_id == job_id)))
+
+
+def _delete_files(db: Session, job: AccountDeletion, files: list[str]) -> None:
+    """Removes files from storage and from the job's list; the ones that fail stay listed for a retry"""
+    deleted, failed = storage.delete_files(files)
+    failed = set(failed)
+    gone = [public_id for public_id in files if public_id not in failed]
+    if gone:
+        db.execute(delete(AccountDeletionFile).where(
+            AccountDeletionFile.job_id == job.job_id, AccountDeletionFile.public_id.in_(gone)))
+    job.files_deleted += deleted
+    job.files_failed = db.scalar(select(func.count()).select_from(AccountDeletionFile)
+                                 .where(AccountDeletionFile.job_id == job.job_id))
+    db.commit()
+
+
+def run(job_id: int, retry_failed: bool = False) -> None:
+    """Runs a job to completion in its own session; returns quietly if another worker has it"""
+    claimable = ["pending", "failed"] if retry_failed else ["pending"]
+    with SessionLocal() as db:
+        claimed = db.execute(CLAIM, {"job_id": job_id, "claimable": claimable, "stale": STALE_SECONDS}).first()
+        db.commit()
+        if claimed is None:
+            return
+        job = db.get(AccountDeletion, job_id)
+        try:
+            while job.phase != "finished":
+                _step(db, job)
+            #files an earlier run listed but didn't get to remove
+            files = _pending_files(db, job_id)
+            if files:
+                _delete_files(db, job, files)
+            job.status = "done"
+            job.finished_at = func.now()
+            db.commit()
+            logging.info(f"Deletion job {job_id} finished: user {job.user_id}, {job.ratings_deleted} ratings, "
+                         f"{job.reviews_deleted} reviews, {job.photos_deleted} photos, "
+                         f"{job.files_failed} files left to retry")
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Deletion job {job_id} failed in phase {job.phase}: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)[:500]
+            job.updated_at = func.now()
+            db.commit()
+
+
+def retry_files(job_id: int) -> None:
+    """Retries the listed files of a finished job; returns quietly if another worker is retrying them"""
+    with SessionLocal() as db:
+        #the job row lock keeps two resumes from removing (and counting) the same files
+        job = db.query(AccountDeletion).filter(
+            AccountDeletion.job_id == job_id, AccountDeletion.status == "done"
+        ).with_for_update(skip_locked=True).first()
+        if job is None:
+            return
+        try:
+            _delete_files(db, job, _pending_files(db, job_id))
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Retrying files of deletion job {job_id} failed: {str(e)}")
+
+
+def resume() -> int:
+    """Runs every pending, failed or abandoned job and retries finished jobs' files; returns how many were found"""
+    with SessionLocal() as db:
+        jobs = db.query(AccountDeletion.job_id, AccountDeletion.status).filter(
+            AccountDeletion.status.in_(("pending", "running", "failed"))
+            | AccountDeletion.job_id.in_(select(AccountDeletionFile.job_id))
+        ).order_by(AccountDeletion.job_id).all()
+    for job_id, status in jobs:
+        if status == "done":
+            retry_files(job_id)
+        else:
+            run(job_id, retry_failed=True)
+    return len(jobs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Background account deletions")
+    parser.add_argument("--resume", action="store_true",
+                        help="run pending, failed and abandoned jobs, retry files storage failed to delete")
+    parser.add_argument("--status", type=int, help="print a job's progress")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from app.core.database import engine
+    AccountDeletion.__table__.create(engine, checkfirst=True)
+    AccountDeletionFile.__table__.create(engine, checkfirst=True)
+    if args.resume:
+        print(f"{resume()} jobs found")
+    if args.status is not None:
+        with SessionLocal() as db:
+            job = db.get(AccountDeletion, args.status)
+            print({column.name: getattr(job, column.name) for column in job.__table__.columns} if job else "not found")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from . import user_model
-from app.models.models import User, Review, Photo, Rating
+from app.models.models import User
 from app.auth.service import verify_password, get_password_hash, CurrentUser
 import logging
 
 
 def get_user_by_id(db: Session, user_id: int) -> User:
     """Internal function for getting user by ID - used by other services"""
-    user = db.query(User).get(user_id)
+    user = db.get(User, user_id)
     if not user:
         logging.warning(f"User {user_id} not found")
         raise HTTPException(status_code=404, detail="User not found")
@@ -18,7 +19,7 @@ def get_user_by_id(db: Session, user_id: int) -> User:
 def get_current_user_profile(db: Session, current_user: CurrentUser) -> User:
     """Get current user's profile - for public API"""
     user_id = current_user.get_id()
-    user = db.query(User).get(user_id)
+    user = db.get(User, user_id)
     if not user:
         logging.warning(f"Current user {user_id} not found")
         raise HTTPException(status_code=404, detail="User not found")
@@ -54,35 +55,11 @@ def change_password(db:Session, user_id: int, password_change: user_model.Passwo
 def search_users(db: Session, username: str, limit: int = 10):
     """Search users by username - returns limited public info"""
     try:
-        users = db.query(User.user_id, User.username).filter(
+        users = db.execute(select(User.user_id, User.username).where(
             User.username.ilike(f"%{username}%")
-        ).limit(limit).all()
+        ).limit(limit)).all()
         logging.info(f"Found {len(users)} users matching '{username}'")
         return users
     except Exception as e:
         logging.error(f"Error searching users: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to search users")
-
-def delete_user(db: Session, user_id: int):
-    try:
-        user = get_user_by_id(db, user_id)
-
-        # Delete all user's ratings first
-        db.query(Rating).filter(Rating.user_id == user_id).delete()
-
-        # Delete all user's photos
-        db.query(Photo).filter(Photo.user_id == user_id).delete()
-
-        # Delete all user's reviews
-        db.query(Review).filter(Review.user_id == user_id).delete()
-
-        # Now delete the user
-        db.delete(user)
-        db.commit()
-        logging.info(f"User {user_id} and all related data has been deleted")
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        logging.error(f"Failed to delete user {user_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to delete user")
\ No newline at end of file
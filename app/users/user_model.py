@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 
@@ -22,4 +24,23 @@ class UserSearchResponse(BaseModel):
 
 #model for updating user role (admin only)
 class RoleUpdate(BaseModel):
-    role: str
\ No newline at end of file
+    role: str
+
+#progress of a background account deletion
+class DeletionStatus(BaseModel):
+    job_id: int
+    user_id: int
+    status: str
+    phase: str
+    ratings_deleted: int
+    reviews_deleted: int
+    photos_deleted: int
+    files_deleted: int
+    files_failed: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def trusted(cls, job) -> "DeletionStatus":
+        return cls.model_construct(**{name: getattr(job, name) for name in cls.model_fields})
@@ -0,0 +1,288 @@
+"""
+Live venue activity (new reviews, new photos, rating aggregate changes) over Server-Sent Events.
+
+    GET /venues/{venue_id}/stream
+
+Writes publish with pg_notify on one channel in their own transaction, so an event goes out
+when the write commits and never for one that rolls back; the payload is built by that one
+statement from the rows just written. Each worker holds a single LISTEN connection, opened with
+its first subscriber, and fans notifications out on the event loop: every event is encoded
+once and appended to the pending buffer of each subscriber of that venue.
+
+A client that falls QUEUE_SIZE events behind gets an "overflow" event and is disconnected
+instead of buffering without bound. After the listener reconnects (events may have been
+missed) every client gets "resync". Both mean: refetch the lists and reconnect. Idle streams
+get a comment line every HEARTBEAT_SECONDS so proxies keep them open and dead clients are found.
+"""
+import asyncio
+import logging
+import os
+from collections import defaultdict, deque
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.metrics import STREAM_EVENTS, STREAM_SUBSCRIBERS
+from app.models.models import Venue
+
+CHANNEL = "venue_activity"
+QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+RECONNECT_SECONDS = 2.0
+
+#payloads are {"venue_id", "type", "data"}; data matches the list endpoints' items
+#(ReviewResponse, PhotoResponse) or the venue's rating aggregates
+PUBLISH = {
+    "review": text(f"""
+        SELECT pg_notify('{CHANNEL}', json_build_object('venue_id', r.venue_id, 'type', 'review', 'data',
+            json_build_object('review_id', r.review_id, 'created_at', r.created_at, 'user_id', r.user_id,
+                              'venue_id', r.venue_id, 'review_text', r.review_text,
+                              'username', u.username, 'venue_name', v.venue_name))::text)
+        FROM reviews r JOIN users u ON u.user_id = r.user_id JOIN venues v ON v.venue_id = r.venue_id
+        WHERE r.review_id = :id
+    """),
+    "photo": text(f"""
+        SELECT pg_notify('{CHANNEL}', json_build_object('venue_id', p.venue_id, 'type', 'photo', 'data',
+            json_build_object('photo_id', p.photo_id, 'img_url', p.img_url, 'caption', p.caption,
+                              'file_size', p.file_size, 'content_type', p.content_type, 'user_id', p.user_id,
+                              'username', u.username, 'venue_id', p.venue_id, 'venue_name', v.venue_name,
+                              'uploaded_at', p.uploaded_at))::text)
+        FROM photos p JOIN users u ON u.user_id = p.user_id JOIN venues v ON v.venue_id = p.venue_id
+        WHERE p.photo_id = :id
+    """),
+    #read after ranking.adjust in the same transaction; a venue whose last rating went has no row, so zeros
+    "rating": text(f"""
+        SELECT pg_notify('{CHANNEL}', json_build_object('venue_id', v.venue_id, 'type', 'rating', 'data',
+            json_build_object('venue_id', v.venue_id,
+                              'rating_count', coalesce(k.rating_count, 0),
+                              'average_rating', CASE WHEN k.rating_count > 0
+                                  THEN round((k.rating_sum / k.rating_count)::numeric, 2) ELSE 0 END,
+                              'bayes_score', k.bayes_score))::text)
+        FROM venues v LEFT JOIN venue_rankings k ON k.venue_id = v.venue_id
+        WHERE v.venue_id = :id
+    """),
+}
+
+HEARTBEAT = b": ping\n\n"
+OPENING = f"retry: {int(RECONNECT_SECONDS * 1000)}\n\n".encode()
+OVERFLOW = b"event: overflow\ndata: {}\n\n"
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+
+def publish(db: Session, kind: str, id: int) -> None:
+    """
+    Queues the event for a review / photo id, or for a venue id's rating aggregates; runs in the
+    caller's transaction, so it is delivered on commit
+    """
+    db.execute(PUBLISH[kind], {"id": id})
+
+
+def venue_exists(venue_id: int) -> bool:
+    """Checked with a short session of its own: an open stream must not keep a pooled connection"""
+    with SessionLocal() as db:
+        return db.get(Venue, venue_id) is not None
+
+
+def encode(payload: str, kind: str) -> bytes:
+    return f"event: {kind}\ndata: {payload}\n\n".encode()
+
+
+class Subscriber:
+    """One open stream: encoded events waiting to be written, and a flag to wake its writer"""
+    __slots__ = ("venue_id", "pending", "wakeup", "closed")
+
+    def __init__(self, venue_id: int):
+        self.venue_id = venue_id
+        self.pending: deque[bytes] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed: bytes | None = None  #final event to send before ending the stream
+
+    def push(self, message: bytes) -> bool:
+        if len(self.pending) >= QUEUE_SIZE:
+            self.close(OVERFLOW)
+            return False
+        self.pending.append(message)
+        self.wakeup.set()
+        return True
+
+    def close(self, final: bytes = b"") -> None:
+        self.pending.clear()
+        self.closed = final
+        self.wakeup.set()
+
+
+class Hub:
+    """Per-worker fan-out from the LISTEN connection to the subscribers of each venue (event loop only)"""
+
+    def __init__(self, dsn: str | None = None):
+        self.dsn = dsn
+        self.venues: dict[int, set[Subscriber]] = defaultdict(set)
+        self.count = 0
+        self.connection = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.starting: asyncio.Task | None = None
+        self.heartbeat: asyncio.TimerHandle | None = None
+
+    def subscribe(self, venue_id: int) -> Subscriber:
+        if self.heartbeat is None:
+            self.heartbeat = asyncio.get_running_loop().call_later(HEARTBEAT_SECONDS, self._heartbeat)
+        subscriber = Subscriber(venue_id)
+        self.venues[venue_id].add(subscriber)
+        self.count += 1
+        STREAM_SUBSCRIBERS.inc()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self.venues.get(subscriber.venue_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.venues[subscriber.venue_id]
+        self.count -= 1
+        STREAM_SUBSCRIBERS.dec()
+
+    def dispatch(self, payload: str) -> int:
+        """Hands one notification to the venue's subscribers; returns how many got it"""
+        try:
+            event = orjson.loads(payload)
+            subscribers = self.venues.get(event["venue_id"])
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            logging.error(f"Ignoring malformed activity payload: {payload[:200]}")
+            return 0
+        if not subscribers:
+            return 0
+        message = encode(payload, event.get("type", "message"))
+        overflowed = [subscriber for subscriber in subscribers if not subscriber.push(message)]
+        delivered = len(subscribers) - len(overflowed)
+        for subscriber in overflowed:
+            self.unsubscribe(subscriber)
+        STREAM_EVENTS.labels("delivered").inc(delivered)
+        if overflowed:
+            STREAM_EVENTS.labels("overflow").inc(len(overflowed))
+        return delivered
+
+    def _heartbeat(self) -> None:
+        """One timer for all streams (not a timeout per stream); a stream too far behind to take it is cut off"""
+        for subscribers in list(self.venues.values()):
+            for subscriber in [subscriber for subscriber in subscribers if not subscriber.push(HEARTBEAT)]:
+                self.unsubscribe(subscriber)
+        self.heartbeat = asyncio.get_running_loop().call_later(HEARTBEAT_SECONDS, self._heartbeat)
+
+    def broadcast(self, final: bytes) -> None:
+        """Ends every stream with a final event"""
+        for subscribers in list(self.venues.values()):
+            for subscriber in list(subscribers):
+                subscriber.close(final)
+                self.unsubscribe(subscriber)
+
+    async def start(self) -> None:
+        """Opens the LISTEN connection unless it is open (or opening); raises if the database is unreachable"""
+        if self.connection is not None:
+            return
+        if self.starting is None:
+            self.loop = asyncio.get_running_loop()
+            self.starting = asyncio.ensure_future(self._open())
+        try:
+            await asyncio.shield(self.starting)
+        finally:
+            if self.starting is not None and self.starting.done():
+                self.starting = None
+
+    async def _open(self) -> None:
+        try:
+            connection = await run_in_threadpool(self._connect)
+        except Exception as e:
+            logging.error(f"Activity listener could not connect: {str(e)}")
+            raise
+        self.connection = connection
+        self.loop.add_reader(connection.fileno(), self._on_readable)
+        logging.info(f"Listening on {CHANNEL}")
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+        if self.dsn is None:
+            from app.core.database import engine
+            self.dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        #keepalives so a silently dropped connection errors out (and is reopened) instead of going quiet
+        connection = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10,
+                                      keepalives_count=3)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANNEL}")
+        return connection
+
+    def _on_readable(self) -> None:
+        try:
+            self.connection.poll()
+        except Exception as e:
+            logging.error(f"Activity listener lost its connection: {str(e)}")
+            self._drop()
+            self.loop.call_later(RECONNECT_SECONDS, self._reconnect)
+            return
+        notifies = self.connection.notifies
+        for notify in notifies:
+            self.dispatch(notify.payload)
+        notifies.clear()
+
+    def _reconnect(self) -> None:
+        async def reconnect():
+            try:
+                await self.start()
+            except Exception as e:
+                logging.error(f"Activity listener reconnect failed: {str(e)}")
+                self.loop.call_later(RECONNECT_SECONDS, self._reconnect)
+                return
+            #anything committed while the listener was down was missed
+            self.broadcast(RESYNC)
+
+        if self.connection is None and self.count:
+            asyncio.ensure_future(reconnect())
+
+    def _drop(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            self.loop.remove_reader(self.connection.fileno())
+        except Exception:
+            pass
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+
+    def stop(self) -> None:
+        """Closes the listener and ends every open stream (worker shutdown)"""
+        self.broadcast(b"")
+        self._drop()
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            self.heartbeat = None
+
+
+hub = Hub()
+
+
+async def stream(venue_id: int, hub: Hub = hub):
+    """SSE body for one venue: pending events are written in one chunk per wakeup"""
+    #subscribed here, not by the endpoint, so the finally below always unsubscribes
+    subscriber = hub.subscribe(venue_id)
+    try:
+        yield OPENING
+        while True:
+            await subscriber.wakeup.wait()
+            subscriber.wakeup.clear()
+            if subscriber.pending:
+                chunk = b"".join(subscriber.pending)
+                subscriber.pending.clear()
+                yield chunk
+            if subscriber.closed is not None:
+                if subscriber.closed:
+                    yield subscriber.closed
+                return
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,263 @@
+"""
+"People here now" per venue, counted from check-ins without writing a row per check-in.
+
+    POST /venues/{venue_id}/checkin
+    GET  /venues/{venue_id}/here-now
+
+Each worker counts check-ins in memory per (venue, BUCKET_SECONDS time bucket), spread over
+SHARDS shards with a lock each (picked by user id) so threadpool requests rarely wait on one
+another. Every FLUSH_SECONDS the worker swaps the shards out and adds the counts to
+venue_checkins with one INSERT ... ON CONFLICT for the whole batch; check-ins for venues
+that don't exist are dropped there. A flush that fails on the connection keeps its counts
+for the next one (up to RETENTION_HOURS old); one that fails otherwise drops them.
+
+Here now is the sum over the buckets of the last WINDOW_MINUTES: the persisted rows plus this
+worker's counts that are not flushed yet (other workers' show up after their next flush). A
+user checking in again at the same venue within the window is not counted again by the same
+worker. Buckets older than RETENTION_HOURS are deleted by the flusher.
+
+    python -m app.venues.checkins --venue 12     # here now, persisted buckets only
+    python -m app.venues.checkins --prune
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.core.metrics import CHECKIN_FLUSH_ROWS, CHECKIN_FLUSH_SECONDS, CHECKINS
+
+BUCKET_SECONDS = int(os.getenv("CHECKIN_BUCKET_SECONDS", "300"))
+WINDOW_MINUTES = int(os.getenv("CHECKIN_WINDOW_MINUTES", "120"))
+FLUSH_SECONDS = float(os.getenv("CHECKIN_FLUSH_SECONDS", "5"))
+RETENTION_HOURS = int(os.getenv("CHECKIN_RETENTION_HOURS", "48"))
+SHARDS = 16
+MAX_VENUE_ID = 2**31 - 1  #venues.venue_id is an integer column
+SWEEP_SECONDS = 60
+PRUNE_SECONDS = 3600
+
+#sorted so two workers flushing the same venues lock their rows in the same order
+FLUSH = text("""
+    INSERT INTO venue_checkins AS c (venue_id, bucket, count)
+    SELECT d.venue_id, d.bucket, d.count
+    FROM unnest(CAST(:venue_ids AS integer[]), CAST(:buckets AS timestamp[]), CAST(:counts AS integer[]))
+         AS d(venue_id, bucket, count)
+    JOIN venues v ON v.venue_id = d.venue_id
+    ORDER BY d.venue_id, d.bucket
+    ON CONFLICT (venue_id, bucket) DO UPDATE SET count = c.count + EXCLUDED.count
+""")
+
+HERE_NOW = text("""
+    SELECT coalesce(sum(count), 0) FROM venue_checkins WHERE venue_id = :venue_id AND bucket >= :since
+""")
+
+PRUNE = text("DELETE FROM venue_checkins WHERE bucket < :before")
+
+
+def bucket_of(now: float) -> int:
+    """Start of the bucket holding a unix time, as a unix time"""
+    return int(now - now % BUCKET_SECONDS)
+
+
+def as_timestamp(bucket: int) -> datetime:
+    return datetime.fromtimestamp(bucket, timezone.utc).replace(tzinfo=None)
+
+
+def window_start(now: float) -> int:
+    """First bucket inside the window"""
+    return bucket_of(now - WINDOW_MINUTES * 60 + BUCKET_SECONDS)
+
+
+class Shard:
+    """Pending counts by (venue_id, bucket) and last check-in time by (user_id, venue_id)"""
+    __slots__ = ("lock", "counts", "seen")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: dict[tuple[int, int], int] = defaultdict(int)
+        self.seen: dict[tuple[int, int], float] = {}
+
+
+class CheckinCounter:
+    """This worker's check-ins since the last flush"""
+
+    def __init__(self, shards: int = SHARDS):
+        self.shards = [Shard() for _ in range(shards)]
+        #counts taken by a flush that is still running, so reads keep seeing them
+        self.flushing: dict[tuple[int, int], int] = {}
+        self.swept = time.time()
+
+    def add(self, venue_id: int, user_id: int, now: float | None = None) -> bool:
+        """Counts a check-in; False when the user already checked in here within the window"""
+        now = time.time() if now is None else now
+        shard = self.shards[user_id % len(self.shards)]
+        with shard.lock:
+            last = shard.seen.get((user_id, venue_id))
+            if last is not None and now - last < WINDOW_MINUTES * 60:
+                return False
+            shard.seen[(user_id, venue_id)] = now
+            shard.counts[(venue_id, bucket_of(now))] += 1
+        return True
+
+    def take(self) -> dict[tuple[int, int], int]:
+        """Swaps every shard's counts out (one lock at a time) and merges them"""
+        merged: dict[tuple[int, int], int] = defaultdict(int)
+        self.flushing = merged
+        for shard in self.shards:
+            with shard.lock:
+                counts, shard.counts = shard.counts, defaultdict(int)
+            for key, count in counts.items():
+                merged[key] += count
+        return merged
+
+    def done(self, requeue: dict[tuple[int, int], int] | None = None) -> None:
+        """Ends a flush; requeued counts go back to be flushed next time unless they are past retention"""
+        if requeue:
+            oldest = bucket_of(time.time() - RETENTION_HOURS * 3600)
+            shard = self.shards[0]
+            with shard.lock:
+                for (venue_id, bucket), count in requeue.items():
+                    if bucket >= oldest:
+                        shard.counts[(venue_id, bucket)] += count
+        self.flushing = {}
+
+    def pending(self, venue_id: int, since: int) -> int:
+        """Counts for a venue from bucket `since` on that are not in the table yet"""
+        total = sum(count for (venue, bucket), count in list(self.flushing.items())
+                    if venue == venue_id and bucket >= since)
+        for shard in self.shards:
+            with shard.lock:
+                total += sum(count for (venue, bucket), count in shard.counts.items()
+                             if venue == venue_id and bucket >= since)
+        return total
+
+    def sweep(self, now: float | None = None) -> None:
+        """Forgets check-ins older than the window (they may count again)"""
+        now = time.time() if now is None else now
+        cutoff = now - WINDOW_MINUTES * 60
+        for shard in self.shards:
+            with shard.lock:
+                shard.seen = {key: last for key, last in shard.seen.items() if last >= cutoff}
+        self.swept = now
+
+
+counter = CheckinCounter()
+
+
+def check_in(venue_id: int, user_id: int) -> bool:
+    counted = counter.add(venue_id, user_id)
+    CHECKINS.labels("counted" if counted else "repeat").inc()
+    return counted
+
+
+def batch(counts: dict[tuple[int, int], int]) -> dict:
+    """FLUSH parameters for merged counts"""
+    keys = list(counts)
+    #a handful of distinct buckets per flush, converted once each
+    stamps = {bucket: as_timestamp(bucket) for bucket in {bucket for _, bucket in keys}}
+    return {
+        "venue_ids": [venue_id for venue_id, _ in keys],
+        "buckets": [stamps[bucket] for _, bucket in keys],
+        "counts": [counts[key] for key in keys],
+    }
+
+
+def flush(db: Session, counter: CheckinCounter = counter) -> int:
+    """Writes this worker's pending counts in one statement; returns the number of rows upserted"""
+    counts = counter.take()
+    #out of range ids would fail the whole statement on every flush (the endpoint rejects them too)
+    writable = {key: count for key, count in counts.items() if 0 < key[0] <= MAX_VENUE_ID}
+    if len(writable) < len(counts):
+        logging.error(f"Dropping check-ins for {len(counts) - len(writable)} out of range venue ids")
+    if not writable:
+        counter.done()
+        return 0
+    started = time.perf_counter()
+    try:
+        rows = db.execute(FLUSH, batch(writable)).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        #only a lost or refused connection is worth retrying; other errors would repeat on every flush
+        retry = isinstance(e, OperationalError) or getattr(e, "connection_invalidated", False)
+        logging.error(f"Error flushing {len(writable)} check-in counts "
+                      f"({'kept for the next flush' if retry else 'dropped'}): {str(e)}")
+        counter.done(writable if retry else None)
+        return 0
+    counter.done()
+    CHECKIN_FLUSH_SECONDS.observe(time.perf_counter() - started)
+    CHECKIN_FLUSH_ROWS.inc(rows)
+    return rows
+
+
+def prune(db: Session) -> int:
+    """Deletes buckets older than RETENTION_HOURS; returns how many"""
+    try:
+        deleted = db.execute(PRUNE, {"before": as_timestamp(bucket_of(time.time() - RETENTION_HOURS * 3600))}).rowcount
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error pruning check-in buckets: {str(e)}")
+        return 0
+    return deleted
+
+
+def here_now(db: Session, venue_id: int) -> int:
+    """Check-ins at a venue within the window: persisted buckets plus this worker's unflushed counts"""
+    since = window_start(time.time())
+    persisted = db.execute(HERE_NOW, {"venue_id": venue_id, "since": as_timestamp(since)}).scalar()
+    return int(persisted) + counter.pending(venue_id, since)
+
+
+pruned_at = time.time()
+
+
+def _maintain() -> None:
+    global pruned_at
+    from app.core.database import SessionLocal
+    with SessionLocal() as db:
+        flush(db)
+        now = time.time()
+        if now - counter.swept >= SWEEP_SECONDS:
+            counter.sweep(now)
+        if now - pruned_at >= PRUNE_SECONDS:
+            prune(db)
+            pruned_at = now
+
+
+async def maintain(stop: asyncio.Event) -> None:
+    """Flusher task for the app lifespan: flushes every FLUSH_SECONDS, and once more after stop is set"""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await run_in_threadpool(_maintain)
+        except Exception as e:
+            logging.error(f"Check-in flusher failed: {str(e)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check-in counts per venue")
+    parser.add_argument("--venue", type=int, help="print here now for this venue")
+    parser.add_argument("--prune", action="store_true", help=f"delete buckets older than {RETENTION_HOURS}h")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from app.core.database import SessionLocal
+    with SessionLocal() as db:
+        if args.prune:
+            print(f"deleted {prune(db)} buckets")
+        if args.venue is not None:
+            print(here_now(db, args.venue))
+
+
+if __name__ == "__main__":
+    main()
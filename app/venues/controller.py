@@ -1,11 +1,21 @@
-from fastapi import APIRouter, status, Query, HTTPException
+import io
+from fastapi import APIRouter, BackgroundTasks, status, Path, Query, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.core.database import DbSession
-from app.auth.service import CurrentUser, require_admin
+from app.auth.service import CurrentUser, OptionalUser, require_admin
+from app.core.responses import FastJSONResponse
+from app.core.fields import parse_fields
+from app.core import storage
+from app.protection.rate_limiting import rate_limit
 from . import v_models
+from ..ratings.rating_models import RatingResponse
 from . import service
-from ..models.models import Venue, User, Review, Rating
+from . import activity, checkins, importer, ranking, trending
+from ..recommendations import service as recommendations
+from ..models.models import Venue, User, Review, Rating, VenueType
 from typing import List, Optional
-from sqlalchemy import func
+from sqlalchemy import func, select
 
 router = APIRouter(
     prefix="/venues",
@@ -16,30 +26,18 @@ router = APIRouter(
 def _build_venue_response(venue: Venue, db: DbSession) -> v_models.VenueResponse:
     """Helper function to build VenueResponse with rating data"""
     # Get review count
-    review_count = db.query(func.count(Review.review_id)).filter(
+    review_count = db.scalar(select(func.count(Review.review_id)).where(
         Review.venue_id == venue.venue_id
-    ).scalar() or 0
+    )) or 0
 
     # Get average rating from ratings table
-    avg_rating = db.query(func.avg(Rating.rating)).filter(
+    avg_rating = db.scalar(select(func.avg(Rating.rating)).where(
         Rating.venue_id == venue.venue_id
-    ).scalar()
+    ))
 
     average_rating = round(float(avg_rating), 2) if avg_rating else 0.0
 
-    return v_models.VenueResponse(
-        venue_id=venue.venue_id,
-        venue_name=venue.venue_name,
-        address=venue.address,
-        hours=venue.hours,
-        venue_type=venue.venue_type,
-        age_req=venue.age_req,
-        description=venue.description,
-        capacity=venue.capacity,
-        price=venue.price,
-        average_rating=average_rating,
-        review_count=review_count
-    )
+    return v_models.VenueResponse.trusted(venue, average_rating, review_count)
 
 
 # noinspection PyTypeHints
@@ -49,18 +47,38 @@ def create_venue(db: DbSession, venue_data: v_models.VenueCreate, current_user:
     require_admin(current_user, db)
 
     venue = service.create_venue(db, venue_data)
-    return _build_venue_response(venue, db)
+    #a new venue has no reviews or ratings yet
+    return FastJSONResponse(v_models.VenueResponse.trusted(venue), status_code=status.HTTP_201_CREATED)
+
+
+# noinspection PyTypeHints
+@router.post("/import", status_code=status.HTTP_200_OK)
+def import_venues(db: DbSession, current_user: CurrentUser, file: UploadFile = File(...),
+                  format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                  dry_run: bool = False):
+    """Bulk import from CSV or NDJSON (admin only); returns counts and a per-row error report"""
+    require_admin(current_user, db)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = importer.import_venues(db, stream, format or importer.format_of(file.filename), dry_run)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to import venues")
+    return FastJSONResponse(report)
 
 
 # noinspection PyTypeHints
 @router.get("/", status_code=status.HTTP_200_OK)
-def get_all_venues(db: DbSession, after_venue_id: Optional[int] = None, limit: int = 20):
-    venues = service.get_all_venues(db, after_venue_id, limit)
-    return {
-        'venues': [_build_venue_response(venue, db) for venue in venues],
+def get_all_venues(db: DbSession, after_venue_id: Optional[int] = None, limit: int = 20,
+                   fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. venue_name,average_rating")):
+    selected = parse_fields(fields, service.VENUE_COLUMNS, "venue_id")
+    venues = service.get_all_venues(db, after_venue_id, limit, selected)
+    return FastJSONResponse({
+        'venues': [venue._asdict() for venue in venues],
         "has_more": len(venues) == limit,
         'next_cursor': venues[-1].venue_id if venues else None
-    }
+    })
 
 
 # noinspection PyTypeHints
@@ -75,7 +93,9 @@ def search_venues(db: DbSession,
                   min_age: Optional[int] = Query(None, ge=16),
                   location_search: Optional[str] = Query(None),
                   after_venue_id: Optional[int] = None,
-                  limit: int = 20):
+                  limit: int = 20,
+                  fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. venue_name,average_rating")):
+    selected = parse_fields(fields, service.VENUE_COLUMNS, "venue_id")
     filter_params = v_models.VenueFilter(
         min_capacity=min_capacity,
         max_capacity=max_capacity,
@@ -85,26 +105,199 @@ def search_venues(db: DbSession,
         min_age=min_age,
         location_search=location_search,
     )
-    venues = service.search_venue(db, venue_name, filter_params, after_venue_id, limit)
-    return {
-        'venues': [_build_venue_response(venue, db) for venue in venues],
+    venues = service.search_venue(db, venue_name, filter_params, after_venue_id, limit, selected)
+    return FastJSONResponse({
+        'venues': [venue._asdict() for venue in venues],
         "has_more": len(venues) == limit,
         'next_cursor': venues[-1].venue_id if venues else None
-    }
+    })
+
+
+# noinspection PyTypeHints
+@router.get("/batch", status_code=status.HTTP_200_OK)
+def get_venues_batch(db: DbSession, ids: str = Query(..., description="Comma-separated venue ids")):
+    """Several venues in one request, in the order asked for; unknown ids are listed in missing"""
+    try:
+        venue_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not venue_ids:
+        raise HTTPException(status_code=400, detail="No venue ids given")
+    if len(venue_ids) > service.BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {service.BATCH_LIMIT} ids per request")
+
+    responses = service.get_venue_responses(db, venue_ids)
+    return FastJSONResponse({
+        'venues': [responses[venue_id] for venue_id in venue_ids if venue_id in responses],
+        'missing': [venue_id for venue_id in venue_ids if venue_id not in responses]
+    })
+
+
+# noinspection PyTypeHints
+@router.get("/trending", status_code=status.HTTP_200_OK)
+def get_trending_venues(db: DbSession,
+                        city: Optional[str] = Query(None, max_length=100),
+                        venue_type: Optional[VenueType] = Query(None),
+                        limit: int = Query(20, ge=1, le=100)):
+    """Venues ranked by recent ratings, reviews and photos, optionally within one city or venue type"""
+    rows = trending.trending_venues(db, city, venue_type, limit)
+    return FastJSONResponse({
+        'venues': [v_models.TrendingVenueResponse.trusted(venue, average_rating, review_count, score)
+                   for venue, score, average_rating, review_count in rows]
+    })
 
 
 # noinspection PyTypeHints
-@router.get("/{venue_id}", response_model=v_models.VenueResponse)
+@router.get("/top", status_code=status.HTTP_200_OK)
+def get_top_venues(db: DbSession,
+                   venue_type: Optional[VenueType] = Query(None),
+                   max_price: Optional[int] = Query(None),
+                   cursor: Optional[str] = None,
+                   limit: int = Query(20, ge=1, le=100)):
+    """Rated venues by Bayesian average, best first; pass next_cursor back as cursor for the next page"""
+    rows = ranking.top_venues(db, venue_type, max_price, ranking.parse_cursor(cursor), limit)
+    last = rows[-1] if rows else None
+    return FastJSONResponse({
+        'venues': [v_models.RankedVenueResponse.trusted(
+            venue, round(venue.rating_sum / venue.rating_count, 2) if venue.rating_count else 0.0,
+            venue.review_count, venue.bayes_score, venue.rating_count
+        ) for venue in rows],
+        "has_more": len(rows) == limit,
+        'next_cursor': f"{last.bayes_score!r}:{last.venue_id}" if last else None
+    })
+
+
+# noinspection PyTypeHints
+@router.get("/{venue_id}", status_code=status.HTTP_200_OK)
 def get_venue(db: DbSession, venue_id: int):
-    venue = service.get_venue_by_id(db, venue_id)
-    return _build_venue_response(venue, db)
+    response = service.get_venue_responses(db, [venue_id]).get(venue_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Venue not found")
+    return FastJSONResponse(response)
+
+
+# noinspection PyTypeHints
+@router.get("/{venue_id}/detail", status_code=status.HTTP_200_OK)
+def get_venue_detail(db: DbSession, venue_id: int, current_user: OptionalUser,
+                     include: str = Query("photos,reviews,my_rating",
+                                          description="Comma-separated sections: photos, reviews, my_rating"),
+                     photo_limit: int = Query(20, ge=1, le=50),
+                     review_limit: int = Query(20, ge=1, le=50)):
+    """
+    The venue screen in one request: venue with aggregates, first pages of photos and
+    reviews (continue with next_cursor on /photo/venues/{id} and /reviews/venues/{id})
+    and the caller's own rating (null when anonymous or not rated)
+    """
+    sections = {section.strip() for section in include.split(",") if section.strip()}
+    unknown = sections - service.DETAIL_SECTIONS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(unknown))}")
+    user_id = current_user.get_id() if current_user else None
+    detail = service.get_venue_detail(db, venue_id, user_id, sections, photo_limit, review_limit)
+
+    body = {'venue': v_models.VenueResponse.trusted(detail["venue"], detail["average_rating"], detail["review_count"])}
+    if "photos" in sections:
+        photos = detail["photos"]
+        body['photos'] = {
+            'photos': [photo._asdict() for photo in photos],
+            "has_more": len(photos) == photo_limit,
+            'next_cursor': photos[-1].photo_id if photos else None
+        }
+    if "reviews" in sections:
+        reviews = detail["reviews"]
+        body['reviews'] = {
+            'reviews': [review._asdict() for review in reviews],
+            "has_more": len(reviews) == review_limit,
+            'next_cursor': reviews[-1].review_id if reviews else None
+        }
+    if "my_rating" in sections:
+        rating = detail["my_rating"]
+        body['my_rating'] = RatingResponse.model_construct(
+            rating_id=rating.rating_id, rating=rating.rating, created_at=rating.created_at,
+            user_id=rating.user_id, venue_id=rating.venue_id
+        ) if rating else None
+    return FastJSONResponse(body)
+
+
+# noinspection PyTypeHints
+@router.get("/{venue_id}/stream", status_code=status.HTTP_200_OK)
+async def stream_venue_activity(venue_id: int):
+    """
+    Server-Sent Events for one venue: review, photo and rating events as they are committed.
+    overflow and resync events mean some were missed: refetch the lists, then reconnect.
+    """
+    if activity.hub.count >= activity.MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many open streams, try again later")
+    if not await run_in_threadpool(activity.venue_exists, venue_id):
+        raise HTTPException(status_code=404, detail="Venue not found")
+    try:
+        await activity.hub.start()
+    except Exception:
+        raise HTTPException(status_code=503, detail="Live updates are unavailable")
+    return StreamingResponse(
+        activity.stream(venue_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# noinspection PyTypeHints
+@router.post("/{venue_id}/checkin", status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[rate_limit("checkin", "30/minute", per="user", local=True)])
+def check_in(current_user: CurrentUser, venue_id: int = Path(..., gt=0, le=checkins.MAX_VENUE_ID)):
+    """
+    Counts the current user as here now. Counted in memory and written in batches, so there is
+    no database round trip; a repeat within the window is accepted but not counted again.
+    """
+    counted = checkins.check_in(venue_id, current_user.get_id())
+    return FastJSONResponse({"venue_id": venue_id, "counted": counted}, status_code=status.HTTP_202_ACCEPTED)
+
+
+# noinspection PyTypeHints
+@router.get("/{venue_id}/here-now", status_code=status.HTTP_200_OK)
+def get_here_now(db: DbSession, venue_id: int = Path(..., gt=0, le=checkins.MAX_VENUE_ID)):
+    """Check-ins in the last window_minutes (other workers' latest few seconds may not be in yet)"""
+    return FastJSONResponse({
+        "venue_id": venue_id,
+        "here_now": checkins.here_now(db, venue_id),
+        "window_minutes": checkins.WINDOW_MINUTES,
+    })
+
+
+# noinspection PyTypeHints
+@router.get("/{venue_id}/similar", status_code=status.HTTP_200_OK)
+def get_similar_venues(db: DbSession, venue_id: int, limit: int = Query(10, ge=1, le=50),
+                       basis: str = Query("auto", pattern="^(auto|ratings|content)$")):
+    """
+    ratings: venues rated alike by the same people (rebuilt offline by app.recommendations.build)
+    content: venues with similar names, descriptions, types, price and capacity
+    auto: ratings when the venue has rating neighbours yet, content otherwise
+    """
+    rows = []
+    used = basis
+    if basis in ("auto", "ratings"):
+        rows = recommendations.similar_venues(db, venue_id, limit)
+        used = "ratings"
+    if basis == "content" or (basis == "auto" and not rows):
+        rows = recommendations.content_similar_venues(db, venue_id, limit)
+        used = "content"
+    if not rows:
+        service.get_venue_by_id(db, venue_id)  #404 for unknown venues, empty list otherwise
+    return FastJSONResponse({
+        'basis': used,
+        'venues': [v_models.SimilarVenueResponse.trusted(venue, average_rating, review_count, score)
+                   for venue, score, average_rating, review_count in rows]
+    })
 
 
 # noinspection PyTypeHints
 @router.delete("/{venue_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_venue(db: DbSession, venue_id: int, current_user: CurrentUser):
+def delete_venue(db: DbSession, venue_id: int, current_user: CurrentUser, background_tasks: BackgroundTasks):
     require_admin(current_user, db)
-    service.delete_venue(db, venue_id)
+    public_ids = service.delete_venue(db, venue_id)
+    #photo files are removed after the response, in batches
+    if public_ids:
+        background_tasks.add_task(storage.delete_files, public_ids)
 
 
 # noinspection PyTypeHints
@@ -113,5 +306,5 @@ def update_venue(venue_id: int, venue_change: v_models.VenueUpdate,
                  db: DbSession, current_user: CurrentUser):
     require_admin(current_user, db)
     updated_venue = service.update_venue(db, venue_id, venue_change)
-    return _build_venue_response(updated_venue, db)
+    return FastJSONResponse(_build_venue_response(updated_venue, db))
 
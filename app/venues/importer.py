@@ -0,0 +1,214 @@
+"""
+Bulk venue import from CSV or NDJSON.
+
+    python -m app.venues.importer new_city.csv
+    python -m app.venues.importer venues.ndjson --dry-run
+
+Rows are read as a stream and validated one at a time against VenueCreate. Valid rows are
+written to a temporary staging table with COPY, COPY_ROWS at a time, and one INSERT ... SELECT
+then merges them, skipping (name, address) pairs that already exist and storing each new
+venue's content vector in the same statement. The import is a single transaction: either
+every valid row lands or none do. CSV uses the export's layout (venue_type joined by "|").
+"""
+import argparse
+import csv
+import io
+import logging
+import sys
+import time
+from typing import IO, Iterator
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import TextClause, text
+from sqlalchemy.orm import Session
+from app.core import startup
+from app.models.models import Venue
+from app.recommendations import content
+from . import v_models
+
+COPY_ROWS = 10_000
+MAX_ERRORS = 1000
+
+#enum columns are stored by member name in Postgres types created by SQLAlchemy
+TYPE_ENUM = Venue.__table__.c.venue_type.type.item_type.name
+CAPACITY_ENUM = Venue.__table__.c.capacity.type.name
+
+STAGING = text("""
+    CREATE TEMP TABLE venue_import (
+        line integer, venue_name text, address text, hours text, venue_type text, age_req integer,
+        description text, capacity text, price integer, features bytea, weights bytea
+    ) ON COMMIT DROP
+""")
+
+#one statement: insert the venues that don't exist yet, store their content vectors, and report
+#which staged line became which venue (venue_id is null for lines that already existed).
+#updated_at is the wall clock, not the transaction start: staging a large file can take longer
+#than content.OVERLAP_SECONDS, and a refresh must still see the vectors once this commits
+def _merge(skip_existing: str) -> TextClause:
+    return text(f"""
+    WITH inserted AS (
+        INSERT INTO venues (venue_name, address, hours, venue_type, age_req, description, capacity, price)
+        SELECT s.venue_name, s.address, s.hours, s.venue_type::{TYPE_ENUM}[], s.age_req, s.description,
+               s.capacity::{CAPACITY_ENUM}, s.price
+        FROM venue_import s
+        {skip_existing}
+        RETURNING venue_id, venue_name, address
+    ), vectors AS (
+        INSERT INTO venue_content_vectors (venue_id, features, weights, updated_at)
+        SELECT i.venue_id, s.features, s.weights, clock_timestamp()::timestamp
+        FROM inserted i JOIN venue_import s ON s.venue_name = i.venue_name AND s.address = i.address
+        WHERE s.features IS NOT NULL
+    )
+    SELECT s.line, i.venue_id
+    FROM venue_import s LEFT JOIN inserted i ON i.venue_name = s.venue_name AND i.address = s.address
+""")
+
+
+MERGE = _merge("ORDER BY s.line ON CONFLICT ON CONSTRAINT unique_venue_name_address DO NOTHING")
+#databases without the constraint yet (see startup.upgrade_schema): skip existing pairs while
+#concurrent venue writes are blocked
+MERGE_LOCKED = _merge("WHERE NOT EXISTS (SELECT 1 FROM venues v WHERE v.venue_name = s.venue_name "
+                      "AND v.address = s.address) ORDER BY s.line")
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yields (row number, raw fields) per data row; fields are None when the row can't be parsed"""
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            fields = {key: value for key, value in row.items() if key and value not in ("", None)}
+            if "venue_type" in fields:
+                fields["venue_type"] = fields["venue_type"].split("|")
+            yield number, fields
+        return
+    number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            fields = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            fields = None
+        yield number, fields if isinstance(fields, dict) else None
+
+
+def _messages(error: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}" for detail in error.errors()]
+
+
+def _hex(data: bytes) -> str:
+    return "\\x" + data.hex()
+
+
+def reject(report: dict, number: int, messages: list[str]) -> None:
+    report["rejected"] += 1
+    if len(report["errors"]) < MAX_ERRORS:
+        report["errors"].append({"row": number, "errors": messages})
+
+
+def stage(rows: Iterator[tuple[int, dict | None]], report: dict) -> Iterator[str]:
+    """Validates rows and yields staging-table CSV, COPY_ROWS rows per chunk; rejects go to the report"""
+    seen: dict[tuple[str, str], int] = {}
+    vectors = content.numpy_available()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for number, fields in rows:
+        report["received"] += 1
+        if fields is None:
+            reject(report, number, ["row: not a JSON object"])
+            continue
+        try:
+            venue = v_models.VenueCreate.model_validate(fields)
+        except ValidationError as e:
+            reject(report, number, _messages(e))
+            continue
+        key = (venue.venue_name, venue.address)
+        if key in seen:
+            reject(report, number, [f"duplicate of row {seen[key]}"])
+            continue
+        seen[key] = number
+
+        features = weights = None
+        if vectors:
+            features, weights = (_hex(part) for part in content.pack(content.features(venue)))
+        writer.writerow((
+            number, venue.venue_name, venue.address, venue.hours,
+            "{" + ",".join(venue_type.name for venue_type in venue.venue_type) + "}",
+            venue.age_req, venue.description, venue.capacity.name, venue.price, features, weights,
+        ))
+        pending += 1
+        if pending == COPY_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def import_venues(db: Session, stream: IO[str], fmt: str, dry_run: bool = False) -> dict:
+    """
+    Imports a CSV or NDJSON stream of venues; returns counts plus a per-row error report
+    (at most MAX_ERRORS entries, in row order for rejected rows, then rows that already existed).
+    """
+    started = time.perf_counter()
+    report = {"received": 0, "inserted": 0, "existing": 0, "rejected": 0, "errors": []}
+    chunks = stage(read_rows(stream, fmt), report)
+    if dry_run:
+        for _ in chunks:
+            pass
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        return report
+
+    try:
+        db.execute(STAGING)
+        cursor = db.connection().connection.cursor()
+        for chunk in chunks:
+            cursor.copy_expert("COPY venue_import FROM STDIN WITH (FORMAT csv)", io.StringIO(chunk))
+        if startup.has_constraint(db, "unique_venue_name_address"):
+            results = db.execute(MERGE).all()
+        else:
+            db.execute(text("LOCK TABLE venues IN SHARE ROW EXCLUSIVE MODE"))
+            results = db.execute(MERGE_LOCKED).all()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Venue import failed: {str(e)}")
+        raise
+
+    for line, venue_id in sorted(results):
+        if venue_id is None:
+            report["existing"] += 1
+            if len(report["errors"]) < MAX_ERRORS:
+                report["errors"].append({"row": line, "errors": ["venue already exists"]})
+        else:
+            report["inserted"] += 1
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    logging.info(f"Imported {report['inserted']} venues ({report['existing']} existing, "
+                 f"{report['rejected']} rejected) in {report['seconds']}s")
+    return report
+
+
+def format_of(filename: str | None) -> str:
+    return "ndjson" if filename and filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import venues from CSV or NDJSON")
+    parser.add_argument("path", help="file to import, - for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from app.core.database import SessionLocal
+    fmt = args.format or format_of(args.path)
+    stream = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    with stream, SessionLocal() as db:
+        report = import_venues(db, stream, fmt, args.dry_run)
+    print(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Top-rated venues by Bayesian (damped) average:
+
+    score = (prior_weight * prior_mean + sum of ratings) / (prior_weight + number of ratings)
+
+so a venue needs a number of ratings comparable to the prior weight before its own
+average dominates. Counts and sums live in venue_rankings and are adjusted by every
+rating write in the writer's transaction; the endpoint is a keyset walk of the
+(bayes_score, venue_id) index.
+
+    python -m app.venues.ranking --rebuild   # recompute from the ratings table (needed after changing the prior)
+
+BAYES_PRIOR_MEAN (default 3.5) and BAYES_PRIOR_WEIGHT (default 10) set the prior.
+"""
+import argparse
+import logging
+import os
+import time
+from fastapi import HTTPException
+from sqlalchemy import Row, func, select, text, tuple_
+from sqlalchemy.orm import Session
+from app.models.models import Venue, VenueRanking, Review, VenueType
+
+PRIOR_MEAN = float(os.getenv("BAYES_PRIOR_MEAN", "3.5"))
+PRIOR_WEIGHT = float(os.getenv("BAYES_PRIOR_WEIGHT", "10"))
+
+#first rating of a venue creates its row; later ones add to it
+ADD = text("""
+    INSERT INTO venue_rankings AS k (venue_id, rating_count, rating_sum, bayes_score, venue_type, price)
+    SELECT v.venue_id, :count, :sum, (:weight * :mean + :sum) / (:weight + :count), v.venue_type, v.price
+    FROM venues v WHERE v.venue_id = :venue_id
+    ON CONFLICT (venue_id) DO UPDATE SET
+        rating_count = k.rating_count + :count,
+        rating_sum = k.rating_sum + :sum,
+        bayes_score = (:weight * :mean + k.rating_sum + :sum) / (:weight + k.rating_count + :count)
+""")
+
+#changed or removed ratings never create a row
+ADJUST = text("""
+    UPDATE venue_rankings SET
+        rating_count = rating_count + :count,
+        rating_sum = rating_sum + :sum,
+        bayes_score = (:weight * :mean + rating_sum + :sum) / (:weight + rating_count + :count)
+    WHERE venue_id = :venue_id
+""")
+
+#a venue whose last rating went leaves the leaderboard instead of sitting at the prior mean
+UNRANK = text("DELETE FROM venue_rankings WHERE venue_id = :venue_id AND rating_count + :count <= 0")
+
+SYNC = text("""
+    UPDATE venue_rankings k SET venue_type = v.venue_type, price = v.price
+    FROM venues v WHERE v.venue_id = k.venue_id AND k.venue_id = :venue_id
+""")
+
+#recomputes one venue's row from its ratings (when an increment can't be known)
+RECOUNT = text("""
+    INSERT INTO venue_rankings AS k (venue_id, rating_count, rating_sum, bayes_score, venue_type, price)
+    SELECT v.venue_id, r.n, r.total, (:weight * :mean + r.total) / (:weight + r.n), v.venue_type, v.price
+    FROM venues v, (SELECT count(*) AS n, coalesce(sum(rating), 0) AS total FROM ratings WHERE venue_id = :venue_id) r
+    WHERE v.venue_id = :venue_id AND r.n > 0
+    ON CONFLICT (venue_id) DO UPDATE SET
+        rating_count = EXCLUDED.rating_count,
+        rating_sum = EXCLUDED.rating_sum,
+        bayes_score = EXCLUDED.bayes_score
+""")
+
+REBUILD = text("""
+    INSERT INTO venue_rankings (venue_id, rating_count, rating_sum, bayes_score, venue_type, price)
+    SELECT v.venue_id, r.n, r.total, (:weight * :mean + r.total) / (:weight + r.n), v.venue_type, v.price
+    FROM (SELECT venue_id, count(*) AS n, sum(rating) AS total FROM ratings GROUP BY venue_id) r
+    JOIN venues v ON v.venue_id = r.venue_id
+""")
+
+
+def adjust(db: Session, venue_id: int, count: int, total: float) -> None:
+    """
+    Applies a rating change to the venue's row in the caller's transaction:
+    new rating (1, value), changed rating (0, new - old), deleted rating (-1, -value);
+    a venue left without ratings loses its row
+    """
+    params = {"venue_id": venue_id, "count": count, "sum": total, "weight": PRIOR_WEIGHT, "mean": PRIOR_MEAN}
+    if count > 0:
+        db.execute(ADD, params)
+        return
+    if count < 0 and db.execute(UNRANK, params).rowcount:
+        return
+    db.execute(ADJUST, params)
+
+
+def recount(db: Session, venue_id: int) -> None:
+    """Recomputes the venue's row from the ratings table in the caller's transaction"""
+    db.execute(RECOUNT, {"venue_id": venue_id, "weight": PRIOR_WEIGHT, "mean": PRIOR_MEAN})
+
+
+def sync_venue(db: Session, venue_id: int) -> None:
+    """Copies a changed price / venue type into the venue's ranking row"""
+    db.execute(SYNC, {"venue_id": venue_id})
+
+
+def parse_cursor(cursor: str | None) -> tuple[float, int] | None:
+    """Cursors are "<bayes_score>:<venue_id>" of the last venue on the previous page"""
+    if not cursor:
+        return None
+    try:
+        score, venue_id = cursor.split(":")
+        return float(score), int(venue_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def top_venues(db: Session, venue_type: VenueType | None = None, max_price: int | None = None,
+               cursor: tuple[float, int] | None = None, limit: int = 20) -> list[Row]:
+    """Rated venues by Bayesian score as venue rows with bayes_score, rating_count, rating_sum and review_count"""
+    try:
+        reviews = (select(func.count(Review.review_id)).where(Review.venue_id == Venue.venue_id)
+                   .correlate(Venue).scalar_subquery())
+        statement = (select(Venue.__table__, VenueRanking.bayes_score, VenueRanking.rating_count,
+                            VenueRanking.rating_sum, reviews.label("review_count"))
+                     .join(VenueRanking, VenueRanking.venue_id == Venue.venue_id)
+                     .where(VenueRanking.rating_count > 0))
+        if venue_type:
+            statement = statement.where(VenueRanking.venue_type.any(venue_type))
+        if max_price is not None:
+            statement = statement.where(VenueRanking.price <= max_price)
+        if cursor:
+            statement = statement.where(tuple_(VenueRanking.bayes_score, VenueRanking.venue_id) < cursor)
+        return db.execute(statement.order_by(VenueRanking.bayes_score.desc(), VenueRanking.venue_id.desc())
+                          .limit(limit)).all()
+    except Exception as e:
+        logging.error(f"Error fetching top venues: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch top venues")
+
+
+def rebuild(db: Session) -> int:
+    """Recomputes every row from the ratings table in one transaction; returns the number of venues ranked"""
+    db.execute(VenueRanking.__table__.delete())
+    db.execute(REBUILD, {"weight": PRIOR_WEIGHT, "mean": PRIOR_MEAN})
+    db.commit()
+    return db.scalar(select(func.count(VenueRanking.venue_id)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bayesian venue leaderboard")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rows from the ratings table")
+    parser.add_argument("--top", type=int, default=10, help="print the current top venues")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal, engine
+    VenueRanking.__table__.create(engine, checkfirst=True)
+    with SessionLocal() as db:
+        if args.rebuild:
+            started = time.perf_counter()
+            count = rebuild(db)
+            print(f"Ranked {count} venues in {time.perf_counter() - started:.2f}s")
+        for venue in top_venues(db, limit=args.top):
+            print(f"{venue.bayes_score:>6.3f}  {venue.rating_count:>6}  {venue.venue_id:>7}  {venue.venue_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,46 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Float, Numeric, and_, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
 from fastapi import HTTPException
 from . import v_models
-from app.models.models import Venue, Photo
+from app.models.models import Venue, Photo, Rating, Review
 import logging
+import os
 from typing import List, Optional
-import cloudinary.uploader
+from app.core import startup, storage
+from app.core.cache import TTLCache
+from app.core.fields import project
+from . import ranking, trending
+from app.recommendations import content
 
+#VenueResponse (with aggregates) per venue id; dropped by this worker's writes, expires for the others
+venue_cache = TTLCache("venue", int(os.getenv("VENUE_CACHE_SIZE", "10000")),
+                       float(os.getenv("VENUE_CACHE_TTL_SECONDS", "30")))
+BATCH_LIMIT = 100
 
-def create_venue(db: Session, venue_data: v_models.VenueCreate) -> Venue:
-    try:
-        existing = db.query(Venue).filter(
-            Venue.venue_name == venue_data.venue_name, Venue.address == venue_data.address
-        ).first()
+#per-venue aggregates as correlated subqueries, for statements that select venues
+_AVERAGE = (select(func.avg(Rating.rating)).where(Rating.venue_id == Venue.venue_id)
+            .correlate(Venue).scalar_subquery().label("average_rating"))
+_REVIEWS = (select(func.count(Review.review_id)).where(Review.venue_id == Venue.venue_id)
+            .correlate(Venue).scalar_subquery().label("review_count"))
+
+#columns a venue list can be narrowed to with fields=; the aggregates are correlated subqueries,
+#so they are only computed when asked for
+VENUE_COLUMNS = {
+    "venue_id": Venue.venue_id, "venue_name": Venue.venue_name, "address": Venue.address, "hours": Venue.hours,
+    "venue_type": Venue.venue_type, "age_req": Venue.age_req, "description": Venue.description,
+    "capacity": Venue.capacity, "price": Venue.price,
+    "average_rating": select(cast(func.coalesce(func.round(cast(func.avg(Rating.rating), Numeric), 2), 0), Float))
+        .where(Rating.venue_id == Venue.venue_id).correlate(Venue).scalar_subquery(),
+    "review_count": select(func.count(Review.review_id))
+        .where(Review.venue_id == Venue.venue_id).correlate(Venue).scalar_subquery(),
+}
 
-        if existing:
-            raise HTTPException(status_code=400, detail="Venue already exists")
 
-        venue = Venue(
+def create_venue(db: Session, venue_data: v_models.VenueCreate):
+    """Inserts the venue unless its (name, address) exists; returns the stored row"""
+    try:
+        statement = pg_insert(Venue.__table__).values(
             venue_name=venue_data.venue_name,
             venue_type=venue_data.venue_type,
             address=venue_data.address,
@@ -25,11 +49,23 @@ def create_venue(db: Session, venue_data: v_models.VenueCreate) -> Venue:
             price=venue_data.price,
             capacity=venue_data.capacity,
             description=venue_data.description,
-        )
+        ).returning(*Venue.__table__.c)
+        if startup.has_constraint(db, "unique_venue_name_address"):
+            venue = db.execute(statement.on_conflict_do_nothing(constraint="unique_venue_name_address")).first()
+        elif db.scalar(select(Venue.venue_id).where(Venue.venue_name == venue_data.venue_name,
+                                                    Venue.address == venue_data.address).limit(1)) is not None:
+            #database without the constraint yet (see startup.upgrade_schema): checked first, as before
+            venue = None
+        else:
+            venue = db.execute(statement).first()
+
+        if venue is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Venue already exists")
 
-        db.add(venue)
+        vector = content.index_venue(db, venue)
         db.commit()
-        db.refresh(venue)
+        content.publish(vector)
         logging.info(f"Created venue: {venue.venue_name}")
         return venue
     except HTTPException:
@@ -40,7 +76,7 @@ def create_venue(db: Session, venue_data: v_models.VenueCreate) -> Venue:
         raise HTTPException(status_code=500, detail="Failed to create venue")
 
 def get_venue_by_id(db: Session, venue_id: int) -> Venue:
-    venue = db.query(Venue).get(venue_id)
+    venue = db.get(Venue, venue_id)
     if not venue:
         raise HTTPException(status_code=404, detail="Venue not found")
     return venue
@@ -52,7 +88,18 @@ def update_venue(db: Session, venue_id: int, change_venue: v_models.VenueUpdate)
 
         for key, value in update_data.items():
             setattr(venue, key, value)
+        #denormalized copies used to slice the trending list and the leaderboard
+        if "address" in update_data or "price" in update_data:
+            db.flush()
+            trending.sync_venue(db, venue_id)
+            ranking.sync_venue(db, venue_id)
+        vector = None
+        if update_data.keys() & {"venue_name", "description", "price", "capacity"}:
+            db.flush()
+            vector = content.index_venue(db, venue)
         db.commit()
+        content.publish(vector)
+        venue_cache.invalidate(venue_id)
         db.refresh(venue)
         logging.info(f"Venue {venue.venue_name} updated")
         return venue
@@ -63,36 +110,24 @@ def update_venue(db: Session, venue_id: int, change_venue: v_models.VenueUpdate)
         logging.error(f"Failed to update venue {venue_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update venue")
 
-def delete_venue(db: Session, venue_id: int) -> None:
+def delete_venue(db: Session, venue_id: int) -> list[str]:
+    """
+    Deletes the venue in one statement (reviews, photos, ratings and derived rows go with it
+    through ON DELETE CASCADE); returns the storage ids of its photos for the caller to remove
+    """
     try:
-        venue = get_venue_by_id(db, venue_id)  # sees if venue exists
-
-        # Delete photos from Cloudinary before deleting from database
-        photos = db.query(Photo).filter(Photo.venue_id == venue_id).all()
-        for photo in photos:
-            try:
-                # Extract public_id from Cloudinary URL
-                url_parts = photo.img_url.split('/')
-                upload_index = url_parts.index('upload')
-                public_id_parts = url_parts[upload_index + 1:]
-
-                # Skip version number if present
-                if public_id_parts and public_id_parts[0].startswith('v') and public_id_parts[0][1:].isdigit():
-                    public_id_parts = public_id_parts[1:]
-
-                # Join remaining parts and remove file extension
-                public_id = '/'.join(public_id_parts).rsplit('.', 1)[0]
-
-                # Delete from Cloudinary
-                cloudinary.uploader.destroy(public_id)
-                logging.info(f"Deleted photo from Cloudinary: {public_id}")
-            except Exception as cloudinary_error:
-                # Log error but continue with deletion
-                logging.error(f"Failed to delete photo from Cloudinary: {cloudinary_error}")
-
-        db.delete(venue)
+        # Capture the photo keys first, the rows are gone after the delete
+        public_ids = [storage.public_id_from_url(img_url)
+                      for img_url in db.scalars(select(Photo.img_url).where(Photo.venue_id == venue_id))]
+
+        deleted = db.execute(delete(Venue).where(Venue.venue_id == venue_id)).rowcount
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Venue not found")
         db.commit()
-        logging.info(f"Venue {venue.venue_name} deleted, ID: {venue_id}")
+        venue_cache.invalidate(venue_id)
+        content.index.remove(venue_id)
+        logging.info(f"Venue {venue_id} deleted with {len(public_ids)} photos")
+        return public_ids
     except HTTPException:
         raise
     except Exception as e:
@@ -102,14 +137,15 @@ def delete_venue(db: Session, venue_id: int) -> None:
 
 
 # noinspection PyTypeChecker
-def get_all_venues(db: Session, after_venue_id: int = None, limit: int = 20) -> List[Venue]:
+def get_all_venues(db: Session, after_venue_id: int = None, limit: int = 20, fields: list[str] = None) -> List:
+    """Rows of the given fields (every column and both aggregates by default)"""
     try:
-        query = db.query(Venue)
+        statement = project(Venue, fields, VENUE_COLUMNS, {})
         
         if after_venue_id:
-            query = query.filter(Venue.venue_id > after_venue_id)
+            statement = statement.where(Venue.venue_id > after_venue_id)
             
-        venues = query.order_by(Venue.venue_id.asc()).limit(limit).all()
+        venues = db.execute(statement.order_by(Venue.venue_id.asc()).limit(limit)).all()
         logging.info(f"Retrieved {len(venues)} venues")
         return venues
     except HTTPException:
@@ -120,35 +156,37 @@ def get_all_venues(db: Session, after_venue_id: int = None, limit: int = 20) ->
 
 
 # noinspection PyTypeChecker
-def search_venue(db: Session, venue_name: Optional[str], special_filter: v_models.VenueFilter, after_venue_id: int = None, limit: int = 20) -> List[Venue]:
+def search_venue(db: Session, venue_name: Optional[str], special_filter: v_models.VenueFilter, after_venue_id: int = None, limit: int = 20,
+                 fields: list[str] = None) -> List:
+    """Rows of the given fields (every column and both aggregates by default)"""
     try:
-        query = db.query(Venue)
+        statement = project(Venue, fields, VENUE_COLUMNS, {})
 
         if venue_name:
-            query = query.filter(Venue.venue_name.ilike(f"%{venue_name}%"))
+            statement = statement.where(Venue.venue_name.ilike(f"%{venue_name}%"))
 
         #have to in the future figure out capacity filtering.
 
         #hours open filters
         if special_filter.hours:
-            query = query.filter(Venue.hours.ilike(f"%{special_filter.hours}%"))
+            statement = statement.where(Venue.hours.ilike(f"%{special_filter.hours}%"))
         #price filter
         if special_filter.max_price:
-            query = query.filter(Venue.price <= special_filter.max_price)
+            statement = statement.where(Venue.price <= special_filter.max_price)
         #age filter
         if special_filter.min_age:
-            query = query.filter(Venue.age_req <= special_filter.min_age)
+            statement = statement.where(Venue.age_req <= special_filter.min_age)
         #venue_type filter
         if special_filter.venue_type:
-            query = query.filter(Venue.venue_type.any(special_filter.venue_type))
+            statement = statement.where(Venue.venue_type.any(special_filter.venue_type))
         #location search
         if special_filter.location_search:
-            query = query.filter(Venue.address.ilike(f"%{special_filter.location_search}%"))
+            statement = statement.where(Venue.address.ilike(f"%{special_filter.location_search}%"))
 
         if after_venue_id:
-            query = query.filter(Venue.venue_id > after_venue_id)
+            statement = statement.where(Venue.venue_id > after_venue_id)
             
-        venues = query.order_by(Venue.venue_id.asc()).limit(limit).all()
+        venues = db.execute(statement.order_by(Venue.venue_id.asc()).limit(limit)).all()
 
         logging.info(f"Found {len(venues)} venues")
         return venues
@@ -156,4 +194,71 @@ def search_venue(db: Session, venue_name: Optional[str], special_filter: v_model
         raise
     except Exception as e:
         logging.error(f"Error searching venues: {str(e)}")
-        raise HTTPException(status_code=500, detail="Venue search failed")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Venue search failed")
+
+DETAIL_SECTIONS = {"photos", "reviews", "my_rating"}
+
+
+def get_venue_detail(db: Session, venue_id: int, user_id: Optional[int], sections: set[str],
+                     photo_limit: int = 20, review_limit: int = 20) -> dict:
+    """
+    Everything the venue screen shows, in at most three queries on one connection:
+    the venue with its aggregates and the caller's rating (one row), then the first
+    page of photos and of reviews as display rows (username and venue_name joined in).
+    """
+    #app.photo and app.reviews import this module
+    from app.photo.service import PHOTO_COLUMNS, PHOTO_JOINS
+    from app.reviews.service import REVIEW_COLUMNS, REVIEW_JOINS
+    try:
+        own_rating = aliased(Rating)
+        statement = select(Venue, _AVERAGE, _REVIEWS)
+        if "my_rating" in sections and user_id is not None:
+            statement = statement.add_columns(own_rating).outerjoin(
+                own_rating, and_(own_rating.venue_id == Venue.venue_id, own_rating.user_id == user_id)
+            )
+        row = db.execute(statement.where(Venue.venue_id == venue_id)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Venue not found")
+        venue, avg, review_count = row[:3]
+        detail = {
+            "venue": venue,
+            "average_rating": round(float(avg), 2) if avg else 0.0,
+            "review_count": review_count or 0,
+            "my_rating": row[3] if len(row) > 3 else None,
+        }
+
+        if "photos" in sections:
+            detail["photos"] = db.execute(project(Photo, None, PHOTO_COLUMNS, PHOTO_JOINS)
+                                          .where(Photo.venue_id == venue_id)
+                                          .order_by(Photo.photo_id.desc()).limit(photo_limit)).all()
+        if "reviews" in sections:
+            detail["reviews"] = db.execute(project(Review, None, REVIEW_COLUMNS, REVIEW_JOINS)
+                                           .where(Review.venue_id == venue_id)
+                                           .order_by(Review.created_at.desc()).limit(review_limit)).all()
+        return detail
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error fetching venue detail {venue_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch venue")
+
+
+def get_venue_responses(db: Session, venue_ids: list[int]) -> dict[int, v_models.VenueResponse]:
+    """
+    VenueResponses (with aggregates) for the ids that exist, read through venue_cache:
+    all cache misses are loaded together in one query
+    """
+    found, missing = venue_cache.get_many(venue_ids)
+    if not missing:
+        return found
+    try:
+        rows = db.execute(select(Venue.__table__, _AVERAGE, _REVIEWS).where(Venue.venue_id.in_(missing))).all()
+    except Exception as e:
+        logging.error(f"Error fetching venues {missing}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch venues")
+    loaded = {row.venue_id: v_models.VenueResponse.trusted(row, round(float(row.average_rating), 2)
+                                                           if row.average_rating else 0.0, row.review_count or 0)
+              for row in rows}
+    venue_cache.put_many(loaded)
+    found.update(loaded)
+    return found
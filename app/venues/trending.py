@@ -0,0 +1,141 @@
+"""
+Trending venues: an exponentially time-decayed activity score per venue.
+
+Every rating, review and photo adds weight * 2^((t - EPOCH) / half_life) to its venue.
+Because all scores decay at the same rate, the stored sum never has to be aged; it is
+kept as a log (log-sum-exp on each write) so it cannot overflow, and the current score
+is exp(log_score - now_term), where an event of weight 1 happening now is worth 1.
+Writes are one upsert in the writer's transaction and reads are a top-K walk of an
+index on log_score.
+
+    python -m app.venues.trending --rebuild   # recompute every score from the event tables
+
+TRENDING_HALF_LIFE_HOURS sets how fast activity fades (default 24).
+"""
+import argparse
+import logging
+import math
+import os
+import time
+from fastapi import HTTPException
+from sqlalchemy import Row, func, literal_column, select, text
+from sqlalchemy.orm import Session
+from app.models.models import Venue, VenueTrending, Rating, Review, VenueType
+
+HALF_LIFE_SECONDS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24")) * 3600
+DECAY = math.log(2) / HALF_LIFE_SECONDS
+#fixed reference point for the exponent; changing it requires a rebuild
+EPOCH = 1704067200.0  #2024-01-01 00:00
+WEIGHTS = {"rating": 1.0, "review": 2.0, "photo": 1.5}
+#events older than this many half-lives contribute less than one millionth and are skipped by the rebuild
+REBUILD_HALF_LIVES = 20
+
+#second-to-last comma separated part of "12 Main St, Austin, TX"
+CITY_SQL = "lower(trim(substring(v.address from '([^,]+),[^,]*$')))"
+#log(exp(a) + exp(b)) without overflow; exp() is clamped because Postgres raises on underflow
+LOG_ADD_SQL = "GREATEST({a}, {b}) + ln(1 + exp(-LEAST(abs({a} - {b}), 50)))"
+
+RECORD = text(f"""
+    INSERT INTO venue_trending AS t (venue_id, city, venue_type, log_score, updated_at)
+    SELECT v.venue_id, {CITY_SQL}, v.venue_type,
+           ln(:weight) + (EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8 - :epoch) * :decay, LOCALTIMESTAMP
+    FROM venues v WHERE v.venue_id = :venue_id
+    ON CONFLICT (venue_id) DO UPDATE SET
+        log_score = {LOG_ADD_SQL.format(a="t.log_score", b="EXCLUDED.log_score")},
+        updated_at = EXCLUDED.updated_at
+""")
+
+SYNC = text(f"""
+    UPDATE venue_trending t SET city = {CITY_SQL}, venue_type = v.venue_type
+    FROM venues v WHERE v.venue_id = t.venue_id AND t.venue_id = :venue_id
+""")
+
+REBUILD = text(f"""
+    WITH events AS (
+        SELECT venue_id, ln(:w_rating) + (EXTRACT(EPOCH FROM created_at)::float8 - :epoch) * :decay AS term
+        FROM ratings WHERE created_at > LOCALTIMESTAMP - make_interval(secs => :window)
+        UNION ALL
+        SELECT venue_id, ln(:w_review) + (EXTRACT(EPOCH FROM created_at)::float8 - :epoch) * :decay
+        FROM reviews WHERE created_at > LOCALTIMESTAMP - make_interval(secs => :window)
+        UNION ALL
+        SELECT venue_id, ln(:w_photo) + (EXTRACT(EPOCH FROM uploaded_at)::float8 - :epoch) * :decay
+        FROM photos WHERE uploaded_at > LOCALTIMESTAMP - make_interval(secs => :window)
+    ), peaks AS (
+        SELECT venue_id, max(term) AS peak FROM events GROUP BY venue_id
+    ), scores AS (
+        SELECT e.venue_id, p.peak + ln(sum(exp(GREATEST(e.term - p.peak, -50)))) AS log_score
+        FROM events e JOIN peaks p ON p.venue_id = e.venue_id
+        GROUP BY e.venue_id, p.peak
+    )
+    INSERT INTO venue_trending (venue_id, city, venue_type, log_score, updated_at)
+    SELECT v.venue_id, {CITY_SQL}, v.venue_type, s.log_score, LOCALTIMESTAMP
+    FROM scores s JOIN venues v ON v.venue_id = s.venue_id
+""")
+
+
+def record_activity(db: Session, venue_id: int, kind: str) -> None:
+    """Adds one event to the venue's score; runs in the caller's transaction, so commit it with the write"""
+    db.execute(RECORD, {"venue_id": venue_id, "weight": WEIGHTS[kind], "epoch": EPOCH, "decay": DECAY})
+
+
+def sync_venue(db: Session, venue_id: int) -> None:
+    """Copies a changed address / venue type into the venue's trending row"""
+    db.execute(SYNC, {"venue_id": venue_id})
+
+
+def trending_venues(db: Session, city: str | None = None, venue_type: VenueType | None = None,
+                    limit: int = 20) -> list[tuple[Row, float, float, int]]:
+    """Top venues by current score as (venue row, score, average_rating, review_count)"""
+    try:
+        average = (select(func.avg(Rating.rating)).where(Rating.venue_id == Venue.venue_id)
+                   .correlate(Venue).scalar_subquery())
+        reviews = (select(func.count(Review.review_id)).where(Review.venue_id == Venue.venue_id)
+                   .correlate(Venue).scalar_subquery())
+        #decayed to the database clock, the same clock the writes were stamped with
+        now_term = (literal_column("EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8") - EPOCH) * DECAY
+        score = func.exp(func.greatest(VenueTrending.log_score - now_term, -700))
+        statement = (select(Venue.__table__, score.label("score"), average.label("average_rating"),
+                            reviews.label("review_count"))
+                     .join(VenueTrending, VenueTrending.venue_id == Venue.venue_id))
+        if city:
+            statement = statement.where(VenueTrending.city == city.strip().lower())
+        if venue_type:
+            statement = statement.where(VenueTrending.venue_type.any(venue_type))
+        rows = db.execute(statement.order_by(VenueTrending.log_score.desc()).limit(limit)).all()
+        return [(row, row.score, round(float(row.average_rating), 2) if row.average_rating else 0.0,
+                 row.review_count or 0) for row in rows]
+    except Exception as e:
+        logging.error(f"Error fetching trending venues: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch trending venues")
+
+
+def rebuild(db: Session) -> int:
+    """Recomputes every score from ratings, reviews and photos in one transaction; returns the number of venues scored"""
+    db.execute(VenueTrending.__table__.delete())
+    db.execute(REBUILD, {
+        "w_rating": WEIGHTS["rating"], "w_review": WEIGHTS["review"], "w_photo": WEIGHTS["photo"],
+        "epoch": EPOCH, "decay": DECAY, "window": REBUILD_HALF_LIVES * HALF_LIFE_SECONDS
+    })
+    db.commit()
+    return db.scalar(select(func.count(VenueTrending.venue_id)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trending venue scores")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all scores from the event tables")
+    parser.add_argument("--top", type=int, default=10, help="print the current top venues")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal, engine
+    VenueTrending.__table__.create(engine, checkfirst=True)
+    with SessionLocal() as db:
+        if args.rebuild:
+            started = time.perf_counter()
+            count = rebuild(db)
+            print(f"Scored {count} venues in {time.perf_counter() - started:.2f}s")
+        for venue, score, _, _ in trending_venues(db, limit=args.top):
+            print(f"{score:>10.2f}  {venue.venue_id:>7}  {venue.venue_name}")
+
+
+if __name__ == "__main__":
+    main()
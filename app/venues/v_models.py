@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
 from ..models.models import VenueType, VenueCapacity
 from typing import Optional, List
 
@@ -15,22 +16,87 @@ class VenueBase(BaseModel):
 class VenueCreate(VenueBase):
     pass
 
-#output of venue data
+#output of venue data (the single venue schema every endpoint returns)
 class VenueResponse(VenueBase):
     venue_id: int
     average_rating: Optional[float] = 0.0
     review_count: int = 0
-"""
-    venue_name: str
-    address: str
-    hours: str
-    venue_type: List[VenueType]
-    age_req: int
-    description: Optional[str] = None
-    capacity: VenueCapacity = None
-    average_rating: Optional[float] = 0.0
-    review_count: int = 0
-"""
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0) -> "VenueResponse":
+        """Builds the response from a loaded venue row without re-validating it"""
+        return cls.model_construct(
+            venue_id=venue.venue_id,
+            venue_name=venue.venue_name,
+            address=venue.address,
+            hours=venue.hours,
+            venue_type=venue.venue_type,
+            age_req=venue.age_req,
+            description=venue.description,
+            capacity=venue.capacity,
+            price=venue.price,
+            average_rating=average_rating,
+            review_count=review_count
+        )
+
+#venue in the trending list, with its current decayed activity score
+class TrendingVenueResponse(VenueResponse):
+    trending_score: float = 0.0
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0,
+                trending_score: float = 0.0) -> "TrendingVenueResponse":
+        response = super().trusted(venue, average_rating, review_count)
+        response.trending_score = round(trending_score, 3)
+        return response
+
+#venue on the top-rated leaderboard; bayes_score is the damped average it is ranked by
+class RankedVenueResponse(VenueResponse):
+    bayes_score: float = 0.0
+    rating_count: int = 0
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0,
+                bayes_score: float = 0.0, rating_count: int = 0) -> "RankedVenueResponse":
+        response = super().trusted(venue, average_rating, review_count)
+        response.bayes_score = round(bayes_score, 3)
+        response.rating_count = rating_count
+        return response
+
+#venue in a user's rated list, with the score they gave it
+class RatedVenueResponse(VenueResponse):
+    my_rating: float = 0.0
+    rated_at: Optional[datetime] = None
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0,
+                my_rating: float = 0.0, rated_at: Optional[datetime] = None) -> "RatedVenueResponse":
+        response = super().trusted(venue, average_rating, review_count)
+        response.my_rating = my_rating
+        response.rated_at = rated_at
+        return response
+
+#venue in a similar-venues list; similarity is relative to the venue asked about
+class SimilarVenueResponse(VenueResponse):
+    similarity: float = 0.0
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0,
+                similarity: float = 0.0) -> "SimilarVenueResponse":
+        response = super().trusted(venue, average_rating, review_count)
+        response.similarity = round(similarity, 4)
+        return response
+
+#personalized recommendation with the rating we expect the user to give it
+class RecommendedVenueResponse(VenueResponse):
+    predicted_rating: float = 0.0
+
+    @classmethod
+    def trusted(cls, venue, average_rating: float = 0.0, review_count: int = 0,
+                predicted_rating: float = 0.0) -> "RecommendedVenueResponse":
+        response = super().trusted(venue, average_rating, review_count)
+        response.predicted_rating = round(predicted_rating, 2)
+        return response
 
 #update venue data
 class VenueUpdate(BaseModel):
@@ -50,7 +116,3 @@ class VenueFilter(BaseModel):
     location_search: Optional[str] = Field(None, max_length=100, description="Search in address")
     max_price: Optional[int] = Field(None, ge=100)
     min_age: Optional[int] = Field(None, ge=16)
-
-
-class VenueSearch(VenueBase):
-    pass
\ No newline at end of file
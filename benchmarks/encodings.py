@@ -0,0 +1,48 @@
+"""
+Wire size and encode time of a 20-item page per endpoint and response encoding.
+
+    python -m benchmarks.encodings --rounds 2000
+"""
+import argparse
+import gzip
+import time
+from .serialization import fake_rows, review_item
+from app.core import responses
+from app.venues.v_models import VenueResponse
+from app.photo.p_model import PhotoResponse
+
+
+def pages():
+    venues, photos, reviews = fake_rows()
+    return {
+        "GET /venues/": {"venues": [VenueResponse.trusted(v, 4.2, 12) for v in venues],
+                         "has_more": True, "next_cursor": 20},
+        "GET /photo/venues/{venue_id}": {"photos": [PhotoResponse.trusted(p) for p in photos],
+                                         "has_more": True, "next_cursor": 1},
+        "GET /reviews/venues/{venue_id}": {"reviews": [review_item(r) for r in reviews],
+                                           "has_more": True, "next_cursor": 1},
+    }
+
+
+def main(rounds: int) -> None:
+    encodings = [responses.JSON]
+    if responses.msgpack is not None:
+        encodings.append(responses.MSGPACK)
+    if responses.cbor2 is not None:
+        encodings.append(responses.CBOR)
+
+    print(f"{'endpoint':<34}{'encoding':<22}{'bytes':>8}{'gzip bytes':>12}{'encode us':>11}")
+    for endpoint, content in pages().items():
+        for encoding in encodings:
+            body = responses.encode(content, encoding)
+            started = time.perf_counter()
+            for _ in range(rounds):
+                responses.encode(content, encoding)
+            micros = (time.perf_counter() - started) / rounds * 1_000_000
+            print(f"{endpoint:<34}{encoding:<22}{len(body):>8}{len(gzip.compress(body, 6)):>12}{micros:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    main(parser.parse_args().rounds)
@@ -0,0 +1,129 @@
+#client flows modelled on what the Flutter app does
+import io
+import random
+import time
+from dataclasses import dataclass
+import httpx
+from PIL import Image
+from sqlalchemy import select
+from app.core.database import SessionLocal
+from app.models.models import User, Venue, VenueType, VenueCapacity
+from app.auth.service import get_password_hash
+from .harness import Recorder
+
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN = "bench_admin"
+
+
+@dataclass
+class Fixtures:
+    venue_ids: list[int]
+    search_terms: list[str]
+    usernames: list[str]
+
+
+def prepare_fixtures(user_count: int = 20) -> Fixtures:
+    """Makes sure bench users and at least a few venues exist; reuses whatever data is already loaded"""
+    db = SessionLocal()
+    try:
+        hashed = get_password_hash(BENCH_PASSWORD)
+        usernames = [BENCH_ADMIN] + [f"bench_user_{i}" for i in range(user_count)]
+        existing = set(db.scalars(select(User.username).where(User.username.in_(usernames))))
+        for name in usernames:
+            if name not in existing:
+                db.add(User(username=name, email=f"{name}@bench.clubbies.com", password_hashed=hashed,
+                            age=25, role="admin" if name == BENCH_ADMIN else "user"))
+
+        if db.scalar(select(Venue.venue_id).limit(1)) is None:
+            for i in range(50):
+                db.add(Venue(venue_name=f"Bench Venue {i}", address=f"{i} Bench St, Miami, FL", hours="9PM-3AM",
+                             venue_type=[VenueType.NIGHTCLUB], age_req=21, capacity=VenueCapacity.MEDIUM,
+                             price=20, description="Benchmark venue"))
+        db.commit()
+
+        venue_ids = list(db.scalars(select(Venue.venue_id).order_by(Venue.venue_id).limit(1000)))
+        names = db.scalars(select(Venue.venue_name).limit(200))
+        terms = sorted({word.lower() for name in names for word in name.split() if len(word) > 3}) or ["bench"]
+        return Fixtures(venue_ids=venue_ids, search_terms=terms, usernames=usernames[1:])
+    finally:
+        db.close()
+
+
+def sample_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (180, 40, 90)).save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+class Session:
+    """One virtual client: records every request under its endpoint template"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.headers: dict[str, str] = {}
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        elapsed = time.perf_counter() - start
+        queries = int(response.headers.get("x-bench-queries", 0))
+        self.recorder.record(name, elapsed, queries, response.status_code < 400)
+        return response
+
+    async def login(self, username: str) -> None:
+        response = await self.call("POST /auth/login", "POST", "/auth/login",
+                                   data={"username": username, "password": BENCH_PASSWORD})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def browse(session: Session, fixtures: Fixtures) -> None:
+    response = await session.call("GET /venues/", "GET", "/venues/", params={"limit": 20})
+    cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+    if cursor:
+        await session.call("GET /venues/", "GET", "/venues/", params={"limit": 20, "after_venue_id": cursor})
+
+
+async def search(session: Session, fixtures: Fixtures) -> None:
+    term = session.rng.choice(fixtures.search_terms)
+    await session.call("GET /venues/search", "GET", "/venues/search", params={"venue_name": term})
+
+
+async def open_venue(session: Session, fixtures: Fixtures) -> None:
+    venue_id = session.rng.choice(fixtures.venue_ids)
+    await session.call("GET /venues/{venue_id}", "GET", f"/venues/{venue_id}")
+    await session.call("GET /photo/venues/{venue_id}", "GET", f"/photo/venues/{venue_id}")
+    await session.call("GET /reviews/venues/{venue_id}", "GET", f"/reviews/venues/{venue_id}")
+    await session.call("GET /ratings/user/venue/{venue_id}", "GET", f"/ratings/user/venue/{venue_id}")
+
+
+async def rate(session: Session, fixtures: Fixtures) -> None:
+    venue_id = session.rng.choice(fixtures.venue_ids)
+    score = session.rng.choice([1.0, 2.0, 3.0, 3.5, 4.0, 4.5, 5.0])
+    await session.call("POST /ratings/submit", "POST", "/ratings/submit",
+                       data={"venue_id": venue_id, "rating": score})
+
+
+async def upload(session: Session, fixtures: Fixtures, image: bytes) -> None:
+    venue_id = session.rng.choice(fixtures.venue_ids)
+    await session.call("POST /photo/upload", "POST", "/photo/upload",
+                       data={"venue_id": venue_id, "caption": "bench"},
+                       files={"file": ("bench.jpg", image, "image/jpeg")})
+
+
+async def user_session(session: Session, fixtures: Fixtures, username: str) -> None:
+    """A regular app session: log in, browse, search, open a couple of venues, rate one"""
+    await session.login(username)
+    await browse(session, fixtures)
+    await search(session, fixtures)
+    for _ in range(2):
+        await open_venue(session, fixtures)
+    await rate(session, fixtures)
+
+
+async def admin_session(session: Session, fixtures: Fixtures, image: bytes) -> None:
+    await session.login(BENCH_ADMIN)
+    await open_venue(session, fixtures)
+    await upload(session, fixtures, image)
@@ -0,0 +1,130 @@
+#shared pieces of the benchmark suite: query counting, latency stats and baselines
+import json
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+#list holding the query count of the request being served (shared with the threadpool copy of the context)
+_request_queries: ContextVar[list[int] | None] = ContextVar("bench_request_queries", default=None)
+
+
+def install_query_counter(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+class CountingApp:
+    """ASGI wrapper that counts SQL statements per request and reports them on a header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        counter = [0]
+        token = _request_queries.set(counter)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-bench-queries", str(counter[0]).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self, wall_seconds: float) -> dict:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "throughput_rps": round(count / wall_seconds, 2) if wall_seconds else 0.0,
+            "queries_per_request": round(sum(self.queries) / count, 2) if count else 0.0,
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: dict[str, EndpointStats] = {}
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, name: str, seconds: float, queries: int, ok: bool) -> None:
+        stats = self.endpoints.setdefault(name, EndpointStats())
+        stats.latencies.append(seconds)
+        stats.queries.append(queries)
+        if not ok:
+            stats.errors += 1
+
+    def report(self) -> dict:
+        wall = self.finished - self.started
+        return {name: stats.summary(wall) for name, stats in sorted(self.endpoints.items())}
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<40}{'reqs':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'q/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report.items():
+        print(f"{name:<40}{row['requests']:>7}{row['errors']:>5}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['throughput_rps']:>9}{row['queries_per_request']:>7}")
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, report: dict) -> str:
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, "w") as out:
+        json.dump(report, out, indent=2, sort_keys=True)
+    return path
+
+
+def compare_to_baseline(name: str, report: dict, tolerance: float) -> list[str]:
+    """Returns a list of regressions (slower p95 beyond tolerance, more queries, new errors)"""
+    with open(baseline_path(name)) as src:
+        baseline = json.load(src)
+    regressions = []
+    for endpoint, old in baseline.items():
+        new = report.get(endpoint)
+        if new is None:
+            regressions.append(f"{endpoint}: missing from this run")
+            continue
+        if new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {old['p95_ms']}ms -> {new['p95_ms']}ms")
+        if new["queries_per_request"] > old["queries_per_request"]:
+            regressions.append(f"{endpoint}: queries/request {old['queries_per_request']} -> {new['queries_per_request']}")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{endpoint}: errors {old['errors']} -> {new['errors']}")
+    return regressions
@@ -0,0 +1,98 @@
+"""
+Benchmark the API hot paths in-process against a local Postgres.
+
+    DATABASE_URL=postgresql://localhost/clubbies_bench python -m benchmarks.run --sessions 200
+    python -m benchmarks.run --save-baseline main
+    python -m benchmarks.run --compare main        # exits 1 on regression
+
+Load realistic data first with the synthetic generator for production-like numbers.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+#bench defaults so the app's middleware accepts the in-process client
+os.environ.setdefault("ALLOWED_HOSTS", "*")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+#every session shares the transport's client address, so the per-IP budgets (and the per-user
+#ones, with --users accounts) would turn the measured paths into 429s and the calls after them into 401s
+for scope in ("register", "login", "photo_upload", "rating_submit", "review_upload", "user_search", "checkin"):
+    os.environ.setdefault(f"RATE_LIMIT_{scope.upper()}", "1000000/second")
+
+import httpx
+from .harness import CountingApp, Recorder, install_query_counter, print_report, save_baseline, compare_to_baseline
+from .storage_fake import LocalStorage
+from . import flows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clubbies API benchmark")
+    parser.add_argument("--sessions", type=int, default=100, help="client sessions to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions running at once")
+    parser.add_argument("--warmup", type=int, default=5, help="sessions run before measuring")
+    parser.add_argument("--users", type=int, default=20, help="bench user accounts")
+    parser.add_argument("--admin-share", type=float, default=0.05, help="fraction of sessions that upload photos")
+    parser.add_argument("--storage-latency-ms", type=float, default=0.0, help="simulated storage latency")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p95 slowdown vs baseline")
+    return parser.parse_args(argv)
+
+
+async def run_sessions(client, recorder, fixtures, image, count, concurrency, admin_share, rng):
+    plan = [rng.random() < admin_share for _ in range(count)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, is_admin: bool):
+        async with semaphore:
+            session = flows.Session(client, recorder, random.Random(rng.random() + index))
+            if is_admin:
+                await flows.admin_session(session, fixtures, image)
+            else:
+                await flows.user_session(session, fixtures, fixtures.usernames[index % len(fixtures.usernames)])
+
+    await asyncio.gather(*(one(i, admin) for i, admin in enumerate(plan)))
+
+
+async def main(args) -> int:
+    from app.main import app
+    from app.core.database import engine
+
+    LocalStorage(latency_ms=args.storage_latency_ms).install()
+    install_query_counter(engine)
+    fixtures = flows.prepare_fixtures(args.users)
+    image = flows.sample_image()
+    rng = random.Random(args.seed)
+
+    transport = httpx.ASGITransport(app=CountingApp(app))
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            await run_sessions(client, Recorder(), fixtures, image, args.warmup, args.concurrency, args.admin_share, rng)
+
+            recorder = Recorder()
+            await run_sessions(client, recorder, fixtures, image, args.sessions, args.concurrency, args.admin_share, rng)
+            recorder.finished = time.perf_counter()
+
+    report = recorder.report()
+    print_report(report)
+
+    if args.save_baseline:
+        print(f"\nSaved baseline to {save_baseline(args.save_baseline, report)}")
+    if args.compare:
+        regressions = compare_to_baseline(args.compare, report, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nNo regressions against baseline '{args.compare}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,47 @@
+#local stand-in for Cloudinary so uploads can be benchmarked offline
+import os
+import tempfile
+import time
+import cloudinary.api
+import cloudinary.uploader
+
+
+class LocalStorage:
+    """Writes uploads to a temp directory and returns Cloudinary-shaped results"""
+
+    def __init__(self, root: str | None = None, latency_ms: float = 0.0):
+        self.root = root or tempfile.mkdtemp(prefix="clubbies-bench-")
+        self.latency = latency_ms / 1000
+        self.uploads = 0
+        self.deletes = 0
+
+    def upload(self, file, folder: str = "", public_id: str = "", **kwargs) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        full_id = f"{folder}/{public_id}" if folder else public_id
+        path = os.path.join(self.root, full_id.replace("/", "_") + ".jpg")
+        with open(path, "wb") as out:
+            out.write(file if isinstance(file, bytes) else file.read())
+        self.uploads += 1
+        return {
+            "public_id": full_id,
+            "secure_url": f"https://res.cloudinary.com/bench/image/upload/v1/{full_id}.jpg",
+        }
+
+    def destroy(self, public_id: str, **kwargs) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        self.deletes += 1
+        return {"result": "ok"}
+
+    def delete_resources(self, public_ids: list[str], **kwargs) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        self.deletes += len(public_ids)
+        return {"deleted": {public_id: "deleted" for public_id in public_ids}}
+
+    def install(self) -> "LocalStorage":
+        cloudinary.uploader.upload = self.upload
+        cloudinary.uploader.destroy = self.destroy
+        cloudinary.api.delete_resources = self.delete_resources
+        return self
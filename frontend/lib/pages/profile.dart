@@ -29,6 +29,7 @@ class _ProfilePageState extends State<ProfilePage> {
 
   User? _currentUser;
   List<Venue> _ratedVenues = [];
+  int _ratedVenueCount = 0;
   List<Review> _reviews = [];
   Map<int, List<Photo>> _venuePhotos = {};
   bool _isLoading = true;
@@ -64,7 +65,8 @@ class _ProfilePageState extends State<ProfilePage> {
 
       setState(() {
         _currentUser = user;
-        _ratedVenues = ratedVenues;
+        _ratedVenues = ratedVenues['venues'] as List<Venue>;
+        _ratedVenueCount = ratedVenues['total'] as int;
         _isLoading = false;
       });
 
@@ -224,7 +226,7 @@ class _ProfilePageState extends State<ProfilePage> {
                           child: _buildSectionHeader(
                             icon: Icons.star,
                             title: 'My Rated Venues',
-                            count: _ratedVenues.length,
+                            count: _ratedVenueCount,
                           ),
                         ),
 
@@ -506,7 +508,7 @@ class _ProfilePageState extends State<ProfilePage> {
               children: [
                 _buildStatItem(
                   icon: Icons.star,
-                  value: _ratedVenues.length.toString(),
+                  value: _ratedVenueCount.toString(),
                   label: 'Rated',
                 ),
                 Container(
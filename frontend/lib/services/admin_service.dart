@@ -91,7 +91,8 @@ class AdminService {
   Future<void> deleteUser(int userId) async {
     final response = await _apiService.delete('$baseUrl/users/admin/$userId');
 
-    if (response.statusCode != 204 && response.statusCode != 200) {
+    // 202: deletion accepted, it finishes in the background
+    if (response.statusCode != 202 && response.statusCode != 204 && response.statusCode != 200) {
       final errorBody = jsonDecode(response.body);
       throw Exception('Failed to delete user: ${errorBody['detail']}');
     }
@@ -64,8 +64,8 @@ class UserService {
   Future<void> deleteAccount() async {
     final response = await _apiService.delete('$baseUrl$_userEndpoint/delete');
 
-    if (response.statusCode == 204) {
-      // Successfully deleted - token will be cleared by logout
+    if (response.statusCode == 202 || response.statusCode == 204) {
+      // Deletion accepted (finishes in the background) - token will be cleared by logout
       return;
     } else {
       final errorBody = jsonDecode(response.body);
@@ -0,0 +1,54 @@
+import 'dart:async';
+import 'dart:convert';
+import 'package:http/http.dart' as http;
+import '../config/environment.dart';
+
+// One event from a venue's live stream: type is review, photo or rating
+// (data is then a review, a photo or the venue's rating aggregates), or
+// overflow / resync, which mean events were missed and the lists should be refetched
+class VenueActivity {
+  final String type;
+  final Map<String, dynamic> data;
+
+  VenueActivity(this.type, this.data);
+
+  bool get needsRefetch => type == 'overflow' || type == 'resync';
+}
+
+class VenueActivityService {
+  static String get baseUrl => Environment.apiBaseUrl;
+
+  // Live activity for a venue (public endpoint, Server-Sent Events).
+  // The stream ends when the server closes it; listen again to reconnect.
+  Stream<VenueActivity> watchVenue(int venueId) async* {
+    final client = http.Client();
+    try {
+      final request = http.Request('GET', Uri.parse('$baseUrl/venues/$venueId/stream'));
+      request.headers['Accept'] = 'text/event-stream';
+      final response = await client.send(request);
+      if (response.statusCode != 200) {
+        throw Exception('Failed to open venue stream: ${response.statusCode}');
+      }
+
+      String? event;
+      final data = StringBuffer();
+      await for (final line in response.stream.transform(utf8.decoder).transform(const LineSplitter())) {
+        if (line.isEmpty) {
+          // blank line ends an event; comment-only blocks (heartbeats) have no event name
+          if (event != null) {
+            final body = data.isEmpty ? <String, dynamic>{} : jsonDecode(data.toString()) as Map<String, dynamic>;
+            yield VenueActivity(event, (body['data'] as Map<String, dynamic>?) ?? body);
+          }
+          event = null;
+          data.clear();
+        } else if (line.startsWith('event:')) {
+          event = line.substring(6).trim();
+        } else if (line.startsWith('data:')) {
+          data.write(line.substring(5).trim());
+        }
+      }
+    } finally {
+      client.close();
+    }
+  }
+}
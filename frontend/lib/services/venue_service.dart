@@ -58,17 +58,55 @@ class VenueService {
     }
   }
 
-  // Get venues rated by the current user - requires auth
-  Future<List<Venue>> getUserRatedVenues() async {
-    final response = await _apiService.get('$baseUrl/ratings/user/venues');
+  // Get one page of the venues rated by the current user - requires auth
+  // The first page (no cursor) also carries 'total', the number of venues rated
+  Future<Map<String, dynamic>> getUserRatedVenuesPage({String? cursor, int limit = 100}) async {
+    final Map<String, String> queryParams = {
+      'limit': limit.toString(),
+    };
+
+    if (cursor != null) {
+      queryParams['cursor'] = cursor;
+    }
+
+    final uri = Uri.parse('$baseUrl/ratings/user/venues').replace(
+      queryParameters: queryParams,
+    );
+
+    final response = await _apiService.get(uri.toString());
 
     if (response.statusCode == 200) {
       final responseData = jsonDecode(response.body);
       final venuesList = responseData['venues'] as List;
-      return venuesList.map((venue) => Venue.fromJson(venue)).toList();
+      return {
+        'venues': venuesList.map((venue) => Venue.fromJson(venue)).toList(),
+        'has_more': responseData['has_more'] ?? false,
+        'next_cursor': responseData['next_cursor'],
+        'total': responseData['total'],
+      };
     } else {
       final errorBody = jsonDecode(response.body);
       throw Exception('Failed to fetch rated venues: ${errorBody['detail']}');
     }
   }
+
+  // Get every venue rated by the current user (follows next_cursor) and the server's count - requires auth
+  Future<Map<String, dynamic>> getUserRatedVenues() async {
+    final List<Venue> venues = [];
+    int? total;
+    String? cursor;
+
+    while (true) {
+      final page = await getUserRatedVenuesPage(cursor: cursor);
+      venues.addAll(page['venues'] as List<Venue>);
+      total ??= page['total'] as int?;
+      cursor = page['next_cursor'] as String?;
+      if (page['has_more'] != true || cursor == null) break;
+    }
+
+    return {
+      'venues': venues,
+      'total': total ?? venues.length,
+    };
+  }
 }
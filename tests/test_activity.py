@@ -0,0 +1,98 @@
+"""Activity hub fan-out through the SSE body generator, at the per-worker subscriber limit (no database)"""
+import asyncio
+import time
+import orjson
+from app.venues import activity
+
+SUBSCRIBERS = 10_000
+EVENTS = 10
+#bounds are loose for shared CI machines; a laptop runs this at p99 ~0.2 s and ~40 ms per dispatch
+P99_SECONDS = 2.0
+DISPATCH_SECONDS = 1.0
+
+
+async def consume(hub: activity.Hub, venue_id: int, received: list[tuple[int, float]], delay: float = 0.0):
+    async for chunk in activity.stream(venue_id, hub):
+        now = time.perf_counter()
+        for line in chunk.split(b"\n"):
+            if line.startswith(b'data: {"venue_id"'):
+                data = orjson.loads(line[6:])["data"]
+                received.append((data["review_id"], now - data["sent"]))
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def payload(venue_id: int, number: int) -> str:
+    return orjson.dumps({"venue_id": venue_id, "type": "review",
+                         "data": {"review_id": number, "sent": time.perf_counter()}}).decode()
+
+
+async def fan_out():
+    hub = activity.Hub()
+    received = [[] for _ in range(SUBSCRIBERS)]
+    tasks = [asyncio.create_task(consume(hub, 1, received[number])) for number in range(SUBSCRIBERS)]
+    while hub.count < SUBSCRIBERS:
+        await asyncio.sleep(0.01)
+    dispatch = []
+    for number in range(EVENTS):
+        started = time.perf_counter()
+        delivered = hub.dispatch(payload(1, number))
+        dispatch.append(time.perf_counter() - started)
+        assert delivered == SUBSCRIBERS
+        await asyncio.sleep(0.02)
+    #drained: every subscriber has read every event
+    deadline = time.perf_counter() + 30
+    while any(len(events) < EVENTS for events in received):
+        assert time.perf_counter() < deadline, "events not delivered"
+        await asyncio.sleep(0.05)
+    assert hub.count == SUBSCRIBERS
+    hub.stop()
+    await asyncio.gather(*tasks)
+    return hub, received, dispatch
+
+
+def test_fan_out_to_ten_thousand_subscribers():
+    hub, received, dispatch = asyncio.run(fan_out())
+    assert all([number for number, _ in events] == list(range(EVENTS)) for events in received)
+    latencies = sorted(latency for events in received for _, latency in events)
+    assert latencies[int(len(latencies) * 0.99)] < P99_SECONDS
+    assert max(dispatch) < DISPATCH_SECONDS
+    assert hub.count == 0 and not hub.venues
+
+
+def test_only_the_venues_subscribers_get_its_events():
+    async def run():
+        hub = activity.Hub()
+        first, second = [], []
+        tasks = [asyncio.create_task(consume(hub, 1, first)), asyncio.create_task(consume(hub, 2, second))]
+        await asyncio.sleep(0.01)
+        assert hub.dispatch(payload(2, 7)) == 1
+        assert hub.dispatch(payload(3, 8)) == 0
+        assert hub.dispatch("not json") == 0
+        await asyncio.sleep(0.01)
+        hub.stop()
+        await asyncio.gather(*tasks)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [] and [number for number, _ in second] == [7]
+
+
+def test_a_subscriber_that_falls_behind_is_cut_off_not_buffered():
+    async def run():
+        hub = activity.Hub()
+        fast, slow = [], []
+        tasks = [asyncio.create_task(consume(hub, 1, fast)), asyncio.create_task(consume(hub, 1, slow, delay=10))]
+        await asyncio.sleep(0.01)  #the slow reader takes the opening chunk, then sleeps
+        for number in range(activity.QUEUE_SIZE + 1):
+            hub.dispatch(payload(1, number))
+            await asyncio.sleep(0)
+        assert hub.count == 1
+        hub.stop()
+        await asyncio.wait_for(asyncio.gather(tasks[0]), 5)
+        tasks[1].cancel()
+        return fast, slow
+
+    fast, slow = asyncio.run(run())
+    assert len(fast) == activity.QUEUE_SIZE + 1
+    assert slow == []
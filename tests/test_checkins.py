@@ -0,0 +1,103 @@
+"""Check-in counting per worker: window dedupe, swap/requeue around flushes and unflushed reads (no database)"""
+import time
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app.venues import checkins
+from app.venues.checkins import BUCKET_SECONDS, MAX_VENUE_ID, RETENTION_HOURS, WINDOW_MINUTES, CheckinCounter
+
+NOW = checkins.bucket_of(time.time()) + 10
+
+
+def test_repeat_check_in_within_the_window_counts_once():
+    counter = CheckinCounter()
+    assert counter.add(1, 7, now=NOW)
+    assert not counter.add(1, 7, now=NOW + 60)
+    #another venue, or another user, counts
+    assert counter.add(2, 7, now=NOW + 60)
+    assert counter.add(1, 8, now=NOW + 60)
+    assert counter.add(1, 7, now=NOW + WINDOW_MINUTES * 60)
+    assert counter.pending(1, checkins.bucket_of(NOW)) == 3
+
+
+def test_sweep_forgets_check_ins_older_than_the_window():
+    counter = CheckinCounter()
+    counter.add(1, 7, now=NOW)
+    counter.add(1, 8, now=NOW + WINDOW_MINUTES * 60)
+    counter.sweep(now=NOW + WINDOW_MINUTES * 60 + 1)
+    assert [list(shard.seen) for shard in counter.shards if shard.seen] == [[(8, 1)]]
+
+
+def test_take_merges_shards_and_keeps_counts_readable_until_done():
+    counter = CheckinCounter(shards=4)
+    for user_id in range(10):
+        counter.add(3, user_id, now=NOW)
+    counter.add(3, 20, now=NOW + BUCKET_SECONDS)
+    taken = counter.take()
+    assert dict(taken) == {(3, checkins.bucket_of(NOW)): 10, (3, checkins.bucket_of(NOW) + BUCKET_SECONDS): 1}
+    assert all(not shard.counts for shard in counter.shards)
+    #a flush in progress still counts for here-now on this worker
+    assert counter.pending(3, checkins.bucket_of(NOW)) == 11
+    assert counter.pending(3, checkins.bucket_of(NOW) + BUCKET_SECONDS) == 1
+    counter.done()
+    assert counter.pending(3, checkins.bucket_of(NOW)) == 0
+
+
+def test_done_requeues_counts_within_retention_only():
+    counter = CheckinCounter()
+    fresh = checkins.bucket_of(time.time())
+    stale = checkins.bucket_of(time.time() - RETENTION_HOURS * 3600 - BUCKET_SECONDS)
+    counter.take()
+    counter.done({(1, fresh): 4, (1, stale): 2})
+    assert counter.pending(1, 0) == 4
+    assert dict(counter.take()) == {(1, fresh): 4}
+
+
+def test_batch_parameters_line_up():
+    bucket = checkins.bucket_of(NOW)
+    params = checkins.batch({(1, bucket): 2, (5, bucket): 3})
+    assert params["venue_ids"] == [1, 5]
+    assert params["counts"] == [2, 3]
+    assert params["buckets"] == [checkins.as_timestamp(bucket)] * 2
+
+
+class FakeSession:
+    def __init__(self, error: Exception | None = None):
+        self.error = error
+        self.executed = []
+        self.commits = self.rollbacks = 0
+
+    def execute(self, statement, params):
+        if self.error is not None:
+            raise self.error
+        self.executed.append(params)
+        return type("Result", (), {"rowcount": len(params["venue_ids"])})()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_flush_drops_venue_ids_no_row_can_have():
+    counter = CheckinCounter()
+    counter.add(1, 1)
+    counter.add(MAX_VENUE_ID + 1, 1)
+    db = FakeSession()
+    assert checkins.flush(db, counter) == 1
+    assert db.executed[0]["venue_ids"] == [1]
+    assert counter.pending(MAX_VENUE_ID + 1, 0) == 0
+
+
+@pytest.mark.parametrize("error, kept", [
+    (OperationalError("INSERT", {}, Exception("server closed the connection")), True),
+    (IntegrityError("INSERT", {}, Exception("violates check constraint")), False),
+], ids=["connection-lost", "statement-error"])
+def test_failed_flush_keeps_counts_only_when_worth_retrying(error, kept):
+    counter = CheckinCounter()
+    counter.add(1, 1)
+    db = FakeSession(error)
+    assert checkins.flush(db, counter) == 0
+    assert db.rollbacks == 1
+    assert counter.pending(1, 0) == (1 if kept else 0)
+    assert counter.flushing == {}
@@ -0,0 +1,121 @@
+"""Compression middleware: encoding negotiation, weak ETags and 304s, caching rules and streams (no database)"""
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from app.protection.compression import CompressionMiddleware, available_encodings, choose_encoding
+
+BODY = {"venues": [{"venue_id": number, "venue_name": f"Venue {number}"} for number in range(200)]}
+
+
+async def page(request):
+    return JSONResponse(BODY)
+
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+
+async def events(request):
+    async def stream():
+        for number in range(3):
+            yield f"data: {number}\n\n" * 200
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+async def rows(request):
+    async def stream():
+        for number in range(3):
+            yield (f'{{"row": {number}}}\n' * 200).encode()
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def image(request):
+    return Response(b"\xff\xd8" + b"x" * 5000, media_type="image/jpeg")
+
+
+@pytest.fixture
+def middleware() -> CompressionMiddleware:
+    app = Starlette(routes=[Route("/page", page), Route("/small", small), Route("/events", events),
+                            Route("/rows", rows), Route("/image", image)])
+    return CompressionMiddleware(app)
+
+
+@pytest.fixture
+def client(middleware) -> TestClient:
+    return TestClient(middleware)
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("gzip, br", "br"),
+    ("*", "br"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(accept, expected):
+    assert choose_encoding(accept, ["br", "zstd", "gzip"]) == expected
+
+
+def test_choose_encoding_only_offers_what_is_installed():
+    assert choose_encoding("br, zstd", ["gzip"]) is None
+    assert "gzip" in available_encodings()
+
+
+@pytest.mark.parametrize("encoding", available_encodings())
+def test_page_is_compressed_with_the_negotiated_encoding(client, encoding):
+    response = client.get("/page", headers={"Accept-Encoding": encoding})
+    assert response.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json() == BODY
+
+
+def test_small_and_already_compressed_bodies_pass_through(client):
+    assert "Content-Encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    response = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert len(response.content) == 5002
+
+
+def test_weak_etag_answers_304_and_the_compressed_body_is_cached(client, middleware):
+    first = client.get("/page", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert list(middleware.cache.entries) == [(etag, "gzip")]
+
+    again = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    other = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"stale"'})
+    assert other.status_code == 200
+
+
+def test_authenticated_responses_are_compressed_but_never_cached(client, middleware):
+    response = client.get("/page", headers={"Accept-Encoding": "gzip", "Authorization": "Bearer token"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "ETag" not in response.headers
+    assert not middleware.cache.entries
+    #a tag from an anonymous response doesn't turn a per-user response into a 304
+    etag = client.get("/page", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/page", headers={"Accept-Encoding": "gzip", "Authorization": "Bearer token",
+                                             "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_event_streams_are_never_compressed(client):
+    with client.stream("GET", "/events", headers={"Accept-Encoding": "gzip"}) as response:
+        assert "Content-Encoding" not in response.headers
+        body = b"".join(response.iter_raw())
+    assert body == "".join(f"data: {number}\n\n" * 200 for number in range(3)).encode()
+
+
+def test_other_streams_are_compressed_chunk_by_chunk(client):
+    response = client.get("/rows", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f'{{"row": {number}}}\n' * 200 for number in range(3))
@@ -0,0 +1,149 @@
+"""Token buckets, leases and the route dependency, on the in-process backend (no database)"""
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.protection import rate_limiting
+from app.protection.rate_limiting import PRUNE_SECONDS, MemoryBackend, Rate, RateLimiter, rate_limit
+
+
+class Clock:
+    """Stands in for the module's time: monotonic() is moved by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.perf_counter = time.perf_counter
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class CountingBackend(MemoryBackend):
+    def __init__(self):
+        super().__init__()
+        self.wants = []
+
+    def take(self, key, rate, want):
+        self.wants.append(want)
+        return super().take(key, rate, want)
+
+
+def clock(monkeypatch) -> Clock:
+    fake = Clock()
+    monkeypatch.setattr(rate_limiting, "time", fake)
+    return fake
+
+
+def test_rate_parse():
+    assert Rate.parse("5/hour") == Rate(capacity=5, per_second=5 / 3600)
+    assert Rate.parse("100 / minutes") == Rate(capacity=100, per_second=100 / 60)
+
+
+def test_bucket_empties_then_refills_evenly(monkeypatch):
+    now = clock(monkeypatch)
+    backend, rate = MemoryBackend(), Rate.parse("2/minute")
+    assert backend.take("k", rate, 1) == (1, 1.0)
+    assert backend.take("k", rate, 1) == (1, 0.0)
+    assert backend.take("k", rate, 1) == (0, 0.0)
+    now.now += 30
+    taken, left = backend.take("k", rate, 5)
+    assert (taken, left) == (1, 0.0)
+
+
+def test_full_buckets_are_swept_on_a_timer_not_per_take(monkeypatch):
+    now = clock(monkeypatch)
+    backend, rate = MemoryBackend(), Rate.parse("10/minute")
+    for number in range(1000):
+        backend.take(f"k{number}", rate, 1)
+    #refilled long ago, but nothing is swept before the interval is up
+    now.now += PRUNE_SECONDS - 1
+    backend.take("late", rate, 10)
+    assert len(backend.buckets) == 1001
+    now.now += 1
+    backend.take("other", rate, 1)
+    #only the buckets that are still refilling stay
+    assert set(backend.buckets) == {"late", "other"}
+
+
+def test_lease_is_spent_locally_while_the_bucket_is_at_least_half_full(monkeypatch):
+    clock(monkeypatch)
+    backend = CountingBackend()
+    limiter, rate = RateLimiter(backend, lease_fraction=0.1), Rate.parse("100/minute")
+    for _ in range(11):
+        assert limiter.hit("k", rate) == (True, 0.0)
+    #one token to learn the level, then a lease of 10 covers the next ten hits
+    assert backend.wants == [1, 10]
+
+
+def test_no_lease_near_the_limit_and_retry_after_when_empty(monkeypatch):
+    now = clock(monkeypatch)
+    backend = CountingBackend()
+    limiter, rate = RateLimiter(backend), Rate.parse("4/minute")
+    results = [limiter.hit("k", rate) for _ in range(5)]
+    assert [allowed for allowed, _ in results] == [True, True, True, True, False]
+    assert results[-1][1] == 15.0
+    assert set(backend.wants) == {1}
+    now.now += 15
+    assert limiter.hit("k", rate)[0]
+
+
+def test_lease_expires(monkeypatch):
+    now = clock(monkeypatch)
+    backend = CountingBackend()
+    limiter, rate = RateLimiter(backend, lease_seconds=5), Rate.parse("100/minute")
+    limiter.hit("k", rate)
+    limiter.hit("k", rate)
+    now.now += 6
+    limiter.hit("k", rate)
+    assert len(backend.wants) == 3
+
+
+def test_hints_expire_for_keys_that_never_lease(monkeypatch):
+    now = clock(monkeypatch)
+    limiter, rate = RateLimiter(MemoryBackend()), Rate.parse("5/hour")
+    for number in range(1000):
+        limiter.hit(f"k{number}", rate)
+    assert len(limiter.last_left) == 1000
+    assert not limiter.leases
+    now.now += PRUNE_SECONDS
+    limiter.hit("fresh", rate)
+    assert set(limiter.last_left) == {"fresh"}
+
+
+def limited_app(**options) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[rate_limit("test_scope", "2/minute", local=True, **options)])
+    def limited():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_route_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limiting, "local_limiter", RateLimiter(MemoryBackend()))
+    client = limited_app()
+    assert [client.get("/limited").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/limited")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+
+
+def test_client_ip_takes_the_trusted_forwarded_hop(monkeypatch):
+    monkeypatch.setattr(rate_limiting, "local_limiter", RateLimiter(MemoryBackend()))
+    monkeypatch.setattr(rate_limiting, "PROXY_HOPS", 1)
+    client = limited_app()
+    #a client rotating a spoofed leftmost entry is still keyed on the address the proxy appended
+    statuses = [client.get("/limited", headers={"X-Forwarded-For": f"10.0.0.{number}, 203.0.113.7"}).status_code
+                for number in range(3)]
+    assert statuses == [200, 200, 429]
+    assert client.get("/limited", headers={"X-Forwarded-For": "203.0.113.8"}).status_code == 200
+
+
+def test_backend_failure_fails_open(monkeypatch):
+    class Broken:
+        def take(self, key, rate, want):
+            raise ConnectionError("backend down")
+
+    monkeypatch.setattr(rate_limiting, "local_limiter", RateLimiter(Broken()))
+    client = limited_app()
+    assert [client.get("/limited").status_code for _ in range(3)] == [200, 200, 200]
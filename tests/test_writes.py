@@ -0,0 +1,151 @@
+"""Single-statement write paths: rating upsert, review insert/update and venue create"""
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from app.core import startup
+from app.core.database import SessionLocal
+from app.models.models import VenueRanking
+from app.ratings import service as ratings
+from app.ratings.rating_models import CreateRating
+from app.reviews import service as reviews
+from app.reviews.r_model import CreateReview, UpdateReview
+from app.venues import ranking, service as venues
+from app.venues.v_models import VenueCreate
+from .conftest import insert_user, insert_venue, unique
+
+MISSING = 2_000_000_000
+
+
+def ranking_of(db, venue_id: int) -> tuple[int, float] | None:
+    row = db.execute(select(VenueRanking.rating_count, VenueRanking.rating_sum)
+                     .where(VenueRanking.venue_id == venue_id)).first()
+    return None if row is None else (row.rating_count, row.rating_sum)
+
+
+def test_first_rating_is_inserted(db, user, venue):
+    rating = ratings.create_or_update_rating(db, CreateRating(venue_id=venue, rating=3), user)
+    assert rating.inserted
+    assert rating.previous_rating is None
+    assert ranking_of(db, venue) == (1, 3.0)
+
+
+def test_second_rating_updates_and_reports_the_value_it_replaced(db, user, venue):
+    first = ratings.create_or_update_rating(db, CreateRating(venue_id=venue, rating=3), user)
+    second = ratings.create_or_update_rating(db, CreateRating(venue_id=venue, rating=5), user)
+    assert not second.inserted
+    assert second.previous_rating == 3
+    assert second.rating_id == first.rating_id
+    assert ranking_of(db, venue) == (1, 5.0)
+
+
+def test_deleting_the_last_rating_removes_the_venue_from_the_leaderboard(db, user, venue):
+    rating = ratings.create_or_update_rating(db, CreateRating(venue_id=venue, rating=4), user)
+    ratings.delete_rating(db, rating.rating_id, user)
+    assert ranking_of(db, venue) is None
+    assert venue not in [row.venue_id for row in ranking.top_venues(db, limit=100)]
+
+
+def test_removing_a_rating_never_creates_a_leaderboard_row(db, venue):
+    ranking.adjust(db, venue, -1, -4.0)
+    ranking.adjust(db, venue, 0, 1.0)
+    assert ranking_of(db, venue) is None
+
+
+def test_rating_a_missing_venue_is_404(db, user):
+    with pytest.raises(HTTPException) as error:
+        ratings.create_or_update_rating(db, CreateRating(venue_id=MISSING, rating=3), user)
+    assert error.value.status_code == 404
+
+
+@pytest.fixture
+def committed(engine):
+    """A user and a venue committed for real (for tests with two connections), removed afterwards"""
+    with engine.begin() as conn:
+        ids = insert_user(conn), insert_venue(conn)
+    yield ids
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM venues WHERE venue_id = :id"), {"id": ids[1]})
+        conn.execute(text("DELETE FROM users WHERE user_id = :id"), {"id": ids[0]})
+
+
+def test_rating_racing_a_concurrent_first_rating_recounts(engine, committed):
+    user_id, venue_id = committed
+    #the other request's first rating, inserted and counted but not committed yet
+    first = engine.connect()
+    transaction = first.begin()
+    first.execute(text("INSERT INTO ratings (rating, created_at, user_id, venue_id) VALUES (2, now(), :u, :v)"),
+                  {"u": user_id, "v": venue_id})
+    first.execute(text("""
+        INSERT INTO venue_rankings (venue_id, rating_count, rating_sum, bayes_score, venue_type, price)
+        SELECT venue_id, 1, 2, 2, venue_type, price FROM venues WHERE venue_id = :v
+    """), {"v": venue_id})
+
+    result = {}
+
+    def upsert():
+        with SessionLocal() as db:
+            result["rating"] = ratings.create_or_update_rating(db, CreateRating(venue_id=venue_id, rating=4), user_id)
+
+    racer = threading.Thread(target=upsert)
+    racer.start()
+    #wait until the upsert is blocked on the uncommitted row, then let the first rating commit
+    deadline = time.monotonic() + 10
+    with engine.connect() as watcher:
+        while not watcher.execute(text(
+                "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' "
+                "AND datname = current_database()")).scalar():
+            assert time.monotonic() < deadline, "upsert never blocked on the concurrent insert"
+            time.sleep(0.05)
+    transaction.commit()
+    first.close()
+    racer.join(10)
+
+    rating = result["rating"]
+    assert not rating.inserted
+    assert rating.previous_rating is None
+    with SessionLocal() as db:
+        assert ranking_of(db, venue_id) == (1, 4.0)
+
+
+def test_review_for_a_missing_venue_is_404(db, user):
+    with pytest.raises(HTTPException) as error:
+        reviews.create_review(db, CreateReview(venue_id=MISSING, review_text="great"), user)
+    assert error.value.status_code == 404
+
+
+def test_created_review_comes_back_with_display_fields(db, user, venue):
+    review = reviews.create_review(db, CreateReview(venue_id=venue, review_text="great"), user)
+    assert review.review_text == "great"
+    assert review.username.startswith("user")
+    assert review.venue_name.startswith("venue")
+
+
+def test_update_review_tells_missing_from_someone_elses(db, user, venue):
+    review = reviews.create_review(db, CreateReview(venue_id=venue, review_text="great"), user)
+    updated = reviews.update_review(db, review.review_id, UpdateReview(review_text="better"), user)
+    assert updated.review_text == "better"
+    assert updated.username == review.username
+
+    with pytest.raises(HTTPException) as error:
+        reviews.update_review(db, MISSING, UpdateReview(review_text="x"), user)
+    assert error.value.status_code == 404
+
+    other = insert_user(db)
+    with pytest.raises(HTTPException) as error:
+        reviews.update_review(db, review.review_id, UpdateReview(review_text="x"), other)
+    assert error.value.status_code == 403
+
+
+@pytest.mark.parametrize("constraint", [True, False], ids=["on-conflict", "without-constraint"])
+def test_duplicate_venue_is_400(db, monkeypatch, constraint):
+    if not constraint:
+        monkeypatch.setattr(startup, "has_constraint", lambda db, name: False)
+    data = VenueCreate(venue_name=unique("venue"), address="2 Side St", venue_type=["Bar"], age_req=21,
+                       capacity="Small", hours="8pm-1am", price=1)
+    venue = venues.create_venue(db, data)
+    assert venue.venue_name == data.venue_name
+    with pytest.raises(HTTPException) as error:
+        venues.create_venue(db, data)
+    assert error.value.status_code == 400